@@ -0,0 +1,81 @@
+# -*- mode: python ; coding: utf-8 -*-
+# One-folder build: nothing is unpacked to a temp directory on launch and the
+# binaries are not UPX-compressed, so the GUI starts in a fraction of the time
+# of the single-file CC-Auditor.spec build. Ship the whole dist/CC-Auditor-onedir
+# folder.
+#
+#     pyinstaller CC-Auditor-onedir.spec
+#     python startupBenchmark.py --exe dist/CC-Auditor-onedir/CC-Auditor
+
+# Stages import their checkers when they start; list them so the analysis
+# never misses one.
+hiddenimports = [
+    'runAudit',
+    'individualAudit',
+    'resultsIndex',
+    'dataReset',
+    'youtubeVideo',
+    'panoptoVideo',
+    'sortEmbeddedVideos',
+    'youtube_transcript_api',
+    'webdriver_manager.chrome',
+]
+
+# Modules the auditor never uses but that would otherwise be collected.
+excludes = [
+    'IPython',
+    'PIL',
+    'matplotlib',
+    'numpy',
+    'pandas',
+    'pytest',
+    'setuptools',
+    'lib2to3',
+    'pydoc_data',
+    'test',
+    'tkinter.test',
+    'unittest',
+    'xmlrpc',
+]
+
+a = Analysis(
+    ['gui.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=hiddenimports,
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=excludes,
+    noarchive=False,
+    optimize=0,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='CC-Auditor',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=False,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='CC-Auditor-onedir',
+)
@@ -0,0 +1,352 @@
+"""Run-scoped store for the Canvas data shared between audit stages.
+
+``pullModules`` writes the course list, module URLs and sorted URLs once per
+run; every later stage reads them back through :func:`current` instead of
+crawling Canvas again. Entries keep the existing ``data/`` file layout and are
+tracked in ``data/artifact_manifest.json`` with a SHA-256 content hash, the
+time they were fetched and the run that fetched them. Several processes
+(queue workers, the event daemon) may share the manifest: each one writes
+only the records it changed, merged into the file on disk under an
+inter-process lock (see ``fileLock``). Those writes are batched: the
+manifest is saved every ``FLUSH_EVERY`` puts or ``FLUSH_SECONDS``, on
+:meth:`ArtifactStore.flush` (call it before another process needs the
+records) and when the next run starts or the process exits.
+
+Freshness policy: anything written during the current run is always fresh.
+Entries from earlier runs are reused while they are younger than ``max_age``
+(``CC_AUDIT_MAX_AGE_HOURS``, 24 hours by default) and their file still matches
+the recorded hash. Anything else is re-fetched from Canvas on demand.
+
+Every lookup is counted in the ``cache_requests_total`` metric, and a file
+read from disk has its access time set, which is what ``cacheManager``'s LRU
+size cap evicts by.
+"""
+
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import auditLog
+import auditMetrics
+import fileLock
+
+
+log = auditLog.get_logger("artifactStore")
+
+DATA_DIR = "data"
+MANIFEST_PATH = os.path.join(DATA_DIR, "artifact_manifest.json")
+DEFAULT_MAX_AGE = float(os.environ.get("CC_AUDIT_MAX_AGE_HOURS", "24")) * 3600
+# Unsaved manifest changes that trigger a save, and the longest they wait.
+FLUSH_EVERY = 50
+FLUSH_SECONDS = 10.0
+
+
+def artifact_path(kind: str, key: Optional[str] = None) -> str:
+    """Return the ``data/`` file backing an artifact."""
+
+    if kind == "courses":
+        return os.path.join(DATA_DIR, "courses.json")
+    if kind == "course_ids":
+        return os.path.join(DATA_DIR, "courses_ids.json")
+    if kind == "modules":
+        return os.path.join(DATA_DIR, "courseModules", f"modules_{key}.json")
+    if kind == "sorted":
+        return os.path.join(DATA_DIR, "sortedModules", f"sorted_modules_{key}.json")
+    raise ValueError(f"Unknown artifact kind: {kind}")
+
+
+def content_hash(value: object) -> str:
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _touch(path: str) -> None:
+    """Mark ``path`` as used now; only the access time changes."""
+
+    try:
+        os.utime(path, (time.time(), os.stat(path).st_mtime))
+    except OSError:
+        pass
+
+
+def _entry_id(kind: str, key: Optional[str]) -> str:
+    return f"{kind}/{key}" if key is not None else kind
+
+
+class ArtifactStore:
+    """In-memory view of the run's artifacts, persisted to ``data/``."""
+
+    def __init__(self, run_id: Optional[str] = None, max_age: float = DEFAULT_MAX_AGE) -> None:
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._values: Dict[str, object] = {}
+        self._changed: Dict[str, bool] = {}
+        self._lock = threading.RLock()
+        # Batched saves may happen after the working directory changed (e.g. at exit).
+        self._manifest_path = os.path.abspath(MANIFEST_PATH)
+        self._manifest = self._load_manifest()
+        # Records changed or dropped by this process since the manifest was last saved.
+        self._dirty: Set[str] = set()
+        self._removed: Set[str] = set()
+        self._flushed_at = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # public helpers
+    def put(self, kind: str, key: Optional[str], value: object) -> str:
+        """Store ``value`` for this run and return its content hash."""
+
+        key = str(key) if key is not None else None
+        entry_id = _entry_id(kind, key)
+        digest = content_hash(value)
+        path = artifact_path(kind, key)
+
+        with self._lock:
+            previous = self._manifest.get(entry_id, {}).get("sha256")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as handle:
+                json.dump(value, handle, indent=4)
+
+            self._values[entry_id] = value
+            self._changed[entry_id] = previous is not None and previous != digest
+            self._manifest[entry_id] = {
+                "sha256": digest,
+                "fetched_at": time.time(),
+                "run_id": self.run_id,
+                "path": path,
+            }
+            self._dirty.add(entry_id)
+            self._removed.discard(entry_id)
+            if len(self._dirty) >= FLUSH_EVERY or time.monotonic() - self._flushed_at >= FLUSH_SECONDS:
+                self._save_manifest()
+        return digest
+
+    def get(self, kind: str, key: Optional[str] = None, max_age: Optional[float] = None):
+        """Return a fresh artifact or ``None`` when it must be re-fetched."""
+
+        key = str(key) if key is not None else None
+        entry_id = _entry_id(kind, key)
+
+        with self._lock:
+            if entry_id in self._values:
+                self.hits += 1
+                auditMetrics.inc("cache_requests_total", {"cache": f"artifact_{kind}", "result": "hit"})
+                return self._values[entry_id]
+
+            value = self._load_if_fresh(kind, key, max_age)
+            if value is None:
+                self.misses += 1
+                auditMetrics.inc("cache_requests_total", {"cache": f"artifact_{kind}", "result": "miss"})
+                return None
+
+            self._values[entry_id] = value
+            self.hits += 1
+            auditMetrics.inc("cache_requests_total", {"cache": f"artifact_{kind}", "result": "hit"})
+            return value
+
+    def is_fresh(self, kind: str, key: Optional[str] = None, max_age: Optional[float] = None) -> bool:
+        key = str(key) if key is not None else None
+        with self._lock:
+            if _entry_id(kind, key) in self._values:
+                return True
+            return self._load_if_fresh(kind, key, max_age) is not None
+
+    def changed(self, kind: str, key: Optional[str] = None) -> bool:
+        """Whether the last ``put`` in this run replaced different content."""
+
+        return self._changed.get(_entry_id(kind, str(key) if key is not None else None), False)
+
+    def fetched_at(self, kind: str, key: Optional[str] = None) -> Optional[float]:
+        record = self._manifest.get(_entry_id(kind, str(key) if key is not None else None))
+        return float(record["fetched_at"]) if record else None
+
+    def course_ids(self) -> List[str]:
+        """Return the saved course id list; its age never forces a re-fetch."""
+
+        payload = self.get("course_ids", max_age=float("inf"))
+        if payload is None:
+            # Lists written before the manifest existed are still usable.
+            try:
+                with open(artifact_path("course_ids"), "r") as handle:
+                    payload = json.load(handle)
+            except (OSError, ValueError):
+                payload = None
+        if isinstance(payload, list):
+            return [str(item) for item in payload]
+        return []
+
+    def sorted_urls(self, course_id: str, refresh: bool = False) -> dict:
+        """Return sorted URLs for a course, crawling Canvas only when stale."""
+
+        course_id = str(course_id)
+        if not refresh:
+            payload = self.get("sorted", course_id)
+            if isinstance(payload, dict):
+                return payload
+
+        modules = self.module_urls(course_id, refresh=refresh)
+
+        import pullModules
+
+        sorted_urls = pullModules.sortUrls(modules)
+        self.put("sorted", course_id, sorted_urls)
+        return sorted_urls
+
+    def module_urls(self, course_id: str, refresh: bool = False) -> List[str]:
+        course_id = str(course_id)
+        if not refresh:
+            payload = self.get("modules", course_id)
+            if isinstance(payload, list):
+                return payload
+
+        import pullModules
+
+        log.debug("Fetching modules for course %s from Canvas", course_id)
+        modules = pullModules.getCourseModules(course_id)
+        self.put("modules", course_id, modules)
+        return modules
+
+    def flush(self) -> None:
+        """Save manifest changes that are still batched in memory."""
+
+        with self._lock:
+            if self._dirty or self._removed:
+                self._save_manifest()
+
+    def entries(self) -> List[Tuple[str, dict]]:
+        with self._lock:
+            return sorted(self._manifest.items())
+
+    def forget(self, entry_ids: Iterable[str]) -> List[str]:
+        """Delete the files and manifest records of ``entry_ids``; returns the removed paths."""
+
+        removed: List[str] = []
+        with self._lock:
+            for entry_id in entry_ids:
+                record = self._manifest.pop(entry_id, None)
+                self._values.pop(entry_id, None)
+                self._changed.pop(entry_id, None)
+                self._dirty.discard(entry_id)
+                self._removed.add(entry_id)
+                kind, _, key = entry_id.partition("/")
+                path = record.get("path") if record else None
+                path = path or artifact_path(kind, key or None)
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                removed.append(path)
+            self._save_manifest()
+        return removed
+
+    def forget_path(self, path: str) -> None:
+        """Drop the manifest record of an artifact whose file was deleted elsewhere."""
+
+        target = os.path.normpath(path)
+        with self._lock:
+            stale = [
+                entry_id for entry_id, record in self._manifest.items()
+                if os.path.normpath(str(record.get("path", ""))) == target
+            ]
+            for entry_id in stale:
+                del self._manifest[entry_id]
+                self._values.pop(entry_id, None)
+                self._dirty.discard(entry_id)
+                self._removed.add(entry_id)
+            if stale:
+                self._save_manifest()
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    def _load_if_fresh(self, kind: str, key: Optional[str], max_age: Optional[float]):
+        record = self._manifest.get(_entry_id(kind, key))
+        if not record:
+            return None
+
+        limit = self.max_age if max_age is None else max_age
+        if record.get("run_id") != self.run_id and time.time() - float(record.get("fetched_at", 0)) > limit:
+            return None
+
+        try:
+            with open(artifact_path(kind, key), "r") as handle:
+                value = json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+        if content_hash(value) != record.get("sha256"):
+            # Edited or partially written since it was recorded.
+            return None
+        _touch(artifact_path(kind, key))
+        return value
+
+    def _load_manifest(self) -> Dict[str, dict]:
+        try:
+            with open(self._manifest_path, "r") as handle:
+                payload = json.load(handle)
+        except (OSError, ValueError):
+            return {}
+        return payload if isinstance(payload, dict) else {}
+
+    def _save_manifest(self) -> None:
+        """Merge this process' changes into the manifest on disk."""
+
+        with fileLock.locked(self._manifest_path):
+            merged = self._load_manifest()
+            for entry_id in self._removed:
+                merged.pop(entry_id, None)
+            for entry_id in self._dirty:
+                if entry_id in self._manifest:
+                    merged[entry_id] = self._manifest[entry_id]
+            fileLock.write_json(self._manifest_path, merged)
+        # Records written by other processes become visible here too.
+        self._manifest = merged
+        self._dirty.clear()
+        self._removed.clear()
+        self._flushed_at = time.monotonic()
+
+
+_current: Optional[ArtifactStore] = None
+_current_lock = threading.Lock()
+
+
+def current() -> ArtifactStore:
+    """Return the store for the running audit, creating one if needed."""
+
+    global _current
+    with _current_lock:
+        if _current is None:
+            _current = ArtifactStore()
+        return _current
+
+
+def current_run_id() -> Optional[str]:
+    """The run id of the active store, without creating one."""
+
+    store = _current
+    return store.run_id if store is not None else None
+
+
+def start_run(run_id: Optional[str] = None, max_age: float = DEFAULT_MAX_AGE) -> ArtifactStore:
+    """Begin a new run; artifacts from earlier runs must pass the freshness policy."""
+
+    global _current
+    with _current_lock:
+        if _current is not None:
+            _current.flush()
+        _current = ArtifactStore(run_id=run_id, max_age=max_age)
+        return _current
+
+
+@atexit.register
+def _flush_current() -> None:
+    store = _current
+    if store is not None:
+        store.flush()
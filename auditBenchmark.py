@@ -0,0 +1,488 @@
+"""Offline throughput benchmark against local stand-in services.
+
+Every real run hits production Canvas, so throughput could not be compared
+between changes. This harness starts one local HTTP server that emulates:
+
+* the Canvas API: ``/courses``, ``/courses/:id/modules``, module items and
+  the sessionless launch behind Panopto external tools, paginated with
+  ``Link`` headers and carrying ``X-Rate-Limit-Remaining``/``X-Request-Cost``
+  from a leaky-bucket budget (403 once exhausted, as Canvas does);
+* the Panopto OAuth token and ``sessions/:id/captions`` endpoints;
+* YouTube transcript lookups.
+
+It points ``pullModules``, ``youtubeVideo`` and ``panoptoVideo`` at the server,
+runs each stage in a scratch working directory, and reports courses/min,
+videos/min and peak memory. Catalog size, page size, response latency and the
+rate budget are configurable. The results are written to JSON. When a
+baseline from an earlier run is given, a throughput drop beyond the
+tolerance fails the run.
+
+Usage::
+
+    python auditBenchmark.py --courses 50 --latency 0.02
+    python auditBenchmark.py --baseline data/benchmark_baseline.json --tolerance 0.15
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.request
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+
+OUTPUT_PATH = os.path.join("data", "benchmark_results.json")
+
+
+@dataclass
+class Catalog:
+    """Shape of the fake Canvas instance and how the services behave."""
+
+    courses: int = 20
+    modules_per_course: int = 4
+    items_per_module: int = 12
+    youtube_share: float = 0.25
+    panopto_share: float = 0.25
+    caption_share: float = 0.7
+    page_size: int = 10
+    latency: float = 0.01
+    rate_capacity: float = 700.0
+    rate_leak: float = 10.0
+    request_cost: float = 1.0
+    seed: int = 1
+
+
+class _RateBucket:
+    """Canvas-style leaky bucket: each request costs units, the bucket refills over time."""
+
+    def __init__(self, capacity: float, leak: float) -> None:
+        self.capacity = capacity
+        self.leak = leak
+        self.remaining = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def spend(self, cost: float) -> Tuple[bool, float]:
+        with self.lock:
+            now = time.monotonic()
+            self.remaining = min(self.capacity, self.remaining + (now - self.updated) * self.leak)
+            self.updated = now
+            if self.remaining < cost:
+                return False, self.remaining
+            self.remaining -= cost
+            return True, self.remaining
+
+
+class FakeServices:
+    """Local Canvas, Panopto and YouTube stand-ins on one ``127.0.0.1`` port."""
+
+    def __init__(self, catalog: Catalog) -> None:
+        self.catalog = catalog
+        self.bucket = _RateBucket(catalog.rate_capacity, catalog.rate_leak)
+        self.stats: Dict[str, int] = {"requests": 0, "throttled": 0}
+        self._stats_lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self.base_url = ""
+
+    # ------------------------------------------------------------------
+    # Catalog
+    def course_ids(self) -> List[int]:
+        return [1000 + index for index in range(self.catalog.courses)]
+
+    def items(self, course_id: int, module_id: int) -> List[dict]:
+        rng = random.Random(f"{self.catalog.seed}-{course_id}-{module_id}")
+        items = []
+        for index in range(self.catalog.items_per_module):
+            item_id = module_id * 1000 + index
+            roll = rng.random()
+            if roll < self.catalog.youtube_share:
+                items.append(
+                    {
+                        "id": item_id,
+                        "type": "ExternalUrl",
+                        "title": f"Lecture {index}",
+                        "external_url": f"https://www.youtube.com/watch?v=vid{course_id}x{item_id}",
+                    }
+                )
+            elif roll < self.catalog.youtube_share + self.catalog.panopto_share:
+                session_id = f"{course_id:08d}-0000-4000-8000-{item_id:012d}"
+                items.append(
+                    {
+                        "id": item_id,
+                        "type": "ExternalTool",
+                        "title": f"Panopto recording {index}",
+                        "url": f"{self.base_url}/api/v1/courses/{course_id}/external_tools/sessionless_launch?id={session_id}",
+                        "external_url": "https://panopto.example.edu/Panopto/LTI/LTI.aspx",
+                    }
+                )
+            else:
+                items.append(
+                    {
+                        "id": item_id,
+                        "type": "Page",
+                        "title": f"Reading {index}",
+                        "url": f"{self.base_url}/api/v1/courses/{course_id}/pages/page-{item_id}",
+                    }
+                )
+        return items
+
+    def has_captions(self, key: str) -> bool:
+        return random.Random(f"{self.catalog.seed}-{key}").random() < self.catalog.caption_share
+
+    # ------------------------------------------------------------------
+    # Server lifecycle
+    def start(self) -> str:
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802 - http.server naming
+                services._handle(self, "GET")
+
+            def do_POST(self) -> None:  # noqa: N802 - http.server naming
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                services._handle(self, "POST")
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-services", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    # ------------------------------------------------------------------
+    # Routing
+    def _handle(self, request: BaseHTTPRequestHandler, method: str) -> None:
+        with self._stats_lock:
+            self.stats["requests"] += 1
+        if self.catalog.latency > 0:
+            time.sleep(self.catalog.latency)
+
+        parsed = urlparse(request.path)
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        path = parsed.path
+
+        if path.startswith("/api/v1/"):
+            self._canvas(request, path[len("/api/v1"):], query)
+        elif method == "POST" and path == "/Panopto/oauth2/connect/token":
+            self._send(request, 200, {"access_token": "benchmark-token", "expires_in": 3600})
+        elif match := re.fullmatch(r"/Panopto/api/v1/sessions/([^/]+)/captions", path):
+            captions = [{"Language": "English_USA", "Name": "Captions"}] if self.has_captions(match.group(1)) else []
+            self._send(request, 200, captions)
+        elif path == "/youtube/transcript":
+            video_id = query.get("v", "")
+            if self.has_captions(video_id):
+                self._send(request, 200, [{"text": "caption", "start": 0.0, "duration": 1.0}])
+            else:
+                self._send(request, 404, {"error": "TranscriptsDisabled"})
+        else:
+            self._send(request, 404, {"errors": [{"message": "not found"}]})
+
+    def _canvas(self, request: BaseHTTPRequestHandler, path: str, query: Dict[str, str]) -> None:
+        allowed, remaining = self.bucket.spend(self.catalog.request_cost)
+        headers = {
+            "X-Rate-Limit-Remaining": f"{remaining:.1f}",
+            "X-Request-Cost": f"{self.catalog.request_cost:.1f}",
+        }
+        if not allowed:
+            with self._stats_lock:
+                self.stats["throttled"] += 1
+            self._send(request, 403, "403 Forbidden (Rate Limit Exceeded)", headers)
+            return
+
+        if path == "/courses":
+            records = [{"id": course_id, "name": f"Course {course_id}"} for course_id in self.course_ids()]
+            self._send_page(request, path, query, records, headers)
+            return
+
+        match = re.fullmatch(r"/courses/(\d+)/modules", path)
+        if match:
+            course_id = int(match.group(1))
+            records = [
+                {
+                    "id": course_id * 100 + index,
+                    "name": f"Module {index}",
+                    "items_url": f"{self.base_url}/api/v1/courses/{course_id}/modules/{course_id * 100 + index}/items",
+                }
+                for index in range(self.catalog.modules_per_course)
+            ]
+            self._send_page(request, path, query, records, headers)
+            return
+
+        match = re.fullmatch(r"/courses/(\d+)/modules/(\d+)/items", path)
+        if match:
+            records = self.items(int(match.group(1)), int(match.group(2)))
+            self._send_page(request, path, query, records, headers)
+            return
+
+        if re.fullmatch(r"/courses/\d+/external_tools/sessionless_launch", path):
+            session_id = query.get("id", "")
+            launch = {
+                "id": session_id,
+                "name": "Panopto",
+                "url": f"{self.base_url}/Panopto/Pages/Viewer.aspx?id={session_id}",
+            }
+            self._send(request, 200, launch, headers)
+            return
+
+        self._send(request, 404, {"errors": [{"message": "not found"}]}, headers)
+
+    def _send_page(
+        self,
+        request: BaseHTTPRequestHandler,
+        path: str,
+        query: Dict[str, str],
+        records: List[dict],
+        headers: Dict[str, str],
+    ) -> None:
+        per_page = min(int(query.get("per_page", self.catalog.page_size)), self.catalog.page_size)
+        page = max(1, int(query.get("page", 1)))
+        start = (page - 1) * per_page
+        links = []
+        if start + per_page < len(records):
+            next_query = urlencode({"page": page + 1, "per_page": per_page})
+            links.append(f'<{self.base_url}/api/v1{path}?{next_query}>; rel="next"')
+        first_query = urlencode({"page": 1, "per_page": per_page})
+        links.append(f'<{self.base_url}/api/v1{path}?{first_query}>; rel="first"')
+        self._send(request, 200, records[start : start + per_page], {**headers, "Link": ", ".join(links)})
+
+    @staticmethod
+    def _send(
+        request: BaseHTTPRequestHandler, status: int, payload: object, headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain"
+        else:
+            body, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(body)
+
+
+def _transcript_api_for(base_url: str) -> type:
+    """A stand-in for ``YouTubeTranscriptApi`` that asks the local server instead."""
+
+    class LocalTranscriptApi:
+        def __init__(self, http_client=None) -> None:
+            pass
+
+        def fetch(self, video_id: str) -> list:
+            url = f"{base_url}/youtube/transcript?{urlencode({'v': video_id})}"
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    return json.loads(response.read())
+            except urllib.error.HTTPError as exc:
+                if exc.code == 404:
+                    # An empty transcript is recorded as "no captions", like TranscriptsDisabled.
+                    return []
+                raise RuntimeError(f"Transcript request for {video_id} failed ({exc.code})") from exc
+
+    return LocalTranscriptApi
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux (bytes on macOS, where this overstates by 1024x).
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _count_results(result_type: str) -> int:
+    import auditResults
+
+    return sum(1 for entry in auditResults.load_results() if entry.get("type") == result_type)
+
+
+def _run_phase(name: str, func: Callable[[], object], units: Callable[[], Dict[str, int]], minutes: float = 60.0) -> dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        func()
+        status = "ok"
+    except Exception as exc:
+        status = f"failed: {type(exc).__name__}: {exc}"
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    report = {
+        "stage": name,
+        "status": status,
+        "seconds": round(elapsed, 3),
+        "peak_traced_mb": round(peak / (1024 * 1024), 2),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+    for unit, count in units().items():
+        report[unit] = count
+        report[f"{unit}_per_min"] = round(count / elapsed * minutes, 1) if elapsed > 0 else None
+    return report
+
+
+def run_benchmark(catalog: Catalog, youtube_delay: float = 0.0) -> dict:
+    """Run the three stages against fresh fake services; returns the report."""
+
+    import artifactStore
+    import panoptoVideo
+    import pullModules
+    import youtubeVideo
+
+    services = FakeServices(catalog)
+    base_url = services.start()
+    original_cwd = os.getcwd()
+    saved = (
+        pullModules.CANVAS_BASE_URL,
+        youtubeVideo.YouTubeTranscriptApi,
+        youtubeVideo.PROBE_DELAY,
+        panoptoVideo.CLIENT_ID,
+        panoptoVideo.CLIENT_SECRET,
+        panoptoVideo.FOLDER_IDS,
+    )
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="cc-audit-bench-") as scratch:
+            # Every stage reads and writes data/ relative to the working directory.
+            os.chdir(scratch)
+            os.makedirs("data", exist_ok=True)
+
+            pullModules.CANVAS_BASE_URL = f"{base_url}/api/v1"
+            youtubeVideo.YouTubeTranscriptApi = _transcript_api_for(base_url)
+            youtubeVideo.PROBE_DELAY = youtube_delay
+            panoptoVideo.CLIENT_ID = panoptoVideo.CLIENT_SECRET = "benchmark"
+            panoptoVideo.FOLDER_IDS = []
+            artifactStore.start_run()
+
+            phases = [
+                _run_phase("pullModules", pullModules.main, lambda: {"courses": len(artifactStore.current().course_ids())}),
+                _run_phase("youtubeVideo", youtubeVideo.main, lambda: {"videos": _count_results("youtube")}),
+                _run_phase("panoptoVideo", panoptoVideo.main, lambda: {"videos": _count_results("panopto")}),
+            ]
+            # Save batched manifest records while the scratch directory still exists.
+            artifactStore.current().flush()
+    finally:
+        os.chdir(original_cwd)
+        (
+            pullModules.CANVAS_BASE_URL,
+            youtubeVideo.YouTubeTranscriptApi,
+            youtubeVideo.PROBE_DELAY,
+            panoptoVideo.CLIENT_ID,
+            panoptoVideo.CLIENT_SECRET,
+            panoptoVideo.FOLDER_IDS,
+        ) = saved
+        services.stop()
+
+    return {
+        "created_at": time.time(),
+        "catalog": asdict(catalog),
+        "server": dict(services.stats),
+        "phases": phases,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Return descriptions of throughput figures that dropped more than ``tolerance``."""
+
+    previous = {phase["stage"]: phase for phase in baseline.get("phases", [])}
+    regressions = []
+    for phase in report["phases"]:
+        old = previous.get(phase["stage"])
+        if not old:
+            continue
+        for key, value in phase.items():
+            if not key.endswith("_per_min") or not value or not old.get(key):
+                continue
+            if value < old[key] * (1 - tolerance):
+                regressions.append(f"{phase['stage']} {key}: {value} vs baseline {old[key]}")
+    return regressions
+
+
+def _print_report(report: dict) -> None:
+    print(f"{'stage':<14} {'status':<8} {'seconds':>8} {'units/min':>14} {'peak MB':>8} {'rss MB':>8}")
+    for phase in report["phases"]:
+        rates = ", ".join(f"{key[:-8]} {value}" for key, value in phase.items() if key.endswith("_per_min"))
+        status = "ok" if phase["status"] == "ok" else "failed"
+        print(
+            f"{phase['stage']:<14} {status:<8} {phase['seconds']:>8.2f} {rates:>14} "
+            f"{phase['peak_traced_mb']:>8.2f} {phase['peak_rss_mb'] if phase['peak_rss_mb'] is not None else '-':>8}"
+        )
+        if status != "ok":
+            print(f"  {phase['status']}")
+    print(f"fake services: {report['server']['requests']} requests, {report['server']['throttled']} throttled")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    defaults = Catalog()
+    parser = argparse.ArgumentParser(description="Offline audit throughput benchmark.")
+    parser.add_argument("--courses", type=int, default=defaults.courses)
+    parser.add_argument("--modules", type=int, default=defaults.modules_per_course, help="modules per course")
+    parser.add_argument("--items", type=int, default=defaults.items_per_module, help="items per module")
+    parser.add_argument("--page-size", type=int, default=defaults.page_size, help="records per Canvas page")
+    parser.add_argument("--latency", type=float, default=defaults.latency, help="seconds added to every response")
+    parser.add_argument("--rate-capacity", type=float, default=defaults.rate_capacity, help="Canvas rate bucket size")
+    parser.add_argument("--rate-leak", type=float, default=defaults.rate_leak, help="Canvas rate units restored per second")
+    parser.add_argument("--youtube-delay", type=float, default=0.0, help="youtubeVideo.PROBE_DELAY during the run")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--baseline", help="earlier report to compare throughput against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed throughput drop vs baseline")
+    args = parser.parse_args(argv)
+
+    catalog = Catalog(
+        courses=args.courses,
+        modules_per_course=args.modules,
+        items_per_module=args.items,
+        page_size=args.page_size,
+        latency=args.latency,
+        rate_capacity=args.rate_capacity,
+        rate_leak=args.rate_leak,
+        seed=args.seed,
+    )
+    report = run_benchmark(catalog, youtube_delay=args.youtube_delay)
+    _print_report(report)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as handle:
+        json.dump(report, handle, indent=4)
+    print(f"Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as handle:
+            regressions = compare(report, json.load(handle), args.tolerance)
+        for line in regressions:
+            print(f"Regression: {line}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
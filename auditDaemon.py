@@ -0,0 +1,281 @@
+"""Long-running audit daemon that re-audits courses by priority.
+
+Instead of running ``runAudit.py`` by hand, the daemon keeps a persistent
+schedule in ``data/audit_schedule.json`` and, during a nightly window, audits
+the most urgent courses first:
+
+1. courses that have never been audited, or whose last audit failed;
+2. courses that start soon (``start_at`` within ``SOON_DAYS``);
+3. courses whose module content changed since the previous crawl;
+4. everything else, oldest verdict first.
+
+Each cycle stops at the end of the window or after ``max_courses`` courses,
+and spaces course audits ``pace`` seconds apart to stay within the Canvas and
+video platform rate limits. The Panopto auditor, the Canvas browser and the
+Canvas HTTP session stay warm across cycles.
+
+Usage::
+
+    python auditDaemon.py --window 22:00-06:00 --max-courses 200 --pace 5
+    python auditDaemon.py --once          # run a single cycle now and exit
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import signal
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import artifactStore
+import auditLog
+import auditMetrics
+import auditResults
+import auditTrace
+import fileLock
+import pullModules
+import videoCheckers
+
+
+log = auditLog.get_logger("auditDaemon")
+
+SCHEDULE_PATH = os.path.join("data", "audit_schedule.json")
+DEFAULT_WINDOW = "22:00-06:00"
+SOON_DAYS = 14
+STALE_DAYS = 7
+
+
+def parse_window(value: str) -> Tuple[int, int]:
+    """Parse ``HH:MM-HH:MM`` into start/end minutes after midnight."""
+
+    start, end = value.split("-", 1)
+
+    def minutes(text: str) -> int:
+        hours, mins = text.strip().split(":", 1)
+        return int(hours) * 60 + int(mins)
+
+    return minutes(start), minutes(end)
+
+
+def window_bounds(window: Tuple[int, int], now: datetime) -> Tuple[datetime, datetime]:
+    """Return the start and end of the window that contains or follows ``now``."""
+
+    start_min, end_min = window
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    start = midnight + timedelta(minutes=start_min)
+    end = midnight + timedelta(minutes=end_min)
+    if end <= start:
+        # Window crosses midnight, e.g. 22:00-06:00.
+        if now < end:
+            start -= timedelta(days=1)
+        else:
+            end += timedelta(days=1)
+    if now >= end:
+        start += timedelta(days=1)
+        end += timedelta(days=1)
+    return start, end
+
+
+def _parse_time(value: object) -> Optional[float]:
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def course_priority(course: dict, record: dict, now: float) -> float:
+    """Higher scores are audited first."""
+
+    score = 0.0
+    last_audited = record.get("last_audited")
+
+    if not last_audited or record.get("last_status") != "ok":
+        score += 1000.0
+    elif record.get("unknown", 0):
+        score += 500.0
+
+    starts_at = _parse_time(course.get("start_at"))
+    if starts_at is not None:
+        days_until = (starts_at - now) / 86400
+        if -SOON_DAYS <= days_until <= SOON_DAYS:
+            score += 300.0 * (1 - abs(days_until) / SOON_DAYS)
+
+    if record.get("content_changed_at") and (
+        not last_audited or record["content_changed_at"] >= last_audited
+    ):
+        score += 200.0
+
+    if last_audited:
+        age_days = (now - last_audited) / 86400
+        score += min(age_days, 90.0) * (5.0 if age_days >= STALE_DAYS else 1.0)
+
+    return score
+
+
+class AuditDaemon:
+    """Runs priority-ordered audit cycles inside a nightly window."""
+
+    def __init__(
+        self,
+        window: Tuple[int, int] = parse_window(DEFAULT_WINDOW),
+        max_courses: int = 200,
+        pace: float = 5.0,
+        schedule_path: str = SCHEDULE_PATH,
+    ) -> None:
+        self.window = window
+        self.max_courses = max_courses
+        self.pace = pace
+        self.schedule_path = schedule_path
+        self.schedule = self._load_schedule()
+        self._stop = threading.Event()
+        self._checkers = videoCheckers.Checkers()
+
+    # ------------------------------------------------------------------
+    # public helpers
+    def stop(self, *_args) -> None:
+        self._stop.set()
+
+    def run_forever(self) -> None:
+        try:
+            while not self._stop.is_set():
+                start, end = window_bounds(self.window, datetime.now())
+                if datetime.now() < start:
+                    wait = (start - datetime.now()).total_seconds()
+                    log.info("Next audit window opens at %s", f"{start:%Y-%m-%d %H:%M}")
+                    self._stop.wait(wait)
+                    continue
+
+                self.run_cycle(deadline=end.timestamp())
+                # Sleep out the rest of the window once the budget is spent.
+                self._stop.wait(max(0.0, end.timestamp() - time.time()))
+        finally:
+            self.close()
+
+    def run_cycle(self, deadline: Optional[float] = None) -> List[str]:
+        """Audit courses in priority order until the budget or deadline runs out."""
+
+        store = artifactStore.start_run()
+        auditTrace.start(f"daemon-{store.run_id}")
+        courses = self._refresh_courses()
+        queue = self.prioritize(courses)
+        audited: List[str] = []
+
+        log.info("Audit cycle starting with %s candidate courses", len(queue))
+        for course_id in queue:
+            if self._stop.is_set() or len(audited) >= self.max_courses:
+                break
+            if deadline is not None and time.time() >= deadline:
+                break
+
+            self.audit_course(course_id)
+            audited.append(course_id)
+            self._stop.wait(self.pace)
+
+        log.info("Audit cycle finished; audited %s courses", len(audited))
+        auditMetrics.set_gauge("daemon_courses_audited", len(audited))
+        auditMetrics.export()
+        auditTrace.finish()
+        return audited
+
+    def prioritize(self, courses: Dict[str, dict]) -> List[str]:
+        now = time.time()
+        scored = [
+            (course_priority(course, self.schedule.get(course_id, {}), now), course_id)
+            for course_id, course in courses.items()
+        ]
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [course_id for _, course_id in scored]
+
+    def audit_course(self, course_id: str) -> None:
+        store = artifactStore.current()
+        record = self.schedule.setdefault(course_id, {})
+        started = time.time()
+
+        try:
+            store.sorted_urls(course_id, refresh=True)
+            if store.changed("sorted", course_id):
+                record["content_changed_at"] = started
+
+            videos = videoCheckers.course_videos(course_id)
+            verdicts = self._checkers.check_grouped(videos)
+            auditResults.upsert_results(
+                videoCheckers.result_entry(platform, url, verdict, reason, course_id)
+                for (platform, url), (verdict, reason) in verdicts.items()
+            )
+            record["last_status"] = "ok"
+            record["videos"] = len(videos)
+            record["unknown"] = sum(1 for verdict, _ in verdicts.values() if verdict in ("unknown", "error"))
+        except Exception as exc:
+            log.error("Error auditing course %s: %s", course_id, exc)
+            record["last_status"] = "error"
+            record["error"] = f"{type(exc).__name__}: {exc}"
+        finally:
+            record["last_audited"] = time.time()
+            record["seconds"] = round(time.time() - started, 3)
+            self._save_schedule()
+
+    def close(self) -> None:
+        self._checkers.close()
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    def _refresh_courses(self) -> Dict[str, dict]:
+        store = artifactStore.current()
+        try:
+            courses = pullModules.get_courses()
+        except Exception as exc:
+            log.error("Error refreshing course list: %s", exc)
+            courses = []
+
+        if courses:
+            store.put("courses", None, courses)
+            store.put("course_ids", None, [course["id"] for course in courses])
+        else:
+            saved = store.get("courses", max_age=float("inf"))
+            courses = saved if isinstance(saved, list) else []
+
+        return {str(course["id"]): course for course in courses if "id" in course}
+
+    def _load_schedule(self) -> Dict[str, dict]:
+        try:
+            with open(self.schedule_path, "r") as handle:
+                payload = json.load(handle)
+        except (OSError, ValueError):
+            return {}
+        return payload if isinstance(payload, dict) else {}
+
+    def _save_schedule(self) -> None:
+        fileLock.write_json(self.schedule_path, self.schedule)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Priority-ordered caption audit daemon.")
+    parser.add_argument("--window", default=DEFAULT_WINDOW, help="nightly window, HH:MM-HH:MM")
+    parser.add_argument("--max-courses", type=int, default=200, help="courses per cycle")
+    parser.add_argument("--pace", type=float, default=5.0, help="seconds between course audits")
+    parser.add_argument("--once", action="store_true", help="run one cycle now and exit")
+    args = parser.parse_args(argv)
+
+    daemon = AuditDaemon(parse_window(args.window), args.max_courses, args.pace)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+
+    if args.once:
+        try:
+            daemon.run_cycle()
+        finally:
+            daemon.close()
+        return
+
+    daemon.run_forever()
+
+
+if __name__ == "__main__":
+    auditLog.configure()
+    main()
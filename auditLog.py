@@ -0,0 +1,214 @@
+"""Leveled, structured logging for the audit scripts.
+
+Modules log through ``auditLog.get_logger("<module>")`` instead of printing;
+entry points call :func:`configure` to install the handlers. Records go through a :class:`logging.handlers.QueueHandler`, so the calling
+thread only pays for a level check and a queue put. A background
+:class:`~logging.handlers.QueueListener` writes them to the console and, as
+JSON lines, to ``data/logs/audit.log``. Per-item debug messages (every
+classified URL, every ExternalTool response) are below the default ``INFO``
+level and are never formatted unless enabled.
+
+Repetitive messages are rate limited: after ``BURST`` records with the same
+template inside ``WINDOW_SECONDS``, only every ``SAMPLE``-th one is emitted,
+annotated with how many were suppressed.
+
+Configuration comes from the environment:
+
+* ``CC_AUDIT_LOG_LEVEL``: default level (``INFO``);
+* ``CC_AUDIT_LOG_LEVELS``: per-module overrides, e.g.
+  ``pullModules=DEBUG,panoptoVideo=WARNING``;
+* ``CC_AUDIT_LOG_FILE``: JSON-lines log path; empty to disable.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+ROOT = "ccaudit"
+LOG_PATH = os.path.join("data", "logs", "audit.log")
+DEFAULT_LEVEL = os.environ.get("CC_AUDIT_LOG_LEVEL", "INFO")
+MAX_BYTES = 5 * 1024 * 1024
+BACKUPS = 3
+
+BURST = 20
+WINDOW_SECONDS = 60.0
+SAMPLE = 100
+
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class RepeatFilter(logging.Filter):
+    """Rate-limit records that share a logger and message template."""
+
+    def __init__(self, burst: int = BURST, window: float = WINDOW_SECONDS, sample: int = SAMPLE) -> None:
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.sample = max(1, sample)
+        self._lock = threading.Lock()
+        # (logger, template) -> [window start, seen in window, suppressed since last emit]
+        self._seen: Dict[Tuple[str, object], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.CRITICAL:
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            state = self._seen.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                state = [now, 0, 0]
+                self._seen[key] = state
+            else:
+                suppressed = state[2]
+            state[1] += 1
+
+            if state[1] > self.burst and (state[1] - self.burst) % self.sample:
+                state[2] += 1
+                return False
+            state[2] = 0
+
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including any ``extra=`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name[len(ROOT) + 1:] if record.name.startswith(ROOT + ".") else record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and key not in payload:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """``HH:MM:SS LEVEL module: message`` lines for the terminal and the GUI."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        module = record.name.rsplit(".", 1)[-1]
+        text = f"{self.formatTime(record, '%H:%M:%S')} {record.levelname:<7} {module}: {record.getMessage()}"
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            text += f" [{suppressed} similar messages suppressed]"
+        return text
+
+
+def _parse_levels(spec: str) -> Dict[str, str]:
+    levels: Dict[str, str] = {}
+    for part in spec.split(","):
+        if "=" in part:
+            name, level = part.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure(
+    level: Optional[str] = None,
+    module_levels: Optional[Dict[str, str]] = None,
+    log_file: Optional[str] = None,
+    console: bool = True,
+    force: bool = False,
+) -> None:
+    """Install the queue handler and start the background writer.
+
+    Entry points (``main()`` blocks, the GUI) call this once; importing a
+    module never does, so it creates no log file. Call it again with
+    ``force=True`` to change levels or the log file, e.g. per worker process.
+    """
+
+    global _listener
+    with _lock:
+        if _listener is not None and not force:
+            return
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+        root = logging.getLogger(ROOT)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.propagate = False
+        root.setLevel((level or DEFAULT_LEVEL).upper())
+
+        levels = _parse_levels(os.environ.get("CC_AUDIT_LOG_LEVELS", ""))
+        levels.update(module_levels or {})
+        for name, module_level in levels.items():
+            logging.getLogger(f"{ROOT}.{name}").setLevel(module_level)
+
+        handlers = []
+        # Windowed (PyInstaller --noconsole) builds have no stdout.
+        if console and sys.stdout is not None:
+            stream = logging.StreamHandler(sys.stdout)
+            stream.setFormatter(ConsoleFormatter())
+            handlers.append(stream)
+
+        path = os.environ.get("CC_AUDIT_LOG_FILE", LOG_PATH) if log_file is None else log_file
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                file_handler = logging.handlers.RotatingFileHandler(
+                    path, maxBytes=MAX_BYTES, backupCount=BACKUPS, encoding="utf-8"
+                )
+                file_handler.setFormatter(JsonFormatter())
+                handlers.append(file_handler)
+            except OSError as exc:
+                sys.stderr.write(f"Unable to open log file {path}: {exc}\n")
+
+        records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(records)
+        queue_handler.addFilter(RepeatFilter())
+        root.addHandler(queue_handler)
+
+        _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+
+
+def shutdown() -> None:
+    """Flush queued records and stop the writer thread."""
+
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Return the logger for module ``name`` (e.g. ``"pullModules"``).
+
+    Until an entry point calls :func:`configure`, records go to Python's
+    default handling (warnings and errors on stderr).
+    """
+
+    return logging.getLogger(f"{ROOT}.{name}")
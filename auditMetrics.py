@@ -0,0 +1,276 @@
+"""Process-wide metrics for audit runs.
+
+Counters, latency histograms and gauges are recorded for every outbound call
+(Canvas API by endpoint, YouTube transcript probes, Panopto API calls), every
+Selenium page load and every results write, along with Canvas rate-limit
+headroom and job queue depths. At the end of a run :func:`export` writes a
+Prometheus text file (for the node_exporter textfile collector or a quick
+``grep``) and a JSON summary with counts and latency percentiles, which is
+what to look at when sizing worker pools or spotting a slow upstream.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import auditLog
+import fileLock
+
+
+log = auditLog.get_logger("auditMetrics")
+
+PROMETHEUS_PATH = os.path.join("data", "metrics.prom")
+SUMMARY_PATH = os.path.join("data", "metrics.json")
+
+# Histogram bucket upper bounds in seconds, from fast API calls to page loads.
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Raw samples kept per histogram series for the percentiles in the JSON summary.
+MAX_SAMPLES = 5000
+
+_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F-]{32,36})$")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict[str, object]]) -> LabelKey:
+    return tuple(sorted((str(key), str(value)) for key, value in (labels or {}).items()))
+
+
+class _Histogram:
+    def __init__(self) -> None:
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.samples: List[float] = []
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[index] += 1
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(value)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class Registry:
+    """Thread-safe store of counters, gauges and histograms."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+
+    def inc(self, name: str, labels: Optional[Dict[str, object]] = None, value: float = 1) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, labels: Optional[Dict[str, object]] = None) -> None:
+        with self._lock:
+            self.gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, seconds: float, labels: Optional[Dict[str, object]] = None) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            series.setdefault(key, _Histogram()).observe(seconds)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started_at = time.time()
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    # ------------------------------------------------------------------
+    # Export
+    def prometheus_text(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self.gauges.items()):
+                lines.append(f"# TYPE {name} gauge")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, hist in sorted(series.items()):
+                    for bound, count in zip(BUCKETS, hist.buckets):
+                        bucket_key = key + (("le", f"{bound:g}"),)
+                        lines.append(f"{name}_bucket{_format_labels(bucket_key)} {count}")
+                    inf_key = key + (("le", "+Inf"),)
+                    lines.append(f"{name}_bucket{_format_labels(inf_key)} {hist.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {hist.total:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "started_at": self.started_at,
+                "exported_at": time.time(),
+                "counters": {
+                    name: [{"labels": dict(key), "value": value} for key, value in sorted(series.items())]
+                    for name, series in sorted(self.counters.items())
+                },
+                "gauges": {
+                    name: [{"labels": dict(key), "value": value} for key, value in sorted(series.items())]
+                    for name, series in sorted(self.gauges.items())
+                },
+                "latency": {
+                    name: [
+                        {
+                            "labels": dict(key),
+                            "count": hist.count,
+                            "total_seconds": round(hist.total, 6),
+                            "mean_seconds": round(hist.total / hist.count, 6) if hist.count else None,
+                            "p50_seconds": hist.percentile(0.5),
+                            "p95_seconds": hist.percentile(0.95),
+                            "max_seconds": max(hist.samples) if hist.samples else None,
+                        }
+                        for key, hist in sorted(series.items())
+                    ]
+                    for name, series in sorted(self.histograms.items())
+                },
+            }
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in key) + "}"
+
+
+REGISTRY = Registry()
+
+
+def inc(name: str, labels: Optional[Dict[str, object]] = None, value: float = 1) -> None:
+    REGISTRY.inc(name, labels, value)
+
+
+def set_gauge(name: str, value: float, labels: Optional[Dict[str, object]] = None) -> None:
+    REGISTRY.set(name, value, labels)
+
+
+def observe(name: str, seconds: float, labels: Optional[Dict[str, object]] = None) -> None:
+    REGISTRY.observe(name, seconds, labels)
+
+
+@contextmanager
+def timed(name: str, **labels: object) -> Iterator[Dict[str, object]]:
+    """Count and time a block as ``<name>_total`` / ``<name>_seconds``.
+
+    The yielded dict may be updated inside the block (e.g. with an
+    ``outcome``); an exception records ``outcome="error"``.
+    """
+
+    extra: Dict[str, object] = {}
+    started = time.perf_counter()
+    try:
+        yield extra
+    except BaseException:
+        extra.setdefault("outcome", "error")
+        raise
+    finally:
+        extra.setdefault("outcome", "ok")
+        elapsed = time.perf_counter() - started
+        observe(f"{name}_seconds", elapsed, labels)
+        inc(f"{name}_total", {**labels, **extra})
+
+
+def endpoint_for(url: str) -> str:
+    """Collapse a URL path into an endpoint template, e.g. ``/courses/:id/modules``."""
+
+    path = urlparse(url).path
+    for prefix in ("/api/v1", "/Panopto/api/v1"):
+        if path.startswith(prefix):
+            path = path[len(prefix):]
+            break
+    segments = [":id" if _ID_SEGMENT.match(part) else part for part in path.split("/") if part]
+    return "/" + "/".join(segments)
+
+
+def instrument_session(session, service: str) -> None:
+    """Record every response of a ``requests.Session`` by endpoint and status.
+
+    Canvas responses also update the ``X-Rate-Limit-Remaining`` headroom gauge
+    and add their ``X-Request-Cost`` to ``rate_limit_cost_total``.
+    """
+
+    def hook(response, *_args, **_kwargs):
+        labels = {"service": service, "endpoint": endpoint_for(response.url)}
+        observe("http_request_seconds", response.elapsed.total_seconds(), labels)
+        inc("http_requests_total", {**labels, "status": response.status_code})
+        remaining = response.headers.get("X-Rate-Limit-Remaining")
+        if remaining is not None:
+            try:
+                set_gauge("rate_limit_remaining", float(remaining), {"service": service})
+            except ValueError:
+                pass
+        cost = response.headers.get("X-Request-Cost")
+        if cost is not None:
+            try:
+                inc("rate_limit_cost_total", {"service": service}, float(cost))
+            except ValueError:
+                pass
+        return response
+
+    session.hooks.setdefault("response", []).append(hook)
+
+
+def record_queue_depths(depths: Dict[str, Dict[str, int]]) -> None:
+    """Publish ``jobQueue.counts`` output as ``queue_jobs{kind,status}`` gauges."""
+
+    for kind, statuses in depths.items():
+        for status, count in statuses.items():
+            set_gauge("queue_jobs", count, {"kind": kind, "status": status})
+
+
+def paths_for(tag: str) -> Tuple[str, str]:
+    """Per-process export paths, so parallel workers do not overwrite each other."""
+
+    base, _ = os.path.splitext(PROMETHEUS_PATH)
+    return f"{base}-{tag}.prom", f"{os.path.splitext(SUMMARY_PATH)[0]}-{tag}.json"
+
+
+def export(prometheus_path: Optional[str] = PROMETHEUS_PATH, summary_path: Optional[str] = SUMMARY_PATH) -> None:
+    """Write the Prometheus text file and JSON summary for the run so far."""
+
+    set_gauge("run_seconds", time.time() - REGISTRY.started_at)
+    outputs = []
+    if prometheus_path:
+        outputs.append((prometheus_path, REGISTRY.prometheus_text()))
+    if summary_path:
+        outputs.append((summary_path, json.dumps(REGISTRY.summary(), indent=4)))
+
+    for path, text in outputs:
+        try:
+            fileLock.write_text(path, text)
+        except OSError as exc:
+            log.warning("Unable to write metrics to %s: %s", path, exc)
@@ -0,0 +1,441 @@
+"""Dry-run cost estimate for a full audit.
+
+Nothing is checked and nothing is written to the results. :func:`plan` counts
+the work a ``runAudit.py`` run would do from the saved course list and the
+module and sorted-URL files left by earlier runs (stale ones included: they
+are only used for counting). Courses without saved data get one cheap Canvas
+query each, the module listing, whose ``items_count`` gives the number of
+items without fetching them. Their video mix is taken from the courses that
+were counted.
+
+From the counts it estimates the Canvas API calls and their rate-limit cost,
+YouTube probes, Panopto API, delivery-info and browser checks, and Selenium
+page loads. Each is turned into stage times using the mean latencies in
+``data/metrics.json``. When the same files also hold the previous run's stage
+times (``data/stage_timings.json``), each stage's model is scaled by how far
+it was off for that run. Without history, the ``DEFAULT_SECONDS`` guesses are
+used and the report says so.
+
+Usage::
+
+    python auditPlanner.py
+    python auditPlanner.py --no-probe --window-hours 8
+    python runAudit.py --dry-run
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+from typing import Dict, List, Optional, Sequence
+
+import artifactStore
+import auditLog
+import auditMetrics
+import auditProgress
+import stageRunner
+
+
+log = auditLog.get_logger("auditPlanner")
+
+OUTPUT_PATH = os.path.join("data", "audit_plan.json")
+
+# Seconds per operation when no earlier run measured it.
+DEFAULT_SECONDS = {
+    "canvas_request": 0.35,
+    "youtube_probe": 0.8,
+    "panopto_api": 0.4,
+    "panopto_delivery": 0.5,
+    "panopto_page": 4.0,
+    "canvas_page": 3.0,
+}
+# Share of Panopto sessions that fall through to the browser when no earlier run measured it.
+DEFAULT_BROWSER_SHARE = {"api": 0.05, "no_api": 0.1}
+DEFAULT_ITEMS_PER_MODULE = 10.0
+# Canvas' leaky bucket: capacity in cost units and refill per second (the benchmark uses the same figures).
+CANVAS_RATE_CAPACITY = float(os.environ.get("CC_AUDIT_CANVAS_RATE_CAPACITY", "700"))
+CANVAS_RATE_LEAK = float(os.environ.get("CC_AUDIT_CANVAS_RATE_LEAK", "10"))
+PAGE_SIZE = 100
+
+
+def _read_json(path: str) -> Optional[object]:
+    try:
+        with open(path, "r") as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+class History:
+    """Latencies, counts and stage times measured by the previous run."""
+
+    def __init__(self, metrics_path: str = auditMetrics.SUMMARY_PATH, timings_path: str = stageRunner.TIMINGS_PATH) -> None:
+        metrics = _read_json(metrics_path)
+        timings = _read_json(timings_path)
+        self.metrics = metrics if isinstance(metrics, dict) else {}
+        self.stage_seconds: Dict[str, float] = {}
+        if isinstance(timings, dict):
+            for stage in timings.get("stages", []):
+                if stage.get("status") == "ok":
+                    self.stage_seconds[stage["name"]] = float(stage.get("seconds", 0))
+
+    def _latency(self, name: str, **labels: str) -> List[dict]:
+        return [
+            sample for sample in self.metrics.get("latency", {}).get(name, [])
+            if all(sample.get("labels", {}).get(key) == value for key, value in labels.items())
+        ]
+
+    def mean(self, name: str, **labels: str) -> Optional[float]:
+        samples = self._latency(name, **labels)
+        count = sum(sample.get("count", 0) for sample in samples)
+        return sum(sample.get("total_seconds", 0) for sample in samples) / count if count else None
+
+    def count(self, name: str, **labels: str) -> int:
+        return sum(int(sample.get("count", 0)) for sample in self._latency(name, **labels))
+
+    def counter(self, name: str, **labels: str) -> float:
+        return sum(
+            float(sample.get("value", 0))
+            for sample in self.metrics.get("counters", {}).get(name, [])
+            if all(sample.get("labels", {}).get(key) == value for key, value in labels.items())
+        )
+
+    def seconds(self) -> Dict[str, float]:
+        """Seconds per operation: measured where possible, otherwise ``DEFAULT_SECONDS``."""
+
+        measured = {
+            "canvas_request": self.mean("http_request_seconds", service="canvas"),
+            "youtube_probe": self.mean("youtube_probe_seconds"),
+            "panopto_api": self.mean("http_request_seconds", service="panopto_api"),
+            "panopto_delivery": self.mean("http_request_seconds", service="panopto_delivery"),
+            "panopto_page": self.mean("page_load_seconds", stage="panopto"),
+            "canvas_page": self.mean("page_load_seconds", stage="canvas"),
+        }
+        return {name: value if value is not None else DEFAULT_SECONDS[name] for name, value in measured.items()}
+
+    def measured(self) -> List[str]:
+        return [name for name, value in {
+            "canvas_request": self.count("http_request_seconds", service="canvas"),
+            "youtube_probe": self.count("youtube_probe_seconds"),
+            "panopto_api": self.count("http_request_seconds", service="panopto_api"),
+            "panopto_delivery": self.count("http_request_seconds", service="panopto_delivery"),
+            "panopto_page": self.count("page_load_seconds", stage="panopto"),
+            "canvas_page": self.count("page_load_seconds", stage="canvas"),
+        }.items() if value]
+
+    def request_cost(self) -> float:
+        """Mean Canvas ``X-Request-Cost`` per request; 1 unit when never measured."""
+
+        requests_made = self.counter("http_requests_total", service="canvas")
+        cost = self.counter("rate_limit_cost_total", service="canvas")
+        return cost / requests_made if requests_made and cost else 1.0
+
+    def browser_share(self, api: bool) -> float:
+        """Share of Panopto sessions the previous run had to open in the browser."""
+
+        pages = self.count("page_load_seconds", stage="panopto")
+        checked = self.count("http_request_seconds", service="panopto_api" if api else "panopto_delivery")
+        if not checked:
+            return DEFAULT_BROWSER_SHARE["api" if api else "no_api"]
+        return min(1.0, pages / checked)
+
+
+def _count_sorted(sorted_urls: dict) -> Dict[str, int]:
+    import panoptoVideo
+
+    youtube = [
+        url for url in sorted_urls.get("youtube") or []
+        if isinstance(url, str) and ("youtube.com/watch?v=" in url or "youtu.be/" in url)
+    ]
+    sessions = set()
+    external_tools = 0
+    for url in sorted_urls.get("panopto") or []:
+        if not isinstance(url, str):
+            continue
+        external_tools += "_panopto_video=true" in url
+        key = panoptoVideo.session_key(url)
+        if key is not None:
+            sessions.add(key)
+    canvas = [url for url in sorted_urls.get("canvas") or [] if isinstance(url, str)]
+    return {"youtube": len(youtube), "panopto": len(sessions), "canvas": len(canvas), "external_tools": external_tools}
+
+
+def _probe_modules(course_id: str) -> Optional[Dict[str, int]]:
+    """One paginated modules listing: module and item counts without fetching the items."""
+
+    import pullModules
+    import transport
+
+    modules = items = calls = 0
+    try:
+        for response in transport.paginate(
+            pullModules.SESSION,
+            f"{pullModules.CANVAS_BASE_URL}/courses/{course_id}/modules",
+            {"per_page": PAGE_SIZE},
+            pullModules.HEADERS,
+        ):
+            calls += 1
+            for module in response.json():
+                modules += 1
+                items += int(module.get("items_count") or 0)
+    except transport.TransportError as exc:
+        log.warning("Could not count modules for course %s: %s", course_id, exc)
+        return None
+    return {"modules": modules, "items": items, "calls": calls}
+
+
+def course_counts(course_ids: Sequence[str], probe: bool = True, max_probes: int = 500) -> List[dict]:
+    """Per-course module, item and video counts, marked ``cached``, ``probed`` or ``estimated``."""
+
+    counted: List[dict] = []
+    for course_id in course_ids:
+        course_id = str(course_id)
+        record: Dict[str, object] = {"course_id": course_id}
+        sorted_urls = _read_json(artifactStore.artifact_path("sorted", course_id))
+        modules = _read_json(artifactStore.artifact_path("modules", course_id))
+        if isinstance(sorted_urls, dict):
+            record.update(_count_sorted(sorted_urls))
+            record["items"] = len(modules) if isinstance(modules, list) else sum(
+                len(value) for value in sorted_urls.values() if isinstance(value, list)
+            )
+            record["source"] = "cached"
+        elif probe and max_probes > 0:
+            max_probes -= 1
+            probed = _probe_modules(course_id)
+            record.update(probed or {})
+            record["source"] = "probed" if probed else "estimated"
+        else:
+            record["source"] = "estimated"
+        counted.append(record)
+    return counted
+
+
+def _fill_estimates(courses: List[dict]) -> Dict[str, float]:
+    """Give probed and uncounted courses the video mix of the counted ones; returns the ratios."""
+
+    known = [course for course in courses if course["source"] == "cached"]
+    items = sum(int(course.get("items", 0)) for course in known)
+    ratios = {
+        name: (sum(int(course.get(name, 0)) for course in known) / items) if items else 0.0
+        for name in ("youtube", "panopto", "canvas", "external_tools")
+    }
+    probed = [course for course in courses if "modules" in course]
+    probed_items = sum(int(course["items"]) for course in probed)
+    probed_modules = sum(int(course["modules"]) for course in probed)
+    ratios["items_per_module"] = probed_items / probed_modules if probed_modules else DEFAULT_ITEMS_PER_MODULE
+    ratios["items_per_course"] = (
+        (items + probed_items) / (len(known) + len(probed)) if known or probed else 0.0
+    )
+
+    for course in courses:
+        if course["source"] == "estimated":
+            course["items"] = round(ratios["items_per_course"])
+        if course["source"] != "cached":
+            for name in ("youtube", "panopto", "canvas", "external_tools"):
+                course[name] = round(int(course["items"]) * ratios[name])
+        if "modules" not in course:
+            course["modules"] = max(1, math.ceil(int(course["items"]) / ratios["items_per_module"]))
+    return ratios
+
+
+def plan(
+    course_ids: Optional[Sequence[str]] = None,
+    probe: bool = True,
+    max_probes: int = 500,
+    resume: bool = False,
+    history: Optional[History] = None,
+) -> dict:
+    """Estimate the calls, checks and wall-clock time of a full audit.
+
+    Raises ``ValueError`` when there is no saved course list and ``probe`` is
+    off, since an estimate for zero courses would pass for an empty audit.
+    """
+
+    import panoptoVideo
+    import youtubeVideo
+
+    history = history or History()
+    planning_calls = 0
+    if course_ids is None:
+        course_ids = artifactStore.current().course_ids()
+        if not course_ids and probe:
+            import pullModules
+
+            courses = pullModules.get_courses()
+            course_ids = [str(course["id"]) for course in courses]
+            planning_calls += max(1, math.ceil(len(course_ids) / PAGE_SIZE))
+        elif not course_ids:
+            raise ValueError("No saved course list to plan from; run without --no-probe or crawl the courses first.")
+    courses = course_counts(course_ids, probe, max_probes)
+    planning_calls += sum(int(course.get("calls", 0)) for course in courses)
+    ratios = _fill_estimates(courses)
+
+    checkpoint = auditProgress.Checkpoint.load() if resume else None
+    done_stages = checkpoint.stages_done if checkpoint else set()
+    already = {platform: len(urls) for platform, urls in (checkpoint.checked if checkpoint else {}).items()}
+
+    def total(name: str) -> int:
+        return sum(int(course.get(name, 0)) for course in courses)
+
+    # A fresh run re-crawls every course; a resumed one reuses the crawl.
+    crawl = "pullModules" not in done_stages and not resume
+    canvas_calls = 0
+    if crawl:
+        canvas_calls = math.ceil(len(courses) / PAGE_SIZE) + sum(
+            math.ceil(max(1, int(course["modules"])) / PAGE_SIZE)
+            + int(course["modules"])
+            + math.ceil(int(course["items"]) / PAGE_SIZE)
+            + int(course["external_tools"])
+            for course in courses
+        )
+    youtube = 0 if "youtubeVideo" in done_stages else max(0, total("youtube") - already.get("youtube", 0))
+    panopto = 0 if "panoptoVideo" in done_stages else max(0, total("panopto") - already.get("panopto", 0))
+    canvas_pages = 0 if "sortEmbeddedVideos" in done_stages else max(0, total("canvas") - already.get("canvas", 0))
+
+    api = bool(panoptoVideo.CLIENT_ID and panoptoVideo.CLIENT_SECRET)
+    browser_share = history.browser_share(api)
+    panopto_browser = round(panopto * browser_share)
+    panopto_api = panopto if api else 0
+    panopto_delivery = panopto_browser if api else panopto
+
+    seconds = history.seconds()
+    workers = panoptoVideo.API_WORKERS
+    cost = history.request_cost()
+    rate_units = canvas_calls * cost
+    # Time Canvas needs to refill the bucket beyond its initial capacity.
+    rate_floor = max(0.0, rate_units - CANVAS_RATE_CAPACITY) / CANVAS_RATE_LEAK if CANVAS_RATE_LEAK else 0.0
+    model = {
+        "pullModules": lambda calls: calls * seconds["canvas_request"],
+        "youtubeVideo": lambda probes: probes * (youtubeVideo.PROBE_DELAY + seconds["youtube_probe"]),
+        "panoptoVideo": lambda sessions: (
+            (sessions if api else 0) * seconds["panopto_api"] / workers
+            + (sessions * browser_share if api else sessions) * seconds["panopto_delivery"] / workers
+            + sessions * browser_share * seconds["panopto_page"]
+        ),
+        "sortEmbeddedVideos": lambda pages: pages * seconds["canvas_page"],
+    }
+    units = {"pullModules": canvas_calls, "youtubeVideo": youtube, "panoptoVideo": panopto, "sortEmbeddedVideos": canvas_pages}
+    previous_units = {
+        "pullModules": int(history.counter("http_requests_total", service="canvas")),
+        "youtubeVideo": history.count("youtube_probe_seconds"),
+        "panoptoVideo": history.count("http_request_seconds", service="panopto_api" if api else "panopto_delivery"),
+        "sortEmbeddedVideos": history.count("page_load_seconds", stage="canvas"),
+    }
+
+    stages: Dict[str, dict] = {}
+    for name, estimate in model.items():
+        predicted = estimate(units[name])
+        # Scale by how far the same model was off for the previous run's actual stage time.
+        factor = 1.0
+        if history.stage_seconds.get(name) and previous_units[name]:
+            modelled = estimate(previous_units[name])
+            if modelled > 0:
+                factor = history.stage_seconds[name] / modelled
+        predicted *= factor
+        if name == "pullModules":
+            predicted = max(predicted, rate_floor)
+        stages[name] = {"units": units[name], "seconds": round(predicted, 1), "calibration": round(factor, 2)}
+
+    # The platform stages start together once the Canvas pull finishes.
+    platform_seconds = max(stages[name]["seconds"] for name in ("youtubeVideo", "panoptoVideo", "sortEmbeddedVideos"))
+    wall_clock = stages["pullModules"]["seconds"] + platform_seconds
+
+    sources: Dict[str, int] = {}
+    for course in courses:
+        sources[course["source"]] = sources.get(course["source"], 0) + 1
+
+    return {
+        "courses": len(courses),
+        "course_sources": sources,
+        "planning_calls": planning_calls,
+        "resume": resume,
+        "canvas": {
+            "api_calls": canvas_calls,
+            "rate_limit_units": round(rate_units, 1),
+            "rate_limit_capacity": CANVAS_RATE_CAPACITY,
+            "throttle_floor_seconds": round(rate_floor, 1),
+        },
+        "youtube": {"probes": youtube},
+        "panopto": {
+            "sessions": panopto,
+            "api_checks": panopto_api,
+            "delivery_checks": panopto_delivery,
+            "browser_checks": panopto_browser,
+            "browser_share": round(browser_share, 3),
+        },
+        "selenium": {"page_loads": panopto_browser + canvas_pages, "canvas_pages": canvas_pages},
+        "stages": stages,
+        "seconds_per_operation": {name: round(value, 3) for name, value in seconds.items()},
+        "measured": history.measured(),
+        "ratios": {name: round(value, 4) for name, value in ratios.items()},
+        "wall_clock_seconds": round(wall_clock, 1),
+        "critical_stage": max(("youtubeVideo", "panoptoVideo", "sortEmbeddedVideos"), key=lambda name: stages[name]["seconds"]),
+    }
+
+
+def _hours(seconds: float) -> str:
+    return f"{int(seconds // 3600)}h{int(seconds % 3600 // 60):02d}m"
+
+
+def format_plan(estimate: dict, window_hours: Optional[float] = None) -> str:
+    sources = ", ".join(f"{count} {name}" for name, count in sorted(estimate["course_sources"].items())) or "none"
+    canvas, panopto = estimate["canvas"], estimate["panopto"]
+    lines = [
+        f"Courses: {estimate['courses']} ({sources}); {estimate['planning_calls']} Canvas calls made to plan",
+        f"Canvas API calls: {canvas['api_calls']:,} costing {canvas['rate_limit_units']:,.0f} rate-limit units "
+        f"(bucket {canvas['rate_limit_capacity']:,.0f}); throttling adds at least {_hours(canvas['throttle_floor_seconds'])}",
+        f"YouTube probes: {estimate['youtube']['probes']:,}",
+        f"Panopto sessions: {panopto['sessions']:,}: {panopto['api_checks']:,} API, "
+        f"{panopto['delivery_checks']:,} delivery-info, {panopto['browser_checks']:,} browser "
+        f"({panopto['browser_share']:.0%} browser share)",
+        f"Selenium page loads: {estimate['selenium']['page_loads']:,} ({estimate['selenium']['canvas_pages']:,} Canvas media pages)",
+        "Stages:",
+    ]
+    for name, stage in estimate["stages"].items():
+        lines.append(f"  {name:<20} {stage['units']:>8,} units  {_hours(stage['seconds']):>8}  x{stage['calibration']:.2f}")
+    lines.append(
+        f"Estimated wall clock: {_hours(estimate['wall_clock_seconds'])} "
+        f"(Canvas pull, then {estimate['critical_stage']} is the longest platform stage)"
+    )
+    guessed = sorted(set(DEFAULT_SECONDS) - set(estimate["measured"]))
+    if guessed:
+        lines.append(f"No earlier measurements for: {', '.join(guessed)}; defaults were used.")
+    if not estimate["courses"]:
+        lines.append("No courses were found, so there is nothing to estimate.")
+    elif window_hours is not None:
+        window = window_hours * 3600
+        if estimate["wall_clock_seconds"] <= window:
+            lines.append(f"Fits in a {window_hours:g}h window.")
+        else:
+            share = window / estimate["wall_clock_seconds"] if estimate["wall_clock_seconds"] else 1.0
+            lines.append(
+                f"Does not fit in a {window_hours:g}h window; roughly {int(estimate['courses'] * share):,} "
+                f"courses would (see auditDaemon.py --max-courses or jobQueue.py workers)."
+            )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Estimate the cost and duration of a full audit without running it.")
+    parser.add_argument("--no-probe", action="store_true", help="make no Canvas calls; estimate uncounted courses from the counted ones")
+    parser.add_argument("--max-probes", type=int, default=500, help="most courses to count with a modules query")
+    parser.add_argument("--resume", action="store_true", help="estimate resuming the saved checkpoint instead of a fresh run")
+    parser.add_argument("--window-hours", type=float, help="report whether the audit fits in this scheduling window")
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    args = parser.parse_args(argv)
+
+    try:
+        estimate = plan(probe=not args.no_probe, max_probes=args.max_probes, resume=args.resume)
+    except ValueError as exc:
+        parser.error(str(exc))
+    print(format_plan(estimate, args.window_hours))
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as handle:
+        json.dump(estimate, handle, indent=4)
+
+
+if __name__ == "__main__":
+    auditLog.configure()
+    main()
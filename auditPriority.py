@@ -0,0 +1,189 @@
+"""Value order for deadline-bounded audits.
+
+A run with a deadline (``runAudit.py --deadline 06:00`` or
+``--time-budget 6h``) seldom finishes everything, so it does the most
+valuable work first. Once :func:`auditProgress.set_deadline` is active:
+
+* :func:`crawl_order` crawls courses that were never crawled first, then
+  courses by enrollment (Canvas' ``total_students``), largest first. The
+  crawl stops at :data:`CRAWL_SHARE` of the time budget so checks always get
+  the rest.
+* :func:`course_ids` hands the platform stages only the courses that were
+  crawled, so no stage crawls Canvas behind the deadline's back.
+* :func:`order` sorts each stage's videos into three tiers. Videos without a
+  definite verdict come first (never checked, ``unknown`` or ``error``).
+  Verdicts older than :data:`STALE_DAYS` come next, then everything else.
+  Within a tier, videos from larger courses go first and older verdicts
+  before newer ones.
+
+Without a deadline every function returns its input unchanged, so normal
+runs behave exactly as before. When the deadline stops the run,
+:func:`remaining` counts what is left for the resume checkpoint.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import artifactStore
+import auditLog
+import auditProgress
+import auditResults
+import videoCheckers
+
+
+log = auditLog.get_logger("auditPriority")
+
+# Verdicts older than this many days are re-checked before fresher ones.
+STALE_DAYS = 30.0
+# Share of the time budget the Canvas crawl may use before the checks start.
+CRAWL_SHARE = 0.5
+
+_lock = threading.Lock()
+_latest: Optional[Dict[Tuple[str, str], dict]] = None
+_queued: Dict[str, List[str]] = {}
+
+
+def parse_deadline(value: str, now: Optional[datetime] = None) -> float:
+    """Epoch seconds for ``HH:MM`` (its next occurrence) or an ISO date and time."""
+
+    now = now or datetime.now()
+    if re.fullmatch(r"\d{1,2}:\d{2}", value.strip()):
+        hours, minutes = value.strip().split(":")
+        at = now.replace(hour=int(hours), minute=int(minutes), second=0, microsecond=0)
+        if at <= now:
+            at += timedelta(days=1)
+        return at.timestamp()
+    return datetime.fromisoformat(value.strip()).timestamp()
+
+
+def parse_budget(value: str) -> float:
+    """Seconds in a budget like ``90m``, ``6h``, ``1h30m`` or a plain number of seconds."""
+
+    text = value.strip().lower()
+    if re.fullmatch(r"\d+(\.\d+)?", text):
+        return float(text)
+    parts = re.findall(r"(\d+(?:\.\d+)?)\s*([hms])", text)
+    if not parts or "".join(number + unit for number, unit in parts) != text.replace(" ", ""):
+        raise ValueError(f"Unrecognised time budget: {value}")
+    return sum(float(number) * {"h": 3600, "m": 60, "s": 1}[unit] for number, unit in parts)
+
+
+def active() -> bool:
+    return auditProgress.deadline() is not None
+
+
+def crawl_deadline(deadline: float, now: Optional[float] = None) -> float:
+    """When the Canvas crawl has to stop so the checks keep the rest of the budget."""
+
+    now = time.time() if now is None else now
+    return now + max(0.0, deadline - now) * CRAWL_SHARE
+
+
+def reset() -> None:
+    """Forget the results snapshot and queues of the previous run."""
+
+    global _latest
+    with _lock:
+        _latest = None
+        _queued.clear()
+
+
+def enrollments() -> Dict[str, int]:
+    """``total_students`` per course id from the saved course list."""
+
+    courses = artifactStore.current().get("courses", max_age=float("inf"))
+    if not isinstance(courses, list):
+        return {}
+    return {str(course["id"]): int(course.get("total_students") or 0) for course in courses if "id" in course}
+
+
+def crawl_order(course_ids: Sequence[object]) -> List[object]:
+    """Never-crawled courses first, then by enrollment; unchanged without a deadline."""
+
+    if not active():
+        return list(course_ids)
+    store = artifactStore.current()
+    students = enrollments()
+    return sorted(
+        course_ids,
+        key=lambda course: (store.fetched_at("sorted", str(course)) is not None, -students.get(str(course), 0)),
+    )
+
+
+def course_ids() -> List[str]:
+    """The run's course ids; with a deadline only crawled ones, largest first."""
+
+    store = artifactStore.current()
+    courses = store.course_ids()
+    if not active():
+        return courses
+    students = enrollments()
+    crawled = [course for course in courses if store.is_fresh("sorted", course)]
+    if len(crawled) < len(courses):
+        log.info("Checking the %s of %s courses crawled before the crawl deadline", len(crawled), len(courses))
+    return sorted(crawled, key=lambda course: -students.get(course, 0))
+
+
+def _latest_results() -> Dict[Tuple[str, str], dict]:
+    global _latest
+    with _lock:
+        if _latest is None:
+            _latest = {}
+            for entry in auditResults.load_results():
+                if not isinstance(entry, dict) or "url" not in entry:
+                    continue
+                key = (str(entry.get("type")), entry["url"])
+                previous = _latest.get(key)
+                if previous is None or float(entry.get("checked_at") or 0) >= float(previous.get("checked_at") or 0):
+                    _latest[key] = entry
+        return _latest
+
+
+def value_key(platform: str, course_id: object, url: str, students: Dict[str, int], now: float) -> Tuple[int, int, float]:
+    """Sort key: tier (0 no definite verdict, 1 stale, 2 fresh), then enrollment, then verdict age."""
+
+    entry = _latest_results().get((videoCheckers.RESULT_TYPES[platform], url))
+    checked_at = float(entry.get("checked_at") or 0) if entry else 0.0
+    if entry is None or auditResults.captions_for(auditResults.entry_verdict(entry)) is None:
+        tier = 0
+    elif checked_at < now - STALE_DAYS * 86400:
+        tier = 1
+    else:
+        tier = 2
+    return tier, -students.get(str(course_id), 0), checked_at
+
+
+def order(platform: str, videos: Sequence[Tuple[object, str]]) -> List[Tuple[object, str]]:
+    """Sort ``[(course_id, url), …]`` by value; unchanged without a deadline."""
+
+    if not active():
+        return list(videos)
+    students = enrollments()
+    now = time.time()
+    keyed = sorted(
+        ((value_key(platform, course_id, url, students, now), (course_id, url)) for course_id, url in videos),
+        key=lambda item: item[0],
+    )
+    with _lock:
+        _queued[platform] = [url for _, (_, url) in keyed]
+    counts = [0, 0, 0]
+    for key, _ in keyed:
+        counts[key[0]] += 1
+    log.info("%s queue: %s without a verdict, %s stale, %s fresh", platform, *counts)
+    return [video for _, video in keyed]
+
+
+def remaining(checkpoint: auditProgress.Checkpoint) -> Dict[str, int]:
+    """Queued videos per platform that the checkpoint has no verdict for."""
+
+    with _lock:
+        queued = {platform: list(urls) for platform, urls in _queued.items()}
+    return {
+        platform: len({url for url in urls if not checkpoint.is_checked(platform, url)})
+        for platform, urls in queued.items()
+    }
@@ -0,0 +1,318 @@
+"""Progress events, cancellation and resumable checkpoints for audit runs.
+
+The audit stages report what they are doing through :func:`emit`: the course
+list size, each crawled course, how many videos a stage is about to check
+and each verdict. Subscribers (the GUI worker) receive every event with a
+running snapshot: current stage, courses done, videos checked and an ETA.
+
+Cancellation is cooperative. :func:`request_cancel` sets a flag that the
+stages check between courses and between videos via :func:`check_cancelled`,
+which raises :class:`AuditCancelled`. A run with a deadline
+(:func:`set_deadline`) stops the same way once it passes, with
+:class:`DeadlineReached`. Every verdict is recorded in
+``data/audit_checkpoint.json`` as it is written, along with the finished
+stages and the run id. A resumed run therefore reuses the run's crawled
+Canvas data and only checks the videos that had no verdict yet. A
+checkpoint of a single-course audit records its ``course_id`` and is only
+resumed by an audit of that course.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Set
+
+import auditLog
+import auditMetrics
+import fileLock
+
+
+log = auditLog.get_logger("auditProgress")
+
+CHECKPOINT_PATH = os.path.join("data", "audit_checkpoint.json")
+# Verdicts between checkpoint writes; the file is also saved on cancel and stage end.
+SAVE_EVERY = 25
+
+
+class AuditCancelled(Exception):
+    """Raised at a safe point after cancellation was requested."""
+
+
+class DeadlineReached(AuditCancelled):
+    """Raised at a safe point once the run's deadline has passed."""
+
+
+_cancel = threading.Event()
+_deadline: Optional[float] = None
+_lock = threading.Lock()
+_subscribers: List[Callable[[dict], None]] = []
+_state: Dict[str, object] = {}
+
+
+def reset() -> None:
+    """Clear the cancel flag and counters before a new run."""
+
+    _cancel.clear()
+    with _lock:
+        _state.clear()
+        _state.update(
+            {
+                "started_at": time.time(),
+                "stages": [],
+                "courses_total": 0,
+                "courses_done": 0,
+                "videos_total": 0,
+                "videos_checked": 0,
+            }
+        )
+
+
+reset()
+
+
+def request_cancel() -> None:
+    _cancel.set()
+
+
+def cancelled() -> bool:
+    return _cancel.is_set()
+
+
+def set_deadline(at: Optional[float]) -> None:
+    """Stop the run at the first safe point after ``at`` (epoch seconds); ``None`` clears it."""
+
+    global _deadline
+    _deadline = at
+
+
+def deadline() -> Optional[float]:
+    return _deadline
+
+
+def deadline_reached() -> bool:
+    return _deadline is not None and time.time() >= _deadline
+
+
+def check_cancelled() -> None:
+    if _cancel.is_set():
+        raise AuditCancelled("Audit cancelled")
+    if deadline_reached():
+        raise DeadlineReached("Audit deadline reached")
+
+
+def subscribe(callback: Callable[[dict], None]) -> Callable[[], None]:
+    """Receive every event; returns a function that unsubscribes."""
+
+    with _lock:
+        _subscribers.append(callback)
+
+    def unsubscribe() -> None:
+        with _lock:
+            if callback in _subscribers:
+                _subscribers.remove(callback)
+
+    return unsubscribe
+
+
+def _eta(state: Dict[str, object]) -> Optional[float]:
+    total = int(state["courses_total"]) + int(state["videos_total"])
+    done = int(state["courses_done"]) + int(state["videos_checked"])
+    elapsed = time.time() - float(state["started_at"])
+    if done <= 0 or total <= done or elapsed <= 0:
+        return None
+    return (total - done) * elapsed / done
+
+
+def emit(kind: str, **fields: object) -> None:
+    """Update the running counters for ``kind`` and notify subscribers.
+
+    Known kinds: ``stage_started``/``stage_finished`` (``stage``),
+    ``courses_total`` (``count``), ``course_done`` (``course_id``),
+    ``videos_queued`` (``stage``, ``count``) and ``video_checked``
+    (``platform``, ``url``).
+    """
+
+    with _lock:
+        stages = list(_state["stages"])
+        if kind == "stage_started":
+            stages.append(fields.get("stage"))
+        elif kind == "stage_finished" and fields.get("stage") in stages:
+            stages.remove(fields.get("stage"))
+        elif kind == "courses_total":
+            _state["courses_total"] = int(fields.get("count", 0))
+        elif kind == "course_done":
+            _state["courses_done"] = int(_state["courses_done"]) + 1
+        elif kind == "videos_queued":
+            _state["videos_total"] = int(_state["videos_total"]) + int(fields.get("count", 0))
+        elif kind == "video_checked":
+            _state["videos_checked"] = int(_state["videos_checked"]) + 1
+        _state["stages"] = stages
+
+        event = dict(fields)
+        event.update(
+            {
+                "kind": kind,
+                "stage": ", ".join(str(stage) for stage in stages) or fields.get("stage"),
+                "courses_total": _state["courses_total"],
+                "courses_done": _state["courses_done"],
+                "videos_total": _state["videos_total"],
+                "videos_checked": _state["videos_checked"],
+                "elapsed_seconds": time.time() - float(_state["started_at"]),
+                "eta_seconds": _eta(_state),
+            }
+        )
+        subscribers = list(_subscribers)
+
+    for callback in subscribers:
+        try:
+            callback(event)
+        except Exception as exc:
+            log.warning("Progress subscriber failed: %s", exc)
+
+
+class Checkpoint:
+    """Run id, finished stages and checked videos of an interrupted run."""
+
+    def __init__(self, path: str = CHECKPOINT_PATH) -> None:
+        self.path = path
+        self.run_id = uuid.uuid4().hex[:12]
+        self.stages_done: Set[str] = set()
+        self.checked: Dict[str, Set[str]] = {}
+        # Work left when a deadline stopped the run: videos per platform and uncrawled courses.
+        self.remaining: Dict[str, int] = {}
+        # Set for a single-course audit; None for a full run.
+        self.course_id: Optional[str] = None
+        # Loaded from disk, i.e. continuing an interrupted run.
+        self.resumed = False
+        self._lock = threading.Lock()
+        # Held for a whole save, so concurrent stages never publish an older snapshot over a newer one.
+        self._save_lock = threading.Lock()
+        self._unsaved = 0
+
+    @classmethod
+    def load(cls, path: str = CHECKPOINT_PATH) -> Optional["Checkpoint"]:
+        try:
+            with open(path, "r") as handle:
+                payload = json.load(handle)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(payload, dict) or not payload.get("run_id"):
+            return None
+
+        checkpoint = cls(path)
+        checkpoint.resumed = True
+        checkpoint.run_id = str(payload["run_id"])
+        checkpoint.stages_done = set(payload.get("stages_done", []))
+        checkpoint.checked = {
+            platform: set(urls) for platform, urls in (payload.get("checked") or {}).items()
+        }
+        checkpoint.remaining = dict(payload.get("remaining") or {})
+        checkpoint.course_id = payload.get("course_id")
+        return checkpoint
+
+    def is_checked(self, platform: str, url: str) -> bool:
+        with self._lock:
+            return url in self.checked.get(platform, ())
+
+    def mark_checked(self, platform: str, url: str) -> None:
+        with self._lock:
+            self.checked.setdefault(platform, set()).add(url)
+            self._unsaved += 1
+            due = self._unsaved >= SAVE_EVERY
+        if due:
+            self.save()
+
+    def stage_done(self, stage: str) -> None:
+        with self._lock:
+            self.stages_done.add(stage)
+        self.save()
+
+    def save(self) -> None:
+        with self._save_lock:
+            self._save()
+
+    def _save(self) -> None:
+        with self._lock:
+            payload = {
+                "run_id": self.run_id,
+                "saved_at": time.time(),
+                "stages_done": sorted(self.stages_done),
+                "checked": {platform: sorted(urls) for platform, urls in self.checked.items()},
+                "remaining": dict(self.remaining),
+            }
+            if self.course_id is not None:
+                payload["course_id"] = self.course_id
+            self._unsaved = 0
+        try:
+            fileLock.write_json(self.path, payload, indent=None)
+        except OSError as exc:
+            log.warning("Unable to save audit checkpoint: %s", exc)
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+_checkpoint: Optional[Checkpoint] = None
+
+
+def begin(resume: bool = False, course_id: Optional[str] = None) -> Checkpoint:
+    """Start tracking a run, continuing the saved checkpoint when ``resume`` is set.
+
+    ``course_id`` scopes the run to one course; a saved checkpoint is only
+    continued when it has the same scope.
+    """
+
+    global _checkpoint
+    course_id = str(course_id) if course_id is not None else None
+    checkpoint = Checkpoint.load() if resume else None
+    if checkpoint is not None and checkpoint.course_id != course_id:
+        log.info("The saved checkpoint belongs to another audit; starting a new run")
+        checkpoint = None
+    if checkpoint is None:
+        checkpoint = Checkpoint()
+        checkpoint.course_id = course_id
+    _checkpoint = checkpoint
+    reset()
+    return checkpoint
+
+
+def end() -> None:
+    global _checkpoint
+    _checkpoint = None
+
+
+def has_checkpoint(path: str = CHECKPOINT_PATH) -> bool:
+    return os.path.exists(path)
+
+
+def checkpoint_course(path: str = CHECKPOINT_PATH) -> Optional[str]:
+    """The course of a saved single-course checkpoint; ``None`` for a full run or no checkpoint."""
+
+    checkpoint = Checkpoint.load(path)
+    return checkpoint.course_id if checkpoint is not None else None
+
+
+def already_checked(platform: str, url: str) -> bool:
+    """True when a resumed run already has a verdict for ``url``."""
+
+    if _checkpoint is None or not _checkpoint.resumed:
+        return False
+    hit = _checkpoint.is_checked(platform, url)
+    auditMetrics.inc("cache_requests_total", {"cache": "resume_checkpoint", "result": "hit" if hit else "miss"})
+    return hit
+
+
+def video_checked(platform: str, url: str) -> None:
+    """Record a written verdict in the checkpoint and report it."""
+
+    if _checkpoint is not None:
+        _checkpoint.mark_checked(platform, url)
+    emit("video_checked", platform=platform, url=url)
+
@@ -0,0 +1,261 @@
+"""Shared writer for ``data/audited_videos.json``.
+
+Every platform stage appends its verdicts here. Stages may run concurrently,
+and queue workers, the event daemon and instance children in other
+processes, so every read-modify-write of the results and retry files holds
+an inter-process lock (``fileLock.locked``) and the file is replaced
+atomically.
+
+Every entry carries a ``verdict``: ``captions``, ``no_captions``,
+``unknown`` (the checks ran but could not tell, e.g. an unavailable video)
+or ``error`` (the check itself failed: throttling, server errors, a browser
+that would not start), with a ``reason`` for the last two and the
+``checked_at`` time. It also records the ``run_id`` that checked it and,
+when several Canvas instances are audited, the ``instance``.
+``has_captions`` is ``null`` unless the verdict is definite, so an
+unanswered check is never reported as "no captions"; ``reAudit.py``
+re-checks those entries later.
+
+Course crawls that fail are kept in ``data/retry_items.json`` instead, so
+the next run crawls just those again.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import artifactStore
+import auditMetrics
+import auditTrace
+import canvasInstances
+import fileLock
+
+
+RESULTS_PATH = os.path.join("data", "audited_videos.json")
+RETRY_PATH = os.path.join("data", "retry_items.json")
+
+VERDICTS = ("captions", "no_captions", "unknown", "error")
+
+_lock = threading.Lock()
+
+
+@contextmanager
+def _locked(file_path: str) -> Iterator[None]:
+    """Serialize a read-modify-write of ``file_path`` across threads and processes."""
+
+    with _lock, fileLock.locked(file_path):
+        yield
+
+
+def load_results(file_path: str = RESULTS_PATH) -> List[dict]:
+    try:
+        with open(file_path, "r") as handle:
+            data = json.load(handle)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+    return data if isinstance(data, list) else []
+
+
+def _write(data: List[dict], file_path: str) -> None:
+    with auditMetrics.timed("results_write"), auditTrace.span("results_write", "results", entries=len(data)):
+        fileLock.write_json(file_path, data)
+    auditMetrics.set_gauge("results_entries", len(data))
+
+
+def write_results(entries: Iterable[dict], file_path: str = RESULTS_PATH) -> None:
+    """Replace the whole results file with ``entries``."""
+
+    with _locked(file_path):
+        _write(list(entries), file_path)
+
+
+def append_results(entries: Iterable[dict], file_path: str = RESULTS_PATH) -> None:
+    entries = list(entries)
+    if not entries:
+        return
+
+    with _locked(file_path):
+        data = load_results(file_path)
+        data.extend(entries)
+        _write(data, file_path)
+
+
+def append_result(entry: dict, file_path: str = RESULTS_PATH) -> None:
+    append_results([entry], file_path)
+
+
+def verdict_for(has_captions: Optional[bool]) -> str:
+    if has_captions is None:
+        return "unknown"
+    return "captions" if has_captions else "no_captions"
+
+
+def captions_for(verdict: str) -> Optional[bool]:
+    """``has_captions`` for ``verdict``: ``None`` unless the verdict is definite."""
+
+    return {"captions": True, "no_captions": False}.get(verdict)
+
+
+def entry_verdict(entry: dict) -> str:
+    """The entry's verdict; entries written before verdicts existed derive it from ``has_captions``."""
+
+    verdict = entry.get("verdict")
+    return verdict if verdict in VERDICTS else verdict_for(entry.get("has_captions"))
+
+
+def make_entry(
+    result_type: str,
+    url: str,
+    verdict: str,
+    reason: Optional[str] = None,
+    course_id: Optional[str] = None,
+    **extra: object,
+) -> dict:
+    """Build a results entry; ``has_captions`` is ``None`` for ``unknown``/``error``."""
+
+    if verdict not in VERDICTS:
+        raise ValueError(f"Unknown verdict: {verdict}")
+    entry = {
+        "type": result_type,
+        "url": url,
+        "has_captions": captions_for(verdict),
+        "verdict": verdict,
+        "checked_at": round(time.time(), 3),
+    }
+    if reason:
+        entry["reason"] = reason
+    run_id = artifactStore.current_run_id()
+    if run_id:
+        entry["run_id"] = run_id
+    if course_id is not None:
+        entry["course_id"] = str(course_id)
+    instance = canvasInstances.tag()
+    if instance:
+        entry["instance"] = instance
+    entry.update(extra)
+    return entry
+
+
+def result_key(entry: dict) -> Tuple[str, str, str, str]:
+    """Identity of a verdict: platform type, URL and (when known) course and Canvas instance."""
+
+    return (
+        str(entry.get("type")),
+        str(entry.get("url")),
+        str(entry.get("course_id", "")),
+        str(entry.get("instance", "")),
+    )
+
+
+def video_key(entry: dict) -> Tuple[str, str, str]:
+    """Identity of the video a verdict is about, whichever course it was checked for."""
+
+    return str(entry.get("type")), str(entry.get("url")), str(entry.get("instance", ""))
+
+
+def upsert_results(
+    entries: Iterable[dict], file_path: str = RESULTS_PATH, remove: Iterable[Tuple[str, str, str, str]] = ()
+) -> None:
+    """Add ``entries``, replacing earlier verdicts for the same video.
+
+    Full runs write entries without a ``course_id``; daemon, queue and
+    targeted re-audits tag theirs with one. So that a video never carries two
+    conflicting verdicts, an entry replaces the earlier entry with the same
+    :func:`result_key` and any untagged entry for the same video, and an
+    untagged entry replaces every earlier entry for its video.
+
+    ``remove`` lists :func:`result_key` values to drop, e.g. Canvas pages
+    that turned out not to host a video.
+    """
+
+    entries = list(entries)
+    remove = set(remove)
+    if not entries and not remove:
+        return
+
+    replaced = {result_key(entry) for entry in entries} | remove
+    videos = {video_key(entry) for entry in entries}
+    untagged = {video_key(entry) for entry in entries if not entry.get("course_id")}
+
+    def superseded(entry: dict) -> bool:
+        video = video_key(entry)
+        return (
+            result_key(entry) in replaced
+            or video in untagged
+            or (not entry.get("course_id") and video in videos)
+        )
+
+    with _locked(file_path):
+        data = [entry for entry in load_results(file_path) if not superseded(entry)]
+        data.extend(entries)
+        _write(data, file_path)
+
+
+def remove_results(predicate: Callable[[dict], bool], file_path: str = RESULTS_PATH) -> int:
+    """Drop every entry for which ``predicate`` is true; returns how many were dropped."""
+
+    with _locked(file_path):
+        data = load_results(file_path)
+        kept = [entry for entry in data if not (isinstance(entry, dict) and predicate(entry))]
+        if len(kept) != len(data):
+            _write(kept, file_path)
+        return len(data) - len(kept)
+
+
+def retry_key(item: dict) -> Tuple[str, str, str, str]:
+    return (str(item.get("kind")), str(item.get("platform", "")), str(item.get("url", "")), str(item.get("course_id", "")))
+
+
+def record_retryable(
+    kind: str,
+    reason: str,
+    platform: str = "",
+    url: str = "",
+    course_id: Optional[str] = None,
+    file_path: str = RETRY_PATH,
+) -> None:
+    """Remember an item (e.g. ``kind="course"``) whose crawl failed.
+
+    Repeated failures of the same item update its entry and attempt count.
+    ``pullModules.main`` crawls failed courses first on the next run.
+    """
+
+    now = time.time()
+    item = {"kind": kind, "platform": platform, "url": url, "reason": reason, "last_failed_at": now}
+    if course_id is not None:
+        item["course_id"] = str(course_id)
+
+    key = retry_key(item)
+    with _locked(file_path):
+        items = load_results(file_path)
+        previous = next((entry for entry in items if retry_key(entry) == key), None)
+        item["first_failed_at"] = previous.get("first_failed_at", now) if previous else now
+        item["attempts"] = int(previous.get("attempts", 0)) + 1 if previous else 1
+        items = [entry for entry in items if retry_key(entry) != key]
+        items.append(item)
+        _write_retries(items, file_path)
+
+
+def load_retryable(file_path: str = RETRY_PATH) -> List[dict]:
+    return load_results(file_path)
+
+
+def clear_retryable(kind: str, platform: str = "", url: str = "", course_id: Optional[str] = None, file_path: str = RETRY_PATH) -> None:
+    """Drop an item from the retry list once it succeeded."""
+
+    key = retry_key({"kind": kind, "platform": platform, "url": url, "course_id": course_id if course_id is not None else ""})
+    with _locked(file_path):
+        items = load_results(file_path)
+        remaining = [entry for entry in items if retry_key(entry) != key]
+        if len(remaining) != len(items):
+            _write_retries(remaining, file_path)
+
+
+def _write_retries(items: List[dict], file_path: str) -> None:
+    fileLock.write_json(file_path, items)
+    auditMetrics.set_gauge("retry_items", len(items))
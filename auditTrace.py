@@ -0,0 +1,201 @@
+"""Per-video tracing timeline for audit runs.
+
+Spans cover the path a video takes through an audit: the course crawl, each
+page of Canvas module listings, module item resolution, the platform check
+and the results write. They are appended to ``data/traces/<run_id>.jsonl``
+as Chrome trace-event records (``"ph": "X"`` complete events with
+microsecond timestamps), one per line, so a slow course or URL can be found
+with ``grep``/``jq``. When the run finishes, :func:`finish` also writes a
+``<run_id>.trace.json`` that loads directly in ``chrome://tracing`` or
+https://ui.perfetto.dev.
+
+Tracing is off until :func:`start` is called; :func:`span` is then a cheap
+no-op.
+
+Usage::
+
+    python auditTrace.py chrome data/traces/<run_id>.jsonl   # convert an older trace
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+import auditLog
+
+
+log = auditLog.get_logger("auditTrace")
+
+TRACE_DIR = os.path.join("data", "traces")
+
+_lock = threading.Lock()
+_local = threading.local()
+_handle = None
+_path: Optional[str] = None
+_named_threads: set = set()
+
+
+def enabled() -> bool:
+    return _handle is not None
+
+
+def start(run_id: str, trace_dir: str = TRACE_DIR) -> str:
+    """Begin writing spans for ``run_id``; returns the JSONL path."""
+
+    global _handle, _path
+    os.makedirs(trace_dir, exist_ok=True)
+    path = os.path.join(trace_dir, f"{run_id}.jsonl")
+    with _lock:
+        if _handle is not None:
+            _handle.close()
+        _handle = open(path, "a", buffering=1)
+        _path = path
+        _named_threads.clear()
+    return path
+
+
+def finish() -> Optional[str]:
+    """Stop tracing and write the trace-viewer JSON; returns its path."""
+
+    global _handle, _path
+    with _lock:
+        if _handle is None:
+            return None
+        _handle.close()
+        path, _handle, _path = _path, None, None
+
+    try:
+        return to_chrome(path)
+    except (OSError, ValueError) as exc:
+        log.warning("Unable to convert trace %s: %s", path, exc)
+        return None
+
+
+def _emit(event: dict) -> None:
+    line = json.dumps(event, default=str)
+    with _lock:
+        if _handle is None:
+            return
+        thread_id = event["tid"]
+        if thread_id not in _named_threads:
+            _named_threads.add(thread_id)
+            _handle.write(
+                json.dumps(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": event["pid"],
+                        "tid": thread_id,
+                        "args": {"name": threading.current_thread().name},
+                    }
+                )
+                + "\n"
+            )
+        _handle.write(line + "\n")
+
+
+@contextmanager
+def span(name: str, cat: str, **args: object) -> Iterator[Dict[str, object]]:
+    """Record the enclosed block as one span.
+
+    ``args`` (course id, URL, …) are attached to the span; the yielded dict
+    may be updated inside the block, e.g. with the verdict. Nested spans
+    record their parent's name.
+    """
+
+    if _handle is None:
+        yield args
+        return
+
+    stack: List[str] = getattr(_local, "stack", None) or []
+    _local.stack = stack
+    if stack:
+        args["parent"] = stack[-1]
+    stack.append(name)
+    started = time.time()
+    try:
+        yield args
+    except BaseException as exc:
+        args["error"] = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        stack.pop()
+        _emit(
+            {
+                "name": name,
+                "cat": cat,
+                "ph": "X",
+                "ts": int(started * 1_000_000),
+                "dur": int((time.time() - started) * 1_000_000),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": args,
+            }
+        )
+
+
+def traced(name: str, cat: str, *fields: str, summarize: Optional[Callable[[object], object]] = None) -> Callable:
+    """Decorator: record each call as a span with the named arguments and its result.
+
+    ``summarize`` maps the result to what the span records, e.g. ``len`` for
+    functions that return long lists.
+    """
+
+    def decorate(func: Callable) -> Callable:
+        code = func.__code__
+        arg_names = code.co_varnames[: code.co_argcount]
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _handle is None:
+                return func(*args, **kwargs)
+            values = dict(zip(arg_names, args))
+            values.update(kwargs)
+            with span(name, cat, **{field: values.get(field) for field in fields}) as info:
+                result = func(*args, **kwargs)
+                info["result"] = summarize(result) if summarize is not None else result
+                return result
+
+        return wrapper
+
+    return decorate
+
+
+def to_chrome(jsonl_path: str, output: Optional[str] = None) -> str:
+    """Convert a JSONL trace into a ``{"traceEvents": [...]}`` file."""
+
+    events = []
+    with open(jsonl_path, "r") as handle:
+        for line in handle:
+            line = line.strip()
+            if line:
+                events.append(json.loads(line))
+
+    if output is None:
+        output = os.path.splitext(jsonl_path)[0] + ".trace.json"
+    with open(output, "w") as handle:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, handle)
+    return output
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Audit trace utilities.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    chrome = sub.add_parser("chrome", help="convert a JSONL trace for chrome://tracing / Perfetto")
+    chrome.add_argument("path")
+    chrome.add_argument("--output")
+    args = parser.parse_args(argv)
+
+    print(to_chrome(args.path, args.output))
+
+
+if __name__ == "__main__":
+    auditLog.configure()
+    main()
@@ -0,0 +1,76 @@
+"""Run an audit on a background thread and report its progress to the GUI.
+
+Tk is single-threaded, so the worker never touches widgets. Progress events
+from :mod:`auditProgress`, login prompts and the final outcome are put on
+:attr:`AuditWorker.events`; the GUI drains the queue with ``root.after``.
+The audit runs in-process rather than as a ``python runAudit.py``
+subprocess, so it also works from the packaged executable, which has no
+Python interpreter to launch.
+
+Final events are ``finished`` (``result``), ``cancelled`` and ``failed``
+(``error``).
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+from typing import Callable, Optional
+
+import auditLog
+import auditProgress
+
+
+log = auditLog.get_logger("auditWorker")
+
+
+class AuditWorker:
+    """Runs ``target(*args)`` once on a daemon thread."""
+
+    def __init__(self, target: Callable[..., object], *args: object, name: str = "audit") -> None:
+        self.target = target
+        self.args = args
+        self.name = name
+        self.events: "queue.Queue[dict]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-worker", daemon=True)
+        self._thread.start()
+
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def cancel(self) -> None:
+        """Ask the audit to stop at its next safe point."""
+
+        auditProgress.request_cancel()
+
+    def _prompt(self, title: str, message: str) -> None:
+        done = threading.Event()
+        self.events.put({"kind": "login_prompt", "title": title, "message": message, "done": done})
+        done.wait()
+
+    def _run(self) -> None:
+        unsubscribe = auditProgress.subscribe(self.events.put)
+        try:
+            import browserSession
+        except ImportError:
+            browserSession = None
+        if browserSession is not None:
+            browserSession.set_prompt_handler(self._prompt)
+
+        try:
+            result = self.target(*self.args)
+        except auditProgress.AuditCancelled as exc:
+            log.warning("%s", exc)
+            self.events.put({"kind": "cancelled", "message": str(exc)})
+        except Exception as exc:
+            log.exception("%s audit failed", self.name)
+            self.events.put({"kind": "failed", "error": f"{type(exc).__name__}: {exc}"})
+        else:
+            self.events.put({"kind": "finished", "result": result})
+        finally:
+            if browserSession is not None:
+                browserSession.set_prompt_handler(None)
+            unsubscribe()
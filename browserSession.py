@@ -0,0 +1,378 @@
+"""Persistent, authenticated Chrome sessions for the Selenium audit stages.
+
+Each stage keeps its own Chrome user-data directory under
+``data/browserProfiles/`` so SSO cookies survive between runs. Before a stage
+starts, the saved profile is opened headless and probed; the visible browser
+and the "please log in" dialog are only needed again once the SSO session has
+actually expired.
+
+Set ``CC_AUDIT_UNATTENDED=1`` for scheduled runs: an expired session then
+raises :class:`LoginRequiredError` instead of waiting for a human.
+
+Caption detection only needs the player markup, so audit drivers can be opened
+``lean``: the ``eager`` page-load strategy, autoplay disabled, and images,
+fonts, media segments and third-party trackers blocked through CDP.
+
+The ChromeDriver binary is resolved through ``webdriver-manager`` once and its
+path cached in ``data/chromedriver_path.json``; :class:`DriverPool` keeps warm,
+signed-in drivers keyed by host so callers do not pay a cold start per switch.
+
+Selenium, webdriver-manager and Tk are imported on first use, so importing
+this module (and the stages that depend on it) costs nothing for runs that
+never open a browser.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Dict, Hashable, Optional, Set
+from urllib.parse import urlparse
+
+import auditLog
+
+if TYPE_CHECKING:
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+
+log = auditLog.get_logger("browserSession")
+
+PROFILE_ROOT = os.path.join("data", "browserProfiles")
+UNATTENDED = os.environ.get("CC_AUDIT_UNATTENDED", "") == "1"
+DRIVER_PATH_CACHE = os.path.join("data", "chromedriver_path.json")
+
+# Requests that never influence whether a caption control is rendered. HLS/DASH
+# manifests stay allowed because players read caption tracks from them.
+LEAN_BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.ico", "*.bmp",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.ts", "*.m4s", "*.mp4", "*.m4a", "*.aac", "*.webm", "*.mp3",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*nr-data.net*", "*newrelic.com*", "*hotjar.com*", "*segment.io*",
+    "*fullstory.com*", "*pendo.io*",
+]
+
+
+class LoginRequiredError(RuntimeError):
+    """Raised in unattended mode when a saved browser session has expired."""
+
+
+def profile_dir(profile: str) -> str:
+    """Return the absolute user-data directory for ``profile``, creating it."""
+
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", profile)
+    path = os.path.abspath(os.path.join(PROFILE_ROOT, safe_name))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def chrome_options(
+    profile: Optional[str] = None, headless: bool = False, lean: bool = False
+) -> Options:
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    if lean:
+        # Return once the DOM is parsed instead of waiting for every subresource.
+        options.page_load_strategy = "eager"
+        options.add_argument("--autoplay-policy=user-gesture-required")
+        options.add_argument("--mute-audio")
+    if headless:
+        options.add_argument("--headless=new")
+        options.add_argument("--window-size=1280,900")
+    if profile:
+        options.add_argument(f"--user-data-dir={profile_dir(profile)}")
+    return options
+
+
+_prompt_lock = threading.Lock()
+_prompt_handler: Optional[Callable[[str, str], None]] = None
+_driver_path_lock = threading.Lock()
+_driver_path: Optional[str] = None
+
+
+def driver_path(refresh: bool = False) -> str:
+    """Return the ChromeDriver binary path, resolving it at most once per machine.
+
+    ``webdriver-manager`` performs a network version check on every
+    ``install()``, so the resolved path is cached in memory and on disk and
+    reused while the binary still exists. ``refresh`` forces a new lookup,
+    e.g. after a Chrome upgrade made the cached driver incompatible.
+    """
+
+    global _driver_path
+
+    with _driver_path_lock:
+        if not refresh:
+            if _driver_path and os.path.exists(_driver_path):
+                return _driver_path
+
+            try:
+                with open(DRIVER_PATH_CACHE, "r") as handle:
+                    cached = json.load(handle).get("path")
+            except (OSError, ValueError, AttributeError):
+                cached = None
+
+            if isinstance(cached, str) and os.path.exists(cached):
+                _driver_path = cached
+                return cached
+
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        resolved = ChromeDriverManager().install()
+        _driver_path = resolved
+        try:
+            os.makedirs(os.path.dirname(DRIVER_PATH_CACHE) or ".", exist_ok=True)
+            with open(DRIVER_PATH_CACHE, "w") as handle:
+                json.dump({"path": resolved}, handle, indent=4)
+        except OSError as exc:
+            log.warning("Unable to cache ChromeDriver path: %s", exc)
+        return resolved
+
+
+def start_driver(
+    profile: Optional[str] = None, headless: bool = False, lean: bool = False
+) -> webdriver.Chrome:
+    from selenium import webdriver
+    from selenium.common.exceptions import SessionNotCreatedException
+    from selenium.webdriver.chrome.service import Service
+
+    options = chrome_options(profile, headless, lean)
+    try:
+        driver = webdriver.Chrome(service=Service(driver_path()), options=options)
+    except SessionNotCreatedException:
+        # The cached driver no longer matches the installed Chrome; resolve again.
+        driver = webdriver.Chrome(service=Service(driver_path(refresh=True)), options=options)
+    if lean:
+        block_resources(driver)
+    return driver
+
+
+def block_resources(driver: webdriver.Chrome, enabled: bool = True) -> None:
+    """Block heavy or irrelevant requests for ``driver`` via the DevTools protocol."""
+
+    from selenium.common.exceptions import WebDriverException
+
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd(
+            "Network.setBlockedURLs", {"urls": LEAN_BLOCKED_URLS if enabled else []}
+        )
+    except WebDriverException as exc:
+        log.warning("Unable to update request blocking: %s", exc)
+
+
+def looks_logged_in(driver: webdriver.Chrome, probe_url: str) -> bool:
+    """Default probe: the page stayed on the probe host and is not a login page."""
+
+    try:
+        current = urlparse(driver.current_url or "")
+    except Exception:
+        return False
+
+    expected_host = (urlparse(probe_url).netloc or "").lower()
+    if (current.netloc or "").lower() != expected_host:
+        # SSO redirects to the identity provider when the session is gone.
+        return False
+
+    path = (current.path or "").lower()
+    return "login" not in path and "/auth/" not in path
+
+
+def session_is_valid(
+    driver: webdriver.Chrome,
+    probe_url: str,
+    is_logged_in: Optional[Callable[[webdriver.Chrome, str], bool]] = None,
+) -> bool:
+    """Load ``probe_url`` and report whether the saved session is still signed in."""
+
+    from selenium.common.exceptions import WebDriverException
+
+    check = is_logged_in or looks_logged_in
+    try:
+        driver.get(probe_url)
+    except WebDriverException as exc:
+        log.warning("Unable to load session probe %s: %s", probe_url, exc)
+        return False
+    return check(driver, probe_url)
+
+
+def set_prompt_handler(handler: Optional[Callable[[str, str], None]]) -> None:
+    """Route login prompts to ``handler(title, message)`` instead of a new Tk window.
+
+    The GUI runs audits on a worker thread, where Tk must not be used; its
+    handler asks the main thread to show the dialog and blocks until the user
+    confirms. ``None`` restores the default prompt.
+    """
+
+    global _prompt_handler
+    _prompt_handler = handler
+
+
+def prompt_for_login(title: str, message: str) -> None:
+    """Block until the user confirms they finished logging in.
+
+    Stages can run concurrently, so prompts are shown one at a time. Tk is
+    only used on the main thread; stage workers prompt on the console.
+    """
+
+    with _prompt_lock:
+        if _prompt_handler is not None:
+            _prompt_handler(title, message)
+            return
+
+        tk = None
+        if threading.current_thread() is threading.main_thread():
+            try:
+                import tkinter as tk
+            except Exception:  # pragma: no cover - headless environments may not provide Tk
+                tk = None  # type: ignore
+
+        if tk is None:
+            try:
+                input(message + "\nPress Enter here once the login is complete...")
+            except EOFError:
+                pass
+            return
+
+        root = tk.Tk()
+        root.title(title)
+        root.geometry("360x140")
+        label = tk.Label(root, text=message, wraplength=320, justify="center")
+        label.pack(pady=20)
+        tk.Button(root, text="Continue", command=root.destroy).pack(pady=5)
+        root.mainloop()
+
+
+def open_authenticated_driver(
+    profile: str,
+    login_url: str,
+    probe_url: str,
+    prompt: Callable[[], None],
+    headless: bool = True,
+    is_logged_in: Optional[Callable[[webdriver.Chrome, str], bool]] = None,
+    lean: bool = False,
+) -> webdriver.Chrome:
+    """Return a signed-in driver for ``profile``, prompting only if the session expired.
+
+    The saved profile is probed first (headless when ``headless`` is true). If
+    the probe fails, a visible browser on the same profile is opened at
+    ``login_url`` and ``prompt`` blocks until the user has logged in; the new
+    cookies are written back to the profile for the next run. ``lean``
+    applies the lean browsing profile to the returned driver.
+    """
+
+    from selenium.common.exceptions import WebDriverException
+
+    driver = start_driver(profile, headless=headless, lean=lean)
+    if session_is_valid(driver, probe_url, is_logged_in):
+        return driver
+
+    if UNATTENDED:
+        driver.quit()
+        raise LoginRequiredError(
+            f"Saved browser session for '{profile}' has expired; "
+            "run the audit interactively once to log in again."
+        )
+
+    if headless:
+        # Chrome locks the profile directory, so the headless probe must exit first.
+        driver.quit()
+        driver = start_driver(profile, headless=False, lean=lean)
+
+    if lean:
+        # SSO pages may rely on images (QR codes, MFA prompts); unblock while logging in.
+        block_resources(driver, enabled=False)
+
+    try:
+        driver.get(login_url)
+    except WebDriverException:
+        pass
+
+    prompt()
+
+    if lean:
+        block_resources(driver)
+
+    if not session_is_valid(driver, probe_url, is_logged_in):
+        log.warning("Login for '%s' could not be confirmed; continuing anyway.", profile)
+    return driver
+
+
+class DriverPool:
+    """Warm drivers keyed by host (or any hashable key), created on demand.
+
+    ``factory`` builds a ready-to-use driver for a key and may return ``None``
+    when one cannot be started. Such a key is remembered as failed and
+    :meth:`get` returns ``None`` for it without calling the factory again,
+    until :meth:`discard` or :meth:`close`. At most ``max_drivers`` stay
+    open; the least recently used driver is quit when the pool is full.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[Hashable], Optional[webdriver.Chrome]],
+        max_drivers: int = 4,
+    ) -> None:
+        self.factory = factory
+        self.max_drivers = max(1, max_drivers)
+        self._drivers: "OrderedDict[Hashable, webdriver.Chrome]" = OrderedDict()
+        self._failed: Set[Hashable] = set()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[webdriver.Chrome]:
+        with self._lock:
+            driver = self._drivers.get(key)
+            if driver is not None:
+                self._drivers.move_to_end(key)
+                return driver
+            if key in self._failed:
+                return None
+
+        driver = self.factory(key)
+        if driver is None:
+            with self._lock:
+                self._failed.add(key)
+            return None
+
+        evicted: Dict[Hashable, webdriver.Chrome] = {}
+        with self._lock:
+            self._drivers[key] = driver
+            while len(self._drivers) > self.max_drivers:
+                old_key, old_driver = self._drivers.popitem(last=False)
+                evicted[old_key] = old_driver
+
+        for old_driver in evicted.values():
+            _quit_quietly(old_driver)
+        return driver
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            driver = self._drivers.pop(key, None)
+            self._failed.discard(key)
+        if driver is not None:
+            _quit_quietly(driver)
+
+    def close(self) -> None:
+        with self._lock:
+            drivers = list(self._drivers.values())
+            self._drivers.clear()
+            self._failed.clear()
+        for driver in drivers:
+            _quit_quietly(driver)
+
+    def __len__(self) -> int:
+        return len(self._drivers)
+
+
+def _quit_quietly(driver: webdriver.Chrome) -> None:
+    try:
+        driver.quit()
+    except Exception:
+        pass
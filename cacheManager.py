@@ -0,0 +1,388 @@
+"""Selective invalidation, a size cap and hit rates for the ``data/`` caches.
+
+``dataReset.py`` deletes every JSON file, which turns one bad course into a
+full cold re-audit. This module clears just what is stale:
+
+* :func:`invalidate_course` drops a course's module and sorted-URL files and
+  the verdicts of its videos;
+* :func:`invalidate_platform` drops the verdicts of one platform;
+* :func:`invalidate_older_than` drops artifacts, verdicts, traces, profiles
+  and rotated logs older than a given age;
+* :func:`invalidate_run` drops whatever one run fetched or checked.
+
+Dropped verdicts are also removed from the resume checkpoint, so a resumed
+run checks those videos again instead of skipping them.
+
+:func:`enforce_size_cap` keeps the whole ``data/`` tree under
+``CC_AUDIT_CACHE_MAX_MB`` by deleting the least recently used rebuildable
+files: crawled module data, the results index, traces, profiles, rotated logs,
+reports and Chrome's page caches inside the saved browser profiles. The
+results file, checkpoint, schedule, queue, login profiles and tokens are never
+evicted. :func:`report` shows disk use per category and the cache hit rates
+recorded in the last run's metrics.
+
+Usage::
+
+    python cacheManager.py report
+    python cacheManager.py course 12345 67890
+    python cacheManager.py platform youtube
+    python cacheManager.py older-than 30
+    python cacheManager.py runs
+    python cacheManager.py run 3f2a9c1b7d4e
+    python cacheManager.py cap --max-mb 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import artifactStore
+import auditLog
+import auditMetrics
+import auditProgress
+import auditResults
+import auditTrace
+import videoCheckers
+
+
+log = auditLog.get_logger("cacheManager")
+
+DATA_DIR = artifactStore.DATA_DIR
+DEFAULT_MAX_BYTES = int(float(os.environ.get("CC_AUDIT_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+
+# Chrome's disposable caches inside a saved profile; the login cookies live elsewhere.
+BROWSER_CACHE_DIRS = ("Cache", "Code Cache", "GPUCache", "CacheStorage", "ScriptCache", "ShaderCache")
+
+# Files evicted by the size cap, by category; anything else under data/ is kept.
+_EVICTABLE = {
+    "courseModules": "artifacts",
+    "sortedModules": "artifacts",
+    "traces": "traces",
+    "profiles": "profiles",
+}
+_INDEX_FILES = ("audited_videos.db", "audited_videos.db-wal", "audited_videos.db-shm")
+_REPORT_FILES = ("metrics", "benchmark_results", "startup_benchmark", "stage_timings", "audit_plan")
+
+
+def category(path: str) -> Optional[str]:
+    """The eviction category of a file under ``data/``, or ``None`` when it must be kept."""
+
+    relative = os.path.relpath(path, DATA_DIR)
+    parts = relative.split(os.sep)
+    name = parts[-1]
+    if len(parts) > 3 and parts[0] == "instances" and parts[2] == DATA_DIR:
+        # Extra Canvas instances keep a data/ tree of their own under data/instances/<name>/.
+        return category(os.path.join(DATA_DIR, *parts[3:]))
+    if parts[0] in _EVICTABLE:
+        return _EVICTABLE[parts[0]]
+    if parts[0] == "logs":
+        # The live log files are still open; rotated ones are history.
+        return None if name.endswith(".log") else "logs"
+    if parts[0] == "browserProfiles":
+        return "browser_cache" if any(part in BROWSER_CACHE_DIRS for part in parts[1:-1]) else None
+    if len(parts) == 1:
+        if name in _INDEX_FILES:
+            return "index"
+        # Per-worker exports are named like metrics-worker0.json.
+        if name.split(".")[0].split("-")[0] in _REPORT_FILES:
+            return "reports"
+    return None
+
+
+def _files(root: str = DATA_DIR) -> Iterable[Tuple[str, os.stat_result]]:
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                yield path, os.stat(path)
+            except OSError:
+                continue
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    except OSError as exc:
+        log.warning("Unable to delete %s: %s", path, exc)
+        return False
+    return True
+
+
+def _drop_from_checkpoint(entries: Sequence[dict]) -> None:
+    """Forget dropped verdicts in the resume checkpoint."""
+
+    checkpoint = auditProgress.Checkpoint.load()
+    if checkpoint is None or not entries:
+        return
+    for entry in entries:
+        platform = videoCheckers.PLATFORM_FOR_TYPE.get(entry.get("type"))
+        if platform:
+            checkpoint.checked.get(platform, set()).discard(entry.get("url"))
+    checkpoint.save()
+
+
+def _drop_verdicts(predicate: Callable[[dict], bool]) -> int:
+    dropped = [entry for entry in auditResults.load_results() if isinstance(entry, dict) and predicate(entry)]
+    if not dropped:
+        return 0
+    count = auditResults.remove_results(predicate)
+    _drop_from_checkpoint(dropped)
+    return count
+
+
+def _course_urls(course_id: str) -> Set[str]:
+    """Every URL the course's saved sorted-URL file lists, as results record them."""
+
+    try:
+        with open(artifactStore.artifact_path("sorted", course_id), "r") as handle:
+            sorted_urls = json.load(handle)
+    except (OSError, ValueError):
+        return set()
+    if not isinstance(sorted_urls, dict):
+        return set()
+    urls: Set[str] = set()
+    for platform, items in sorted_urls.items():
+        items = [item for item in items if isinstance(item, str)] if isinstance(items, list) else []
+        urls.update(item.replace("/api/v1", "") if platform == "canvas" else item for item in items)
+    return urls
+
+
+def invalidate_course(course_ids: Iterable[str], verdicts: bool = True) -> Dict[str, int]:
+    """Drop the crawled data (and by default the verdicts) of ``course_ids``.
+
+    Full-audit verdicts carry no course id, so they are matched by the URLs in
+    the course's saved sorted-URL file; a video linked from several courses
+    loses its verdict for all of them.
+    """
+
+    course_ids = [str(course_id) for course_id in course_ids]
+    summary = {"files": 0, "verdicts": 0}
+    urls: Set[str] = set()
+    for course_id in course_ids:
+        urls |= _course_urls(course_id)
+
+    store = artifactStore.current()
+    summary["files"] = len(store.forget(
+        entry_id for course_id in course_ids for entry_id in (f"modules/{course_id}", f"sorted/{course_id}")
+    ))
+    if verdicts:
+        wanted = set(course_ids)
+        summary["verdicts"] = _drop_verdicts(
+            lambda entry: str(entry.get("course_id", "")) in wanted
+            or ("course_id" not in entry and entry.get("url") in urls)
+        )
+    log.info("Invalidated courses %s: %s", ", ".join(course_ids), summary)
+    return summary
+
+
+def invalidate_platform(platform: str) -> Dict[str, int]:
+    """Drop every verdict for ``platform`` (``youtube``, ``panopto`` or ``canvas``)."""
+
+    if platform not in videoCheckers.RESULT_TYPES:
+        raise ValueError(f"Unknown platform: {platform}")
+    result_type = videoCheckers.RESULT_TYPES[platform]
+    summary = {"files": 0, "verdicts": _drop_verdicts(lambda entry: entry.get("type") == result_type)}
+    log.info("Invalidated %s verdicts: %s", platform, summary)
+    return summary
+
+
+def invalidate_older_than(seconds: float, verdicts: bool = True, now: Optional[float] = None) -> Dict[str, int]:
+    """Drop artifacts, verdicts and evictable files older than ``seconds``.
+
+    Verdicts saved before check times were recorded count as old.
+    """
+
+    cutoff = (time.time() if now is None else now) - seconds
+    store = artifactStore.current()
+    summary = {"files": 0, "verdicts": 0}
+    summary["files"] += len(store.forget(
+        entry_id for entry_id, record in store.entries() if float(record.get("fetched_at", 0)) < cutoff
+    ))
+    for path, stat in list(_files()):
+        if category(path) in ("traces", "profiles", "logs", "reports") and stat.st_mtime < cutoff:
+            summary["files"] += _remove(path)
+    if verdicts:
+        summary["verdicts"] = _drop_verdicts(lambda entry: float(entry.get("checked_at") or 0) < cutoff)
+    log.info("Invalidated data older than %.1f days: %s", seconds / 86400, summary)
+    return summary
+
+
+def invalidate_run(run_id: str, verdicts: bool = True) -> Dict[str, int]:
+    """Drop the artifacts fetched, verdicts written and traces recorded by ``run_id``."""
+
+    store = artifactStore.current()
+    summary = {"files": 0, "verdicts": 0}
+    summary["files"] += len(store.forget(
+        entry_id for entry_id, record in store.entries() if record.get("run_id") == run_id
+    ))
+    for path in glob.glob(os.path.join(auditTrace.TRACE_DIR, f"*{run_id}*")):
+        summary["files"] += _remove(path)
+    checkpoint = auditProgress.Checkpoint.load()
+    if checkpoint is not None and checkpoint.run_id == run_id:
+        checkpoint.clear()
+        summary["files"] += 1
+    if verdicts:
+        summary["verdicts"] = _drop_verdicts(lambda entry: entry.get("run_id") == run_id)
+    log.info("Invalidated run %s: %s", run_id, summary)
+    return summary
+
+
+def runs() -> List[dict]:
+    """Known run ids, newest first, with their artifact and verdict counts."""
+
+    found: Dict[str, dict] = {}
+
+    def record(run_id: Optional[str], when: float, field: str) -> None:
+        if not run_id:
+            return
+        info = found.setdefault(run_id, {"run_id": run_id, "last_seen": 0.0, "artifacts": 0, "verdicts": 0})
+        info["last_seen"] = max(info["last_seen"], when)
+        info[field] += 1
+
+    for _, entry in artifactStore.current().entries():
+        record(entry.get("run_id"), float(entry.get("fetched_at", 0)), "artifacts")
+    for entry in auditResults.load_results():
+        if isinstance(entry, dict):
+            record(entry.get("run_id"), float(entry.get("checked_at") or 0), "verdicts")
+    return sorted(found.values(), key=lambda info: info["last_seen"], reverse=True)
+
+
+def enforce_size_cap(max_bytes: int = DEFAULT_MAX_BYTES) -> Dict[str, int]:
+    """Delete least recently used evictable files until ``data/`` fits in ``max_bytes``."""
+
+    files = list(_files())
+    total = sum(stat.st_size for _, stat in files)
+    summary = {"bytes_before": total, "files": 0, "bytes_freed": 0}
+    if total <= max_bytes:
+        summary["bytes_after"] = total
+        return summary
+
+    # Access times are set explicitly on cache hits, so they order by last use.
+    candidates = sorted(
+        ((max(stat.st_atime, stat.st_mtime), path, stat.st_size) for path, stat in files if category(path)),
+        key=lambda item: item[0],
+    )
+    store = artifactStore.current()
+    for _, path, size in candidates:
+        if total <= max_bytes:
+            break
+        if not _remove(path):
+            continue
+        if category(path) == "artifacts":
+            store.forget_path(path)
+        total -= size
+        summary["files"] += 1
+        summary["bytes_freed"] += size
+        auditMetrics.inc("cache_evictions_total", {"category": category(path) or "other"})
+
+    summary["bytes_after"] = total
+    if total > max_bytes:
+        log.warning(
+            "data/ is still %.0f MB after evicting every rebuildable file; the cap is %.0f MB",
+            total / 1048576,
+            max_bytes / 1048576,
+        )
+    log.info("Size cap: freed %.1f MB in %d files", summary["bytes_freed"] / 1048576, summary["files"])
+    return summary
+
+
+def hit_rates(summary_paths: Optional[Sequence[str]] = None) -> Dict[str, dict]:
+    """Hits, misses and hit rate per cache from the last exported metrics."""
+
+    if summary_paths is None:
+        base = os.path.splitext(auditMetrics.SUMMARY_PATH)[0]
+        summary_paths = [auditMetrics.SUMMARY_PATH] + sorted(glob.glob(f"{base}-*.json"))
+
+    caches: Dict[str, dict] = {}
+    for path in summary_paths:
+        try:
+            with open(path, "r") as handle:
+                counters = json.load(handle).get("counters", {})
+        except (OSError, ValueError, AttributeError):
+            continue
+        for sample in counters.get("cache_requests_total", []):
+            labels = sample.get("labels", {})
+            stats = caches.setdefault(labels.get("cache", "?"), {"hit": 0, "miss": 0})
+            stats[labels.get("result", "miss")] = stats.get(labels.get("result", "miss"), 0) + int(sample.get("value", 0))
+    for stats in caches.values():
+        lookups = stats["hit"] + stats["miss"]
+        stats["hit_rate"] = round(stats["hit"] / lookups, 3) if lookups else None
+    return caches
+
+
+def report() -> dict:
+    """Disk use per category plus cache hit rates."""
+
+    usage: Dict[str, dict] = {}
+    for path, stat in _files():
+        name = category(path) or "kept"
+        bucket = usage.setdefault(name, {"files": 0, "bytes": 0})
+        bucket["files"] += 1
+        bucket["bytes"] += stat.st_size
+    return {
+        "total_bytes": sum(bucket["bytes"] for bucket in usage.values()),
+        "max_bytes": DEFAULT_MAX_BYTES,
+        "usage": usage,
+        "hit_rates": hit_rates(),
+    }
+
+
+def format_report(payload: dict) -> str:
+    lines = [f"data/ uses {payload['total_bytes'] / 1048576:.1f} MB of {payload['max_bytes'] / 1048576:.0f} MB"]
+    for name, bucket in sorted(payload["usage"].items()):
+        lines.append(f"  {name:<14} {bucket['files']:>7} files {bucket['bytes'] / 1048576:>9.1f} MB")
+    if payload["hit_rates"]:
+        lines.append("Cache hit rates (last run):")
+        for name, stats in sorted(payload["hit_rates"].items()):
+            rate = "-" if stats["hit_rate"] is None else f"{stats['hit_rate']:.0%}"
+            lines.append(f"  {name:<22} {rate:>5}  ({stats['hit']} hits, {stats['miss']} misses)")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Selective cache invalidation and size limits for data/.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("report", help="disk use and cache hit rates")
+    sub.add_parser("runs", help="list known run ids")
+    course = sub.add_parser("course", help="drop crawled data and verdicts for courses")
+    course.add_argument("course_ids", nargs="+")
+    platform = sub.add_parser("platform", help="drop every verdict for a platform")
+    platform.add_argument("platform", choices=videoCheckers.PLATFORMS)
+    older = sub.add_parser("older-than", help="drop data older than DAYS")
+    older.add_argument("days", type=float)
+    run = sub.add_parser("run", help="drop what one run fetched and checked")
+    run.add_argument("run_id")
+    cap = sub.add_parser("cap", help="evict least recently used files down to a size")
+    cap.add_argument("--max-mb", type=float, default=DEFAULT_MAX_BYTES / 1048576)
+    for scoped in (course, older, run):
+        scoped.add_argument("--keep-verdicts", action="store_true", help="only drop cached files")
+    args = parser.parse_args(argv)
+
+    if args.command == "report":
+        print(format_report(report()))
+    elif args.command == "runs":
+        for info in runs():
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(info["last_seen"]))
+            print(f"{info['run_id']}  {when}  {info['artifacts']} artifacts  {info['verdicts']} verdicts")
+    elif args.command == "course":
+        print(invalidate_course(args.course_ids, verdicts=not args.keep_verdicts))
+    elif args.command == "platform":
+        print(invalidate_platform(args.platform))
+    elif args.command == "older-than":
+        print(invalidate_older_than(args.days * 86400, verdicts=not args.keep_verdicts))
+    elif args.command == "run":
+        print(invalidate_run(args.run_id, verdicts=not args.keep_verdicts))
+    elif args.command == "cap":
+        print(enforce_size_cap(int(args.max_mb * 1048576)))
+
+
+if __name__ == "__main__":
+    auditLog.configure()
+    main()
@@ -0,0 +1,305 @@
+"""Event-driven re-audits from Canvas Live Events.
+
+Polling every course to find new videos wastes almost every request. This
+module consumes Canvas Live Events instead, either POSTed to a small local
+HTTP endpoint (e.g. by an SQS/HTTPS forwarder) or appended as JSON lines to a
+file, and reacts to module item, wiki page and file create/update events.
+
+Each event is mapped to its course and item. Only that item is resolved
+through the Canvas API (``pullModules.getItemUrls`` and ``sortUrls``), and
+the videos it references are queued in the shared job queue for the
+platform checkers. If an item cannot be resolved on its own, the whole course
+is queued instead. Run with ``--work`` to check queued videos within the same
+process as they arrive.
+
+Usage::
+
+    python canvasEvents.py serve --port 8085 [--secret TOKEN] [--work]
+    python canvasEvents.py tail data/live_events.jsonl [--work]
+"""
+
+from __future__ import annotations
+
+import argparse
+import hmac
+import json
+import os
+import threading
+import time
+from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import auditLog
+import auditMetrics
+import jobQueue
+import pullModules
+import sortEmbeddedVideos
+import panoptoVideo
+import transport
+
+
+log = auditLog.get_logger("canvasEvents")
+
+MODULE_ITEM_EVENTS = {"module_item_created", "module_item_updated"}
+PAGE_EVENTS = {"wiki_page_created", "wiki_page_updated"}
+FILE_EVENTS = {"attachment_created", "attachment_updated"}
+HANDLED_EVENTS = MODULE_ITEM_EVENTS | PAGE_EVENTS | FILE_EVENTS
+
+
+class _LinkCollector(HTMLParser):
+    """Collects ``href``/``src`` targets from a page body."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.links: List[str] = []
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        for name, value in attrs:
+            if name in {"href", "src", "data-api-endpoint"} and value:
+                self.links.append(value)
+
+
+def parse_event(event: dict) -> Optional[Tuple[str, str, dict]]:
+    """Return ``(event_name, course_id, body)`` for events that can affect videos."""
+
+    if not isinstance(event, dict):
+        return None
+
+    metadata = event.get("metadata") if isinstance(event.get("metadata"), dict) else {}
+    body = event.get("body") if isinstance(event.get("body"), dict) else {}
+    name = metadata.get("event_name") or event.get("event_name")
+    if name not in HANDLED_EVENTS:
+        return None
+
+    for source in (body, metadata):
+        if str(source.get("context_type", "")).lower() == "course" and source.get("context_id"):
+            return name, str(source["context_id"]), body
+
+    if body.get("course_id"):
+        return name, str(body["course_id"]), body
+    return None
+
+
+def _canvas_get(path: str) -> Optional[object]:
+    try:
+        response = pullModules.SESSION.get(f"{pullModules.CANVAS_BASE_URL}{path}", headers=pullModules.HEADERS)
+    except transport.TransportError as exc:
+        # Resolving the item failed; re-crawling the course retries it later.
+        log.error("Error fetching %s: %s", path, exc)
+        return None
+    if response.status_code != 200:
+        log.error("Error fetching %s: %s - %s", path, response.status_code, response.text[:120])
+        return None
+    return response.json()
+
+
+def item_urls(name: str, course_id: str, body: dict) -> Optional[List[str]]:
+    """Resolve the URLs referenced by the event's item.
+
+    Returns ``None`` when the item cannot be resolved on its own and the
+    course should be re-crawled instead.
+    """
+
+    if name in MODULE_ITEM_EVENTS:
+        module_id, item_id = body.get("module_id"), body.get("module_item_id")
+        if not module_id or not item_id:
+            return None
+        item = _canvas_get(f"/courses/{course_id}/modules/{module_id}/items/{item_id}")
+        if not isinstance(item, dict):
+            return None
+        return pullModules.getItemUrls(item)
+
+    if name in PAGE_EVENTS:
+        page_id = body.get("wiki_page_id") or body.get("url")
+        if not page_id:
+            return None
+        page = _canvas_get(f"/courses/{course_id}/pages/{page_id}")
+        if not isinstance(page, dict):
+            return None
+        collector = _LinkCollector()
+        collector.feed(page.get("body") or "")
+        return collector.links
+
+    if name in FILE_EVENTS:
+        content_type = str(body.get("content_type", "")).lower()
+        if content_type and not content_type.startswith("video/"):
+            return []
+        attachment_id = body.get("attachment_id") or body.get("id")
+        if not attachment_id:
+            return None
+        canvas_root = pullModules.CANVAS_BASE_URL.replace("/api/v1", "")
+        return [f"{canvas_root}/courses/{course_id}/files/{attachment_id}"]
+
+    return []
+
+
+def videos_for_urls(course_id: str, urls: Iterable[str]) -> List[Tuple[str, str]]:
+    """Classify ``urls`` with ``sortUrls`` into ``[(platform, url), …]`` jobs."""
+
+    sorted_urls = pullModules.sortUrls([url for url in urls if isinstance(url, str)])
+    videos: List[Tuple[str, str]] = []
+
+    for url in sorted_urls["youtube"]:
+        if "youtube.com/watch?v=" in url or "youtu.be/" in url:
+            videos.append(("youtube", url))
+    for url in sorted_urls["panopto"]:
+        if panoptoVideo.session_key(url) is not None:
+            videos.append(("panopto", url))
+    for url in sortEmbeddedVideos.truncateCanvasUrl(sorted_urls["canvas"]):
+        videos.append(("canvas", url))
+    return videos
+
+
+class EventConsumer:
+    """Turns Live Events into targeted queue jobs."""
+
+    def __init__(self, db_path: str = jobQueue.DB_PATH) -> None:
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = jobQueue.connect(db_path, shared=True)
+        self.stats: Dict[str, int] = {"received": 0, "ignored": 0, "videos": 0, "courses": 0}
+
+    def handle(self, event: dict) -> int:
+        """Queue work for one event; returns the number of jobs queued."""
+
+        with self._lock:
+            self.stats["received"] += 1
+            parsed = parse_event(event)
+            if parsed is None:
+                self.stats["ignored"] += 1
+                auditMetrics.inc("live_events_total", {"event": "ignored"})
+                return 0
+
+            name, course_id, body = parsed
+            auditMetrics.inc("live_events_total", {"event": name})
+            try:
+                urls = item_urls(name, course_id, body)
+            except Exception as exc:
+                log.error("Error resolving %s for course %s: %s", name, course_id, exc)
+                urls = None
+
+            if urls is None:
+                # Fall back to a full crawl of just this course.
+                queued = jobQueue.requeue_course(self._conn, course_id)
+                self.stats["courses"] += queued
+                log.info("%s in course %s queued a course re-crawl", name, course_id)
+                return queued
+
+            videos = videos_for_urls(course_id, urls)
+            queued = jobQueue.enqueue_videos(self._conn, course_id, videos, requeue=True)
+            self.stats["videos"] += queued
+            log.info("%s in course %s queued %s videos", name, course_id, queued)
+            return queued
+
+    def handle_many(self, events: Iterable[dict]) -> int:
+        return sum(self.handle(event) for event in events)
+
+
+def _decode_events(payload: object) -> List[dict]:
+    if isinstance(payload, list):
+        return [event for event in payload if isinstance(event, dict)]
+    if isinstance(payload, dict):
+        return [payload]
+    return []
+
+
+def serve(consumer: EventConsumer, host: str, port: int, secret: Optional[str] = None) -> None:
+    """Accept Live Events as JSON POSTs on ``/events``."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:  # noqa: N802 - http.server naming
+            if self.path.rstrip("/") != "/events":
+                self.send_error(404)
+                return
+            if secret and not hmac.compare_digest(self.headers.get("X-Event-Secret", ""), secret):
+                self.send_error(403)
+                return
+
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b"null")
+            except ValueError:
+                self.send_error(400, "invalid JSON")
+                return
+
+            queued = consumer.handle_many(_decode_events(payload))
+            body = json.dumps({"queued": queued}).encode("utf-8")
+            self.send_response(202)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    log.info("Listening for Canvas Live Events on http://%s:%s/events", host, port)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def tail(consumer: EventConsumer, path: str, poll_seconds: float = 2.0) -> None:
+    """Follow a JSON-lines file of events, starting from its current end."""
+
+    while not os.path.exists(path):
+        time.sleep(poll_seconds)
+
+    with open(path, "r") as handle:
+        handle.seek(0, os.SEEK_END)
+        log.info("Following Canvas Live Events in %s", path)
+        while True:
+            line = handle.readline()
+            if not line:
+                time.sleep(poll_seconds)
+                continue
+            try:
+                consumer.handle_many(_decode_events(json.loads(line)))
+            except ValueError:
+                log.warning("Skipping malformed event line: %r", line[:80])
+
+
+def _start_worker(db_path: str) -> None:
+    thread = threading.Thread(
+        target=jobQueue.work,
+        kwargs={"db_path": db_path, "idle_exit": False, "poll_seconds": 5.0},
+        name="event-worker",
+        daemon=True,
+    )
+    thread.start()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    # Shared by both commands so the options can follow the command name.
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--db", default=jobQueue.DB_PATH, help="job queue database")
+    common.add_argument("--work", action="store_true", help="also check queued videos in this process")
+
+    parser = argparse.ArgumentParser(description="Canvas Live Events consumer for targeted re-audits.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = sub.add_parser("serve", parents=[common], help="accept events over HTTP")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8085)
+    serve_parser.add_argument("--secret", default=os.environ.get("CC_AUDIT_EVENT_SECRET"))
+
+    tail_parser = sub.add_parser("tail", parents=[common], help="follow a JSON-lines event file")
+    tail_parser.add_argument("path")
+
+    args = parser.parse_args(argv)
+    consumer = EventConsumer(args.db)
+    if args.work:
+        _start_worker(args.db)
+
+    if args.command == "serve":
+        serve(consumer, args.host, args.port, args.secret)
+    else:
+        tail(consumer, args.path)
+
+
+if __name__ == "__main__":
+    auditLog.configure()
+    main()
@@ -0,0 +1,138 @@
+"""Canvas instances to audit and the one this process is working on.
+
+A single instance needs no configuration beyond ``CANVAS_API_TOKEN`` in
+``config/canvasAPI.py``; ``CANVAS_BASE_URL`` (the site root, e.g.
+``https://canvas.uccs.edu``) is optional. To audit several instances, list
+them in ``CANVAS_INSTANCES``::
+
+    CANVAS_INSTANCES = [
+        {"name": "uccs", "base_url": "https://canvas.uccs.edu", "token": CANVAS_API_TOKEN},
+        {"name": "partner", "base_url": "https://canvas.partner.edu", "token_env": "PARTNER_CANVAS_TOKEN"},
+        {"name": "ce", "base_url": "https://ce.instructure.com", "token": "...", "rate_low_water": 200, "pool_size": 4},
+    ]
+
+Every instance has its own token (or ``token_env``, the environment variable
+that holds it), its own :class:`transport.RateGovernor` and connection pool.
+The first entry is the primary instance. It keeps using ``data/`` directly.
+Every other instance is audited in a child process whose working directory
+is :attr:`CanvasInstance.root` (``data/instances/<name>/``), so its crawled
+data, checkpoint and signed-in browser profiles stay separate. The child is
+told which instance it serves through the ``CC_AUDIT_CANVAS_INSTANCE``
+environment variable; ``runAudit.py`` starts the children and merges their
+verdicts into the shared results file.
+
+With more than one instance configured, each result entry is tagged with its
+``instance``.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+try:
+    from config import canvasAPI as canvas_config
+except Exception:  # pragma: no cover - configuration file may be missing
+    canvas_config = None
+
+
+INSTANCE_ENV = "CC_AUDIT_CANVAS_INSTANCE"
+DEFAULT_BASE_URL = "https://canvas.uccs.edu"
+INSTANCES_DIR = os.path.join("data", "instances")
+
+
+@dataclass(frozen=True)
+class CanvasInstance:
+    name: str
+    base_url: str
+    token: str
+    # Remaining rate-limit units below which requests are paced (Canvas' bucket holds 700).
+    rate_low_water: float = 100.0
+    # Units per second Canvas' bucket recovers.
+    rate_leak: float = 10.0
+    pool_size: int = 10
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.base_url}/api/v1"
+
+    @property
+    def login_url(self) -> str:
+        return f"{self.base_url}/login"
+
+    @property
+    def probe_url(self) -> str:
+        # Redirects to the SSO login when the saved browser session has expired.
+        return f"{self.base_url}/profile"
+
+    @property
+    def root(self) -> str:
+        """Working directory of the child process that audits a non-primary instance."""
+
+        return os.path.join(INSTANCES_DIR, self.name)
+
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"}
+
+    def session(self):
+        """A Canvas session with this instance's own rate governor and connection pool."""
+
+        import transport
+
+        return transport.session(
+            "canvas",
+            governor=transport.RateGovernor(self.rate_low_water, self.rate_leak),
+            pool_size=self.pool_size,
+        )
+
+
+def _from_config(entry: dict) -> CanvasInstance:
+    token = entry.get("token") or os.environ.get(entry.get("token_env", ""), "")
+    return CanvasInstance(
+        name=str(entry["name"]),
+        base_url=str(entry["base_url"]).rstrip("/").removesuffix("/api/v1"),
+        token=token,
+        rate_low_water=float(entry.get("rate_low_water", CanvasInstance.rate_low_water)),
+        rate_leak=float(entry.get("rate_leak", CanvasInstance.rate_leak)),
+        pool_size=int(entry.get("pool_size", CanvasInstance.pool_size)),
+    )
+
+
+def instances() -> List[CanvasInstance]:
+    """Configured instances, primary first."""
+
+    configured = getattr(canvas_config, "CANVAS_INSTANCES", None) if canvas_config else None
+    if configured:
+        return [_from_config(entry) for entry in configured]
+    base_url = getattr(canvas_config, "CANVAS_BASE_URL", DEFAULT_BASE_URL) if canvas_config else DEFAULT_BASE_URL
+    token = getattr(canvas_config, "CANVAS_API_TOKEN", "") if canvas_config else ""
+    return [_from_config({"name": "default", "base_url": base_url, "token": token})]
+
+
+def multiple() -> bool:
+    return len(instances()) > 1
+
+
+def get(name: str) -> CanvasInstance:
+    for instance in instances():
+        if instance.name == name:
+            return instance
+    raise KeyError(f"Unknown Canvas instance: {name}")
+
+
+def primary() -> CanvasInstance:
+    return instances()[0]
+
+
+def selected() -> CanvasInstance:
+    """The instance this process audits: ``CC_AUDIT_CANVAS_INSTANCE``, else the primary."""
+
+    name = os.environ.get(INSTANCE_ENV)
+    return get(name) if name else primary()
+
+
+def tag() -> Optional[str]:
+    """The ``instance`` value for result entries; ``None`` with a single instance."""
+
+    return selected().name if multiple() else None
@@ -0,0 +1,89 @@
+"""Inter-process locks and atomic writes for the shared ``data/`` files.
+
+Stages in one process already serialize with threading locks, but
+``jobQueue.py work --processes N``, the event daemon and the instance
+children are separate processes writing the same JSON files. :func:`locked`
+holds an exclusive lock on ``<path>.lock`` (``fcntl.flock`` on POSIX,
+``msvcrt.locking`` on Windows) for a read-modify-write, and
+:func:`write_text` and :func:`write_json` replace a file through a temporary
+file of its own in the same directory, so two writers never share, or
+clobber, a ``.tmp`` file.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+
+_thread_locks: Dict[str, threading.RLock] = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(path: str) -> threading.RLock:
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(path, threading.RLock())
+
+
+@contextmanager
+def locked(path: str) -> Iterator[None]:
+    """Hold the inter-process lock for ``path`` (threads of this process queue first)."""
+
+    lock_path = f"{os.path.abspath(path)}.lock"
+    directory = os.path.dirname(lock_path)
+    os.makedirs(directory, exist_ok=True)
+    with _thread_lock(lock_path):
+        with open(lock_path, "a+b") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            else:
+                handle.seek(0)
+                # LK_LOCK retries for about ten seconds; keep waiting beyond that.
+                while True:
+                    try:
+                        msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+                else:
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def write_text(path: str, text: str) -> None:
+    """Atomically replace ``path`` with ``text`` via a private temporary file."""
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as handle:
+            handle.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_json(path: str, value: object, indent: Optional[int] = 4) -> None:
+    """Atomically replace ``path`` with ``value`` serialized as JSON."""
+
+    write_text(path, json.dumps(value, indent=indent))
@@ -10,19 +10,159 @@ import subprocess
 import json, sys
 import os
 import re
+import queue
+import threading
+import webbrowser
 from config.version import version
+import auditLog
+import auditProgress
+from auditWorker import AuditWorker
+
+#milliseconds between checks of the worker's event queue
+POLL_MS = 200
+#rows drawn in the results table at once; scrolling re-queries the index
+RESULT_ROWS = 30
 
 def dataReset():
     """Reset all data by running the dataReset script."""
-    subprocess.run(["python", "dataReset.py"])
+    import dataReset as reset
+    reset.resetDataFiles()
     messagebox.showinfo("Reset", "Data has been reset successfully.")
 
 
-def showAuditResults():
-    """show a message box showing the count of videos with and without captions."""
-    messagebox.showinfo("Audit", "Running audit, this may take a while depending on the number of videos.")
-    subprocess.run(["python", "runAudit.py"], capture_output=True, text=True)
-    messagebox.showinfo("Audit Complete", "Audit completed successfully. Check the 'data' folder for results.")
+def promptCacheReset(root):
+    """Let the user clear cached data by course, platform, age or run, or reset everything."""
+    import cacheManager
+
+    popup = tk.Toplevel(root)
+    popup.title("Clear Cached Data")
+    popup.geometry("520x420")
+    popup.transient(root)
+    popup.grab_set()
+
+    report = tk.Label(popup, text=cacheManager.format_report(cacheManager.report()), justify="left", font=("Courier", 9))
+    report.pack(padx=8, pady=6, anchor="w")
+
+    scope = tk.StringVar(value="course")
+    form = tk.Frame(popup)
+    form.pack(fill="x", padx=8)
+    run_ids = [info["run_id"] for info in cacheManager.runs()]
+
+    def row(value, label, widget_factory):
+        frame = tk.Frame(form)
+        frame.pack(fill="x", pady=2)
+        tk.Radiobutton(frame, text=label, variable=scope, value=value, width=18, anchor="w").pack(side="left")
+        widget = widget_factory(frame)
+        widget.pack(side="left")
+        return widget
+
+    course_entry = row("course", "Course IDs:", lambda parent: tk.Entry(parent, width=28))
+    platform_box = row("platform", "Platform verdicts:", lambda parent: tkk.Combobox(parent, width=12, state="readonly", values=["youtube", "panopto", "canvas"]))
+    platform_box.set("youtube")
+    days_entry = row("age", "Older than (days):", lambda parent: tk.Entry(parent, width=8))
+    days_entry.insert(0, "30")
+    run_box = row("run", "Run:", lambda parent: tkk.Combobox(parent, width=16, state="readonly", values=run_ids))
+    if run_ids:
+        run_box.set(run_ids[0])
+    cap_entry = row("cap", "Shrink to (MB):", lambda parent: tk.Entry(parent, width=8))
+    cap_entry.insert(0, str(int(cacheManager.DEFAULT_MAX_BYTES / 1048576)))
+    row("all", "Everything", lambda parent: tk.Label(parent, text="WARNING: deletes all results and crawled data", fg="red"))
+
+    keep_verdicts = tk.BooleanVar(value=False)
+    tk.Checkbutton(popup, text="Keep verdicts (only clear crawled Canvas data and files)", variable=keep_verdicts).pack(anchor="w", padx=8, pady=4)
+
+    def apply():
+        choice = scope.get()
+        try:
+            if choice == "course":
+                courses = [course for course in re.split(r"[\s,]+", course_entry.get()) if course]
+                if not courses:
+                    messagebox.showerror("Error", "Please enter at least one course ID.", parent=popup)
+                    return
+                summary = cacheManager.invalidate_course(courses, verdicts=not keep_verdicts.get())
+            elif choice == "platform":
+                summary = cacheManager.invalidate_platform(platform_box.get())
+            elif choice == "age":
+                summary = cacheManager.invalidate_older_than(float(days_entry.get()) * 86400, verdicts=not keep_verdicts.get())
+            elif choice == "run":
+                if not run_box.get():
+                    messagebox.showerror("Error", "No runs are recorded yet.", parent=popup)
+                    return
+                summary = cacheManager.invalidate_run(run_box.get(), verdicts=not keep_verdicts.get())
+            elif choice == "cap":
+                freed = cacheManager.enforce_size_cap(int(float(cap_entry.get()) * 1048576))
+                summary = {"files": freed["files"], "MB freed": round(freed["bytes_freed"] / 1048576, 1)}
+            else:
+                if not messagebox.askyesno("Reset Data", "Delete all results and crawled data?", parent=popup):
+                    return
+                popup.destroy()
+                dataReset()
+                return
+        except ValueError as e:
+            messagebox.showerror("Error", str(e), parent=popup)
+            return
+        popup.destroy()
+        messagebox.showinfo("Cache Cleared", ", ".join(f"{key}: {value}" for key, value in summary.items()))
+
+    buttons = tk.Frame(popup)
+    buttons.pack(pady=8)
+    tk.Button(buttons, text="Clear", command=apply).pack(side="left", padx=4)
+    tk.Button(buttons, text="Cancel", command=popup.destroy).pack(side="left", padx=4)
+    popup.wait_window()
+
+
+def runCompleteAudit(resume=False):
+    """
+    args:
+        resume (bool): continue the interrupted run saved in data/audit_checkpoint.json.
+    returns:
+        dict of stage name to stageRunner.StageResult.
+    Runs the complete audit on the calling (worker) thread.
+    """
+    import runAudit
+    return runAudit.run(resume=resume)
+
+
+def runCourseAudit(course_id, resume=False):
+    """
+    args:
+        course_id (str): The ID of the course to audit.
+        resume (bool): continue this course's interrupted audit.
+    Runs an individual course audit on the calling (worker) thread.
+    """
+    import individualAudit
+    individualAudit.main(course_id, resume=resume)
+
+
+def runResumedAudit():
+    """
+    Continues the interrupted audit saved in data/audit_checkpoint.json: the single
+    course it was scoped to, or else the complete audit.
+    """
+    course_id = auditProgress.checkpoint_course()
+    if course_id is not None:
+        return runCourseAudit(course_id, resume=True)
+    return runCompleteAudit(resume=True)
+
+
+def runReAudit(stale_days=None):
+    """
+    args:
+        stale_days (float): also re-check 'no captions' results older than this many days.
+    returns:
+        dict of new verdict counts.
+    Re-checks unknown and errored results on the calling (worker) thread without crawling Canvas.
+    """
+    import reAudit
+    return reAudit.run(stale_days=stale_days)
+
+
+def formatSeconds(seconds):
+    """Format a duration as H:MM:SS, or '--' when it is unknown."""
+    if seconds is None:
+        return "--"
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
 
 
 def open_json_file():
@@ -55,18 +195,201 @@ def open_json_file():
         messagebox.showerror("Error", f"Failed to open file:\n{e}")
 
 
-def runIndividualAudit(course_id):
+def showResultsBrowser(root):
     """
     args:
-        course_id (str): The ID of the course to audit.
-    Run an individual course aduit. Results will be saved in the 'data' folder.
-    
+        root (tk.Tk): The main window.
+    Opens a filterable, sortable table of the audit results. Only the visible
+    window of rows is loaded from the results index; the scrollbar maps onto
+    the full result count.
     """
-    subprocess.run(["python", "individualAudit.py", course_id])
-    messagebox.showinfo(
-        "Audit Complete",
-        f"Audit for course {course_id} completed successfully. Press 'View Results' to see the results.",
-    )
+    import resultsIndex
+
+    window = tk.Toplevel(root)
+    window.title("Audit Results")
+    window.geometry("900x560")
+
+    columns = ("course_id", "type", "verdict", "url")
+    headings = {"course_id": "Course", "type": "Platform", "verdict": "Captions", "url": "URL"}
+    verdicts = {"All": None, "Captions": "captions", "No captions": "no_captions", "Unknown": "unknown", "Error": "error"}
+    labels = {"captions": "Yes", "no_captions": "No", "unknown": "Unknown", "error": "Error"}
+    state = {"conn": None, "offset": 0, "total": 0, "order_by": "id", "descending": False, "pending": False}
+
+    filters = tk.Frame(window)
+    filters.pack(fill="x", padx=8, pady=6)
+    tk.Label(filters, text="Course:").pack(side="left")
+    course_box = tkk.Combobox(filters, width=12, values=["All"])
+    course_box.set("All")
+    course_box.pack(side="left", padx=4)
+    tk.Label(filters, text="Platform:").pack(side="left")
+    platform_box = tkk.Combobox(filters, width=10, values=["All"], state="readonly")
+    platform_box.set("All")
+    platform_box.pack(side="left", padx=4)
+    tk.Label(filters, text="Verdict:").pack(side="left")
+    verdict_box = tkk.Combobox(filters, width=11, values=list(verdicts), state="readonly")
+    verdict_box.set("All")
+    verdict_box.pack(side="left", padx=4)
+    tk.Label(filters, text="URL contains:").pack(side="left")
+    url_entry = tk.Entry(filters, width=20)
+    url_entry.pack(side="left", padx=4)
+    tk.Button(filters, text="Open JSON", command=open_json_file).pack(side="right")
+
+    table = tk.Frame(window)
+    table.pack(fill="both", expand=True, padx=8)
+    tree = tkk.Treeview(table, columns=columns, show="headings", height=RESULT_ROWS, selectmode="browse")
+    for column, width in zip(columns, (90, 80, 70, 600)):
+        tree.column(column, width=width, stretch=(column == "url"))
+    scrollbar = tkk.Scrollbar(table, orient="vertical")
+    scrollbar.pack(side="right", fill="y")
+    tree.pack(side="left", fill="both", expand=True)
+
+    status_var = tk.StringVar(value="Indexing results...")
+    tk.Label(window, textvariable=status_var, anchor="w").pack(fill="x", padx=8, pady=4)
+
+    def currentFilters():
+        course = course_box.get().strip()
+        platform = platform_box.get()
+        return {
+            "course_id": None if course in ("", "All") else course,
+            "type": None if platform == "All" else platform,
+            "verdict": verdicts.get(verdict_box.get()),
+            "url": url_entry.get().strip() or None,
+        }
+
+    def drawHeadings():
+        for column in columns:
+            arrow = ""
+            if state["order_by"] == column:
+                arrow = " \u25bc" if state["descending"] else " \u25b2"
+            tree.heading(column, text=headings[column] + arrow, command=lambda c=column: sortBy(c))
+
+    def render():
+        state["pending"] = False
+        conn = state["conn"]
+        if conn is None:
+            return
+        total = state["total"]
+        state["offset"] = max(0, min(state["offset"], max(0, total - RESULT_ROWS)))
+        rows = resultsIndex.page(
+            conn, currentFilters(), state["order_by"], state["descending"], state["offset"], RESULT_ROWS
+        )
+        tree.delete(*tree.get_children())
+        for row in rows:
+            verdict = labels.get(row["verdict"], "Unknown")
+            tree.insert("", "end", iid=str(row["id"]), values=(row["course_id"] or "-", row["type"], verdict, row["url"]))
+        if total:
+            scrollbar.set(state["offset"] / total, min(1.0, (state["offset"] + RESULT_ROWS) / total))
+        else:
+            scrollbar.set(0.0, 1.0)
+
+    def scheduleRender():
+        #coalesce bursts of scroll events into one query
+        if not state["pending"]:
+            state["pending"] = True
+            window.after_idle(render)
+
+    def applyFilters(*_args):
+        conn = state["conn"]
+        if conn is None:
+            return
+        active = currentFilters()
+        state["total"] = resultsIndex.count(conn, active)
+        state["offset"] = 0
+        counts = resultsIndex.verdict_counts(conn, active)
+        status_var.set(
+            f"{state['total']:,} results   with captions {counts['captions']:,}   "
+            f"without {counts['no_captions']:,}   unknown {counts['unknown']:,}   errors {counts['error']:,}"
+        )
+        scheduleRender()
+
+    def sortBy(column):
+        if state["order_by"] == column:
+            state["descending"] = not state["descending"]
+        else:
+            state["order_by"], state["descending"] = column, False
+        drawHeadings()
+        state["offset"] = 0
+        scheduleRender()
+
+    def scrollTo(offset):
+        state["offset"] = max(0, min(int(offset), max(0, state["total"] - RESULT_ROWS)))
+        scheduleRender()
+
+    def onScrollbar(action, amount, unit=None):
+        if action == "moveto":
+            scrollTo(float(amount) * state["total"])
+        elif action == "scroll":
+            step = RESULT_ROWS - 1 if unit == "pages" else 1
+            scrollTo(state["offset"] + int(amount) * step)
+
+    def onWheel(event):
+        if getattr(event, "num", None) == 4:
+            delta = -3
+        elif getattr(event, "num", None) == 5:
+            delta = 3
+        else:
+            delta = -3 if event.delta > 0 else 3
+        scrollTo(state["offset"] + delta)
+        return "break"
+
+    def openSelected(_event=None):
+        selected = tree.selection()
+        if selected:
+            webbrowser.open(tree.item(selected[0], "values")[3])
+
+    scrollbar.config(command=onScrollbar)
+    tree.bind("<MouseWheel>", onWheel)
+    tree.bind("<Button-4>", onWheel)
+    tree.bind("<Button-5>", onWheel)
+    tree.bind("<Next>", lambda _e: (scrollTo(state["offset"] + RESULT_ROWS - 1), "break")[1])
+    tree.bind("<Prior>", lambda _e: (scrollTo(state["offset"] - RESULT_ROWS + 1), "break")[1])
+    tree.bind("<Home>", lambda _e: (scrollTo(0), "break")[1])
+    tree.bind("<End>", lambda _e: (scrollTo(state["total"]), "break")[1])
+    tree.bind("<Double-1>", openSelected)
+    course_box.bind("<<ComboboxSelected>>", applyFilters)
+    course_box.bind("<Return>", applyFilters)
+    platform_box.bind("<<ComboboxSelected>>", applyFilters)
+    verdict_box.bind("<<ComboboxSelected>>", applyFilters)
+    url_entry.bind("<Return>", applyFilters)
+    drawHeadings()
+
+    def indexed(error):
+        if not window.winfo_exists():
+            return
+        if error:
+            status_var.set(f"Unable to index results: {error}")
+            return
+        conn = resultsIndex.connect()
+        state["conn"] = conn
+        window.bind("<Destroy>", lambda e: conn.close() if e.widget is window else None)
+        course_box.config(values=["All"] + [course for course in resultsIndex.distinct(conn, "course_id") if course])
+        platform_box.config(values=["All"] + [platform for platform in resultsIndex.distinct(conn, "type") if platform])
+        applyFilters()
+
+    outcome = {}
+
+    def buildIndex():
+        #parsing a large results file takes seconds, so it never runs on the Tk thread
+        try:
+            conn = resultsIndex.connect()
+            try:
+                resultsIndex.refresh(conn)
+            finally:
+                conn.close()
+            outcome["error"] = None
+        except Exception as e:
+            outcome["error"] = e
+
+    builder = threading.Thread(target=buildIndex, name="results-index", daemon=True)
+
+    def waitForIndex():
+        if builder.is_alive():
+            window.after(POLL_MS, waitForIndex)
+        else:
+            indexed(outcome.get("error"))
+
+    builder.start()
+    window.after(POLL_MS, waitForIndex)
 
 
 def loadCanvasAPIToken():
@@ -106,13 +429,117 @@ def saveCanvasAPIToken(token):
 
 
 def main():
+    #console and data/logs/audit.log handlers for every audit the GUI runs
+    auditLog.configure()
     # GUI Setup
     root = tk.Tk()
     root.title(f"UCCS Closed Captioning Audit {version}")
-    root.geometry("500x350")
+    root.geometry("500x610")
 
     tk.Label(root, text="UCCS Closed Captioning Audit", font=("Arial", 20)).pack(pady=10)
-    tk.Button(root, text="Run Complete Audit", command=showAuditResults).pack(pady=10)
+
+    #audits run on a worker thread; this frame shows their progress
+    progress = tk.Frame(root)
+    stage_var = tk.StringVar(value="Idle")
+    counts_var = tk.StringVar(value="")
+    eta_var = tk.StringVar(value="")
+    tk.Label(progress, textvariable=stage_var).pack()
+    bar = tkk.Progressbar(progress, length=400, mode="determinate")
+    bar.pack(pady=2)
+    tk.Label(progress, textvariable=counts_var).pack()
+    tk.Label(progress, textvariable=eta_var).pack()
+    cancel_button = tk.Button(progress, text="Cancel Audit", state="disabled")
+    cancel_button.pack(pady=2)
+
+    run_buttons = []
+    current = {"worker": None, "label": ""}
+
+    def setRunning(running):
+        for button in run_buttons:
+            button.config(state="disabled" if running else "normal")
+        resume_button.config(state="normal" if not running and auditProgress.has_checkpoint() else "disabled")
+        cancel_button.config(state="normal" if running else "disabled", text="Cancel Audit")
+
+    def showProgress(event):
+        stage_var.set(f"Stage: {event.get('stage') or '-'}")
+        total = event["courses_total"] + event["videos_total"]
+        done = event["courses_done"] + event["videos_checked"]
+        bar.config(maximum=max(total, 1), value=done)
+        counts_var.set(
+            f"Courses {event['courses_done']}/{event['courses_total']}   "
+            f"Videos {event['videos_checked']}/{event['videos_total']}"
+        )
+        eta_var.set(f"Elapsed {formatSeconds(event['elapsed_seconds'])}   ETA {formatSeconds(event['eta_seconds'])}")
+
+    def finish(event):
+        current["worker"] = None
+        setRunning(False)
+        label = current["label"]
+        if event["kind"] == "finished":
+            stage_var.set("Finished")
+            result = event.get("result")
+            #full audits return stage results; a re-audit returns verdict counts
+            failed = [name for name, stage in result.items() if getattr(stage, "status", "ok") != "ok"] if isinstance(result, dict) else []
+            if failed:
+                messagebox.showwarning("Audit Finished", f"{label} finished, but these stages failed: {', '.join(failed)}. Press 'Resume Audit' to retry them.")
+            else:
+                messagebox.showinfo("Audit Complete", f"{label} completed successfully. Press 'View Results' to see the results.")
+        elif event["kind"] == "cancelled":
+            stage_var.set("Cancelled")
+            messagebox.showinfo("Audit Cancelled", f"{label} was cancelled. Results checked so far were saved.")
+        else:
+            stage_var.set("Failed")
+            messagebox.showerror("Audit Failed", f"{label} failed:\n{event.get('error')}")
+
+    def poll():
+        worker = current["worker"]
+        if worker is None:
+            return
+        latest = None
+        while True:
+            try:
+                event = worker.events.get_nowait()
+            except queue.Empty:
+                break
+            kind = event["kind"]
+            if kind == "login_prompt":
+                messagebox.showinfo(event["title"], event["message"] + "\n\nPress OK once the login is complete.")
+                event["done"].set()
+            elif kind in ("finished", "cancelled", "failed"):
+                if latest:
+                    showProgress(latest)
+                finish(event)
+                return
+            else:
+                latest = event
+        if latest:
+            showProgress(latest)
+        root.after(POLL_MS, poll)
+
+    def startAudit(label, target, *args):
+        if current["worker"] is not None:
+            return
+        worker = AuditWorker(target, *args)
+        current["worker"] = worker
+        current["label"] = label
+        stage_var.set(f"Starting {label.lower()}...")
+        counts_var.set("")
+        eta_var.set("")
+        bar.config(value=0)
+        setRunning(True)
+        worker.start()
+        root.after(POLL_MS, poll)
+
+    def cancelAudit():
+        worker = current["worker"]
+        if worker is not None:
+            worker.cancel()
+            cancel_button.config(state="disabled", text="Cancelling...")
+
+    cancel_button.config(command=cancelAudit)
+
+    run_buttons.append(tk.Button(root, text="Run Complete Audit", command=lambda: startAudit("Complete audit", runCompleteAudit)))
+    run_buttons[-1].pack(pady=10)
 
     def promptIndividualAudit():
         popup = tk.Toplevel(root)
@@ -131,7 +558,7 @@ def main():
                 messagebox.showerror("Error", "Please enter a course ID.")
                 return
             popup.destroy()
-            runIndividualAudit(course)
+            startAudit(f"Audit for course {course}", runCourseAudit, course)
 
         tk.Button(popup, text="Confirm", command=confirm).pack(pady=5)
         tk.Button(popup, text="Cancel", command=popup.destroy).pack()
@@ -160,13 +587,25 @@ def main():
         popup.wait_window()
 
     # Main buttons
-    tk.Button(root, text="Run Individual Course Audit", command=promptIndividualAudit).pack(pady=10)
-    tk.Button(root, text="View Results", command=open_json_file).pack(pady=10)
+    run_buttons.append(tk.Button(root, text="Run Individual Course Audit", command=promptIndividualAudit))
+    run_buttons[-1].pack(pady=10)
+    resume_button = tk.Button(root, text="Resume Audit", command=lambda: startAudit("Resumed audit", runResumedAudit))
+    resume_button.pack(pady=10)
+    run_buttons.append(tk.Button(root, text="Re-audit Unknown/Errors", command=lambda: startAudit("Re-audit", runReAudit)))
+    run_buttons[-1].pack(pady=10)
+    tk.Button(root, text="View Results", command=lambda: showResultsBrowser(root)).pack(pady=10)
     tk.Button(root, text="Settings", command=promptSettings).pack(pady=10)
-    tk.Button(root,
-              text="Reset Data (WARNING: All existing data will be lost!)",
-              command=dataReset,
-              bg="red", fg="white").pack(pady=10)
+    run_buttons.append(tk.Button(root,
+              text="Clear Cached Data...",
+              command=lambda: promptCacheReset(root),
+              bg="red", fg="white"))
+    run_buttons[-1].pack(pady=10)
+    progress.pack(pady=10)
+    setRunning(False)
+
+    #startupBenchmark.py times how long the window takes to become ready
+    if os.environ.get("CC_AUDIT_STARTUP_PROBE") == "1":
+        root.after_idle(root.destroy)
 
     root.mainloop()
 
@@ -4,75 +4,97 @@
 
 #audits an individual course
 
-from pullModules import getCourseModules, sortUrls
-from youtubeVideo import get_youtube_videos, auditVideo
-import panoptoVideo
-import os
-import json
+import artifactStore
+import auditLog
+import auditMetrics
+import auditProgress
+import auditTrace
+import auditResults
 import sys
-import sortEmbeddedVideos
 
 
+#YouTube verdicts written to the results file per read-modify-write
+YOUTUBE_CHUNK = 25
 
-def main(courseID):
+
+def main(courseID, resume=False):
     """
     args:
         courseID (str): The ID of the course to audit.
+        resume (bool): continue this course's interrupted audit saved in data/audit_checkpoint.json.
     returns:
         Results printed in 'data\audited_videos.json'
-    Individual course aduit script.
+    Individual course aduit script. A cancelled audit keeps its checkpoint, so
+    'Resume Audit' continues it with the videos that have no verdict yet.
 
     """
-    #pull the modules for the course & save to json
-    modules = getCourseModules(courseID)
-    with open(f'data/courseModules/modules_{courseID}.json', 'w') as f:
-        json.dump(modules, f, indent=4)
-
-    #sort the modules and save to json
-    sortedModules = sortUrls(modules)
-    with open(f'data/sortedModules/sorted_modules_{courseID}.json', 'w') as f:
-        json.dump(sortedModules, f, indent=4)
-
-    #audit youtube videos in a single course
-    videos = get_youtube_videos([courseID])
-    for v in videos:
-        result = auditVideo(v)
-
-        j = {
-            "type": "youtube",
-            "url" : v,
-            "has_captions" : result,
-            "course_id": courseID,
-            }
-
-        file_path = "data/audited_videos.json"
-
-        #load existing data or initialize an empty list
-        if os.path.exists(file_path):
-            with open(file_path, "r") as f:
-                try:
-                    data = json.load(f)
-                except json.JSONDecodeError:
-                    data = []
-        else:
-            data = []
+    #clears any earlier cancel request and progress counters; the checkpoint is scoped to this course
+    checkpoint = auditProgress.begin(resume=resume, course_id=courseID)
+    #a resumed audit reuses the course data its run already crawled
+    store = artifactStore.start_run(run_id=checkpoint.run_id)
+    checkpoint.save()
+    #trace this course's crawl and checks; the timeline is saved under data/traces
+    auditTrace.start(f"course-{courseID}-{store.run_id}")
+    try:
+        auditCourse(courseID, refresh=not checkpoint.resumed)
+    except BaseException:
+        #cancelled or failed: keep every verdict recorded so far for 'Resume Audit'
+        checkpoint.save()
+        raise
+    else:
+        #nothing left to resume
+        checkpoint.clear()
+    finally:
+        store.flush()
+        auditProgress.end()
+        auditMetrics.export()
+        auditTrace.finish()
 
-        # Append new entry
-        data.append(j)
 
-        # Write back to file
-        with open(file_path, "w") as f:
-            json.dump(data, f, indent=4)
+def auditCourse(courseID, refresh=True):
+    """Crawls one course (unless `refresh` is off and its data is fresh) and checks its YouTube, Panopto and Canvas videos."""
+    #checkers load their clients (transcript API, Selenium) only when a video needs them
+    from youtubeVideo import get_youtube_videos, probeVideo
+    import panoptoVideo
+    import sortEmbeddedVideos
 
+    #pull the modules for the course, sort them & save them to the run's artifact store
+    artifactStore.current().sorted_urls(courseID, refresh=refresh)
 
+    #audit youtube videos in a single course
+    videos = get_youtube_videos([courseID])
+    #a resumed audit skips the videos it already has verdicts for
+    videos = [v for v in videos if not auditProgress.already_checked("youtube", v)]
+    auditProgress.emit("videos_queued", stage="youtubeVideo", count=len(videos))
+    #verdicts are saved a chunk at a time, so a cancel keeps everything checked before it
+    for start in range(0, len(videos), YOUTUBE_CHUNK):
+        chunk = videos[start:start + YOUTUBE_CHUNK]
+        entries = []
+        try:
+            for v in chunk:
+                auditProgress.check_cancelled()
+                verdict, reason = probeVideo(v)
+                #unknown and error verdicts are written too; reAudit.py re-checks them later
+                entries.append(auditResults.make_entry("youtube", v, verdict, reason, course_id=courseID))
+        finally:
+            auditResults.append_results(entries)
+            for entry in entries:
+                auditProgress.video_checked("youtube", entry["url"])
+
+
+    auditProgress.emit("stage_started", stage="panoptoVideo")
     panoptoVideo.main([courseID], include_course_ids=True)
+    auditProgress.emit("stage_finished", stage="panoptoVideo")
+    auditProgress.emit("stage_started", stage="sortEmbeddedVideos")
     # embeddedVideo.main(courseID) #run embeddedvideo.py on the courseID
     sortEmbeddedVideos.main([courseID])  # run sortEmbeddedVideos.py on the courseID
+    auditProgress.emit("stage_finished", stage="sortEmbeddedVideos")
 
 
 
 if __name__ == "__main__":
+    auditLog.configure()
     if len(sys.argv) < 2:
-        print("Usage: python individualAudit.py <courseID>")
+        print("Usage: python individualAudit.py <courseID> [--resume]")
     else:
-        main(sys.argv[1])
\ No newline at end of file
+        main(sys.argv[1], resume="--resume" in sys.argv[2:])
\ No newline at end of file
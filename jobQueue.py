@@ -0,0 +1,479 @@
+"""Sharded audits through a shared, lease-based job queue.
+
+One machine cannot get through an institution-wide course list overnight, so
+the work is split into jobs stored in a SQLite database file:
+
+* ``course`` jobs crawl one course's modules and enqueue its videos;
+* ``video`` jobs check a single video and store the verdict.
+
+Any number of worker processes, on one box or several sharing the database
+file, claim jobs under a time-limited lease. A lease that expires (the worker
+died or lost its connection) puts the job back in the queue; a job that keeps
+failing is parked as ``failed`` after ``MAX_ATTEMPTS``. ``merge`` folds the
+stored verdicts into ``data/audited_videos.json``.
+
+Course jobs reuse a saved crawl that is still fresh; only courses re-queued
+for changed content (:func:`requeue_course`) carry the ``refresh`` flag that
+forces a new crawl. A job that is re-queued while a worker holds its lease
+is marked ``dirty`` and goes back in the queue as soon as that worker
+finishes, so the change is not lost.
+
+Usage::
+
+    python jobQueue.py enqueue               # queue every id in data/courses_ids.json
+    python jobQueue.py work --processes 4    # run workers until the queue drains
+    python jobQueue.py status
+    python jobQueue.py merge
+
+When the database lives on shared storage, prefer a filesystem with working
+POSIX locks (SMB/NFSv4); SQLite relies on them to serialize claims.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import artifactStore
+import auditLog
+import auditMetrics
+import auditResults
+import videoCheckers
+
+
+log = auditLog.get_logger("jobQueue")
+
+DB_PATH = os.path.join("data", "audit_queue.db")
+LEASE_SECONDS = 15 * 60
+MAX_ATTEMPTS = 3
+VIDEO_BATCH = 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    course_id TEXT NOT NULL,
+    platform TEXT NOT NULL DEFAULT '',
+    url TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    refresh INTEGER NOT NULL DEFAULT 0,
+    dirty INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (kind, course_id, platform, url)
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, kind, platform, id);
+"""
+
+
+def connect(db_path: str = DB_PATH, shared: bool = False) -> sqlite3.Connection:
+    """Open the queue; ``shared`` allows use from several threads behind a lock."""
+
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(
+        db_path, timeout=60, isolation_level=None, check_same_thread=not shared
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA busy_timeout = 60000")
+    conn.executescript(_SCHEMA)
+    _migrate(conn)
+    return conn
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """Add columns that queues created by older versions lack."""
+
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+    for column in ("refresh", "dirty"):
+        if column not in columns:
+            try:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                # Another worker added it first.
+                pass
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    # IMMEDIATE takes the write lock up front so two workers cannot claim the same row.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+
+
+def enqueue_courses(conn: sqlite3.Connection, course_ids: Iterable[str]) -> int:
+    now = time.time()
+    added = 0
+    with _transaction(conn):
+        for course_id in course_ids:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO jobs (kind, course_id, updated_at) VALUES ('course', ?, ?)",
+                (str(course_id), now),
+            )
+            added += cursor.rowcount
+    return added
+
+
+def requeue_course(conn: sqlite3.Connection, course_id: str) -> int:
+    """Queue a fresh crawl of one course, even if it was crawled before.
+
+    A course job that is leased right now is marked dirty and re-queued when
+    its worker finishes.
+    """
+
+    now = time.time()
+    with _transaction(conn):
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO jobs (kind, course_id, refresh, updated_at) VALUES ('course', ?, 1, ?)",
+            (str(course_id), now),
+        )
+        if cursor.rowcount == 0:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN status = 'leased' THEN status ELSE 'queued' END, "
+                "dirty = CASE WHEN status = 'leased' THEN 1 ELSE 0 END, "
+                "attempts = CASE WHEN status = 'leased' THEN attempts ELSE 0 END, "
+                "error = NULL, refresh = 1, updated_at = ? "
+                "WHERE kind = 'course' AND course_id = ?",
+                (now, str(course_id)),
+            )
+    return cursor.rowcount
+
+
+def enqueue_videos(
+    conn: sqlite3.Connection, course_id: str, videos: Iterable[Tuple[str, str]], requeue: bool = False
+) -> int:
+    """Queue ``[(platform, url), …]`` for a course.
+
+    ``requeue`` puts videos that were already checked back in the queue, for
+    targeted re-audits of changed content.
+    """
+
+    now = time.time()
+    added = 0
+    with _transaction(conn):
+        for platform, url in videos:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO jobs (kind, course_id, platform, url, updated_at) "
+                "VALUES ('video', ?, ?, ?, ?)",
+                (str(course_id), platform, url, now),
+            )
+            if cursor.rowcount == 0 and requeue:
+                # A video being checked right now is re-queued when its worker finishes.
+                cursor = conn.execute(
+                    "UPDATE jobs SET dirty = 1, updated_at = ? "
+                    "WHERE kind = 'video' AND course_id = ? AND platform = ? AND url = ? "
+                    "AND status = 'leased'",
+                    (now, str(course_id), platform, url),
+                )
+                if cursor.rowcount == 0:
+                    cursor = conn.execute(
+                        "UPDATE jobs SET status = 'queued', attempts = 0, lease_owner = NULL, "
+                        "lease_expires = NULL, error = NULL, updated_at = ? "
+                        "WHERE kind = 'video' AND course_id = ? AND platform = ? AND url = ?",
+                        (now, str(course_id), platform, url),
+                    )
+            added += cursor.rowcount
+    return added
+
+
+def _expire_leases(conn: sqlite3.Connection, now: float) -> int:
+    """Release leases past their expiry, parking jobs that used up ``MAX_ATTEMPTS`` as ``failed``.
+
+    A job whose worker keeps dying (it crashes the process, or never finishes
+    within the lease) would otherwise be re-queued forever. As in :func:`fail`,
+    a job re-queued during its lease starts over instead.
+    """
+
+    cursor = conn.execute(
+        "UPDATE jobs SET status = CASE WHEN attempts >= ? AND NOT dirty THEN 'failed' ELSE 'queued' END, "
+        "error = CASE WHEN attempts >= ? AND NOT dirty THEN 'lease expired' ELSE error END, "
+        "attempts = CASE WHEN dirty THEN 0 ELSE attempts END, dirty = 0, "
+        "lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+        "WHERE status = 'leased' AND lease_expires < ?",
+        (MAX_ATTEMPTS, MAX_ATTEMPTS, now, now),
+    )
+    return cursor.rowcount
+
+
+def requeue_expired(conn: sqlite3.Connection) -> int:
+    with _transaction(conn):
+        return _expire_leases(conn, time.time())
+
+
+def claim(
+    conn: sqlite3.Connection,
+    worker_id: str,
+    limit: int = 1,
+    platforms: Optional[Sequence[str]] = None,
+    lease_seconds: float = LEASE_SECONDS,
+) -> List[sqlite3.Row]:
+    """Lease the next jobs for ``worker_id``.
+
+    Course jobs are handed out first so the video queue fills early. Video
+    jobs are claimed in batches of one platform so checkers can work in bulk.
+    """
+
+    now = time.time()
+    with _transaction(conn):
+        _expire_leases(conn, now)
+
+        rows = conn.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' AND kind = 'course' ORDER BY id LIMIT 1"
+        ).fetchall()
+
+        if not rows:
+            allowed = list(platforms or videoCheckers.PLATFORMS)
+            marks = ",".join("?" for _ in allowed)
+            first = conn.execute(
+                f"SELECT platform FROM jobs WHERE status = 'queued' AND kind = 'video' "
+                f"AND platform IN ({marks}) ORDER BY id LIMIT 1",
+                allowed,
+            ).fetchone()
+            if first is None:
+                return []
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND kind = 'video' AND platform = ? "
+                "ORDER BY id LIMIT ?",
+                (first["platform"], max(1, limit)),
+            ).fetchall()
+
+        ids = [row["id"] for row in rows]
+        marks = ",".join("?" for _ in ids)
+        conn.execute(
+            f"UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+            f"attempts = attempts + 1, updated_at = ? WHERE id IN ({marks})",
+            [worker_id, now + lease_seconds, now, *ids],
+        )
+        return conn.execute(f"SELECT * FROM jobs WHERE id IN ({marks}) ORDER BY id", ids).fetchall()
+
+
+def complete(conn: sqlite3.Connection, job_id: int, worker_id: str, result: Optional[dict]) -> bool:
+    """Record a finished job; returns ``False`` if the lease was lost meanwhile.
+
+    A job marked dirty during the lease goes back in the queue instead.
+    """
+
+    with _transaction(conn):
+        cursor = conn.execute(
+            "UPDATE jobs SET status = CASE WHEN dirty THEN 'queued' ELSE 'done' END, "
+            "attempts = CASE WHEN dirty THEN 0 ELSE attempts END, "
+            "refresh = CASE WHEN dirty THEN refresh ELSE 0 END, dirty = 0, "
+            "result = ?, error = NULL, lease_owner = NULL, "
+            "lease_expires = NULL, updated_at = ? WHERE id = ? AND lease_owner = ?",
+            (json.dumps(result) if result is not None else None, time.time(), job_id, worker_id),
+        )
+    return cursor.rowcount == 1
+
+
+def fail(conn: sqlite3.Connection, job_id: int, worker_id: str, error: str) -> None:
+    with _transaction(conn):
+        conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? AND NOT dirty THEN 'failed' ELSE 'queued' END, "
+            "attempts = CASE WHEN dirty THEN 0 ELSE attempts END, dirty = 0, "
+            "error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE id = ? AND lease_owner = ?",
+            (MAX_ATTEMPTS, error[:500], time.time(), job_id, worker_id),
+        )
+
+
+def counts(conn: sqlite3.Connection) -> Dict[str, Dict[str, int]]:
+    summary: Dict[str, Dict[str, int]] = {}
+    for row in conn.execute("SELECT kind, status, COUNT(*) AS n FROM jobs GROUP BY kind, status"):
+        summary.setdefault(row["kind"], {})[row["status"]] = row["n"]
+    return summary
+
+
+def _pending(conn: sqlite3.Connection) -> int:
+    row = conn.execute(
+        "SELECT COUNT(*) AS n FROM jobs WHERE status IN ('queued', 'leased')"
+    ).fetchone()
+    return int(row["n"])
+
+
+def _run_course_job(conn: sqlite3.Connection, job: sqlite3.Row) -> None:
+    # Only courses re-queued for changed content force a new crawl; others reuse a fresh one.
+    store = artifactStore.current()
+    store.sorted_urls(job["course_id"], refresh=bool(job["refresh"]))
+    # Video jobs may run in other processes, which find the crawl through the manifest.
+    store.flush()
+    videos = videoCheckers.course_videos(job["course_id"])
+    enqueue_videos(conn, job["course_id"], videos)
+    log.info("Course %s queued %s videos", job['course_id'], len(videos))
+
+
+def _run_video_jobs(
+    conn: sqlite3.Connection, checkers: videoCheckers.Checkers, worker_id: str, jobs: List[sqlite3.Row]
+) -> None:
+    platform = jobs[0]["platform"]
+    verdicts = checkers.verdicts(platform, [job["url"] for job in jobs])
+
+    for job in jobs:
+        verdict, reason = verdicts.get(job["url"], (None, None))
+        if verdict == "error" and job["attempts"] < MAX_ATTEMPTS:
+            # The check itself failed; put the job back for another attempt.
+            fail(conn, job["id"], worker_id, reason or "check failed")
+            continue
+        if verdict is not None:
+            # The last failed attempt is stored as an ``error`` verdict so it can be re-audited.
+            result = videoCheckers.result_entry(platform, job["url"], verdict, reason, job["course_id"])
+        else:
+            # Canvas pages without an embedded video produce no verdict.
+            result = None
+        if not complete(conn, job["id"], worker_id, result):
+            log.warning("Lease on job %s expired before it finished; result dropped", job['id'])
+
+
+def work(
+    db_path: str = DB_PATH,
+    worker_id: Optional[str] = None,
+    platforms: Optional[Sequence[str]] = None,
+    batch: int = VIDEO_BATCH,
+    lease_seconds: float = LEASE_SECONDS,
+    idle_exit: bool = True,
+    poll_seconds: float = 10.0,
+) -> int:
+    """Claim and run jobs until the queue drains; returns the number of jobs run."""
+
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    conn = connect(db_path)
+    processed = 0
+
+    with videoCheckers.Checkers() as checkers:
+        while True:
+            jobs = claim(conn, worker_id, batch, platforms, lease_seconds)
+            if not jobs:
+                if idle_exit and _pending(conn) == 0:
+                    break
+                # Other workers still hold leases that may expire and come back.
+                time.sleep(poll_seconds)
+                continue
+
+            try:
+                if jobs[0]["kind"] == "course":
+                    _run_course_job(conn, jobs[0])
+                    complete(conn, jobs[0]["id"], worker_id, None)
+                else:
+                    _run_video_jobs(conn, checkers, worker_id, jobs)
+            except Exception as exc:
+                log.error("Error running jobs %s: %s", [job['id'] for job in jobs], exc)
+                for job in jobs:
+                    fail(conn, job["id"], worker_id, f"{type(exc).__name__}: {exc}")
+            processed += len(jobs)
+            auditMetrics.inc("queue_jobs_processed_total", {"kind": jobs[0]["kind"]}, len(jobs))
+            auditMetrics.record_queue_depths(counts(conn))
+
+    conn.close()
+    # multiprocessing workers exit without running atexit handlers.
+    artifactStore.current().flush()
+    log.info("Worker %s finished after %s jobs", worker_id, processed)
+    return processed
+
+
+def _worker_process(db_path: str, index: int, platforms: Optional[Sequence[str]], batch: int) -> None:
+    # Rotating file handlers are not safe across processes, so each worker gets its own log.
+    auditLog.configure(log_file=os.path.join("data", "logs", f"worker{index}.log"), force=True)
+    work(db_path, f"{socket.gethostname()}-{os.getpid()}-{index}", platforms, batch)
+    auditMetrics.export(*auditMetrics.paths_for(f"worker{index}"))
+
+
+def work_many(db_path: str, processes: int, batch: int = VIDEO_BATCH) -> None:
+    """Run ``processes`` local workers.
+
+    Chrome locks a profile directory to one browser, so only the first
+    process takes Canvas-media jobs; the rest handle YouTube and Panopto.
+    """
+
+    if processes <= 1:
+        work(db_path, batch=batch)
+        auditMetrics.export()
+        return
+
+    api_platforms = [platform for platform in videoCheckers.PLATFORMS if platform != "canvas"]
+    workers = [
+        multiprocessing.Process(
+            target=_worker_process,
+            args=(db_path, index, None if index == 0 else api_platforms, batch),
+        )
+        for index in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+
+
+def merge(db_path: str = DB_PATH, output: str = auditResults.RESULTS_PATH) -> int:
+    """Fold queue verdicts into the results file, replacing older entries for the same video."""
+
+    conn = connect(db_path)
+    verdicts = [
+        json.loads(row["result"])
+        for row in conn.execute(
+            "SELECT result FROM jobs WHERE kind = 'video' AND status = 'done' "
+            "AND result IS NOT NULL ORDER BY id"
+        )
+    ]
+    conn.close()
+
+    auditResults.upsert_results(verdicts, output)
+    return len(verdicts)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Sharded caption audit job queue.")
+    parser.add_argument("--db", default=DB_PATH, help="queue database file (may be on shared storage)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = sub.add_parser("enqueue", help="queue course jobs")
+    enqueue.add_argument("courses", nargs="*", help="course ids (default: data/courses_ids.json)")
+
+    worker = sub.add_parser("work", help="run workers until the queue drains")
+    worker.add_argument("--processes", type=int, default=1)
+    worker.add_argument("--batch", type=int, default=VIDEO_BATCH)
+
+    sub.add_parser("status", help="show job counts")
+    sub.add_parser("merge", help="write verdicts into data/audited_videos.json")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "enqueue":
+        courses = args.courses or artifactStore.current().course_ids()
+        added = enqueue_courses(connect(args.db), courses)
+        print(f"Queued {added} new course jobs ({len(courses)} requested).")
+    elif args.command == "work":
+        work_many(args.db, args.processes, args.batch)
+    elif args.command == "status":
+        conn = connect(args.db)
+        requeued = requeue_expired(conn)
+        if requeued:
+            print(f"Released {requeued} expired leases; jobs out of attempts are now failed.")
+        depths = counts(conn)
+        auditMetrics.record_queue_depths(depths)
+        auditMetrics.export()
+        print(json.dumps(depths, indent=4))
+    elif args.command == "merge":
+        merged = merge(args.db)
+        print(f"Merged {merged} verdicts into {auditResults.RESULTS_PATH}.")
+
+
+if __name__ == "__main__":
+    auditLog.configure()
+    main()
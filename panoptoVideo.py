@@ -1,10 +1,25 @@
 """Panopto caption auditor.
 
-This module queries the Canvas API for external Panopto player links
-(``Embed.aspx``/``Viewer.aspx``) and records whether captions are available. It
-drives Selenium to open each discovered URL and scan the player UI for caption
-controls before falling back to the Panopto REST API when Selenium cannot
-determine an answer.
+This module reads the Canvas module links saved in the run's artifact store,
+picks out external Panopto player links (``Embed.aspx``/``Viewer.aspx``) and records whether captions are available. It
+queries the Panopto REST API for every discovered session concurrently and only
+drives Selenium to scan the player UI for caption controls when the API cannot
+determine an answer. OAuth tokens are persisted in a local credential cache so
+consecutive runs do not re-authenticate.
+
+Without API credentials, sessions are checked over plain HTTP against the
+player's ``DeliveryInfo.aspx`` endpoint using cookies exported from a single
+interactive browser login; the browser is only used when that response is
+inconclusive.
+
+In folder mode every session of each Panopto folder (configured in
+``config/panoptoKey.py`` or discovered from Canvas links) is listed through
+the REST API, one request per page of a folder, and each session's captions
+are then checked with one API call, as in the default mode. Linked sessions
+outside the listed folders cost one extra lookup to find their folder. The
+verdicts are matched back to the Canvas links, and sessions that are not
+linked from Canvas yet are recorded as well. A folder whose listing fails
+is recorded as retryable and listed again on the next run.
 """
 
 from __future__ import annotations
@@ -12,27 +27,28 @@ from __future__ import annotations
 import json
 import os
 import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
-from urllib.parse import parse_qs, urlparse, urlunparse
-
-try:  # GUI prompt for manual authentication if Selenium needs it
-    import tkinter as tk
-except Exception:  # pragma: no cover - headless environments may not provide Tk
-    tk = None  # type: ignore
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from urllib.parse import parse_qs, unquote, urlparse, urlunparse
 
 import requests
-import pullModules
+import artifactStore
+import auditLog
+import auditMetrics
+import auditPriority
+import auditProgress
+import auditResults
+import auditTrace
+import browserSession
+import transport
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
-from selenium import webdriver
-from selenium.common.exceptions import TimeoutException, WebDriverException
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
-from webdriver_manager.chrome import ChromeDriverManager
+
+if TYPE_CHECKING:
+    from selenium import webdriver
 
 try:
     from config import panoptoKey as panopto_config
@@ -42,6 +58,25 @@ except Exception:  # pragma: no cover - configuration file may be missing in tes
 
 CLIENT_ID: str = getattr(panopto_config, "Client_ID", "") if panopto_config else ""
 CLIENT_SECRET: str = getattr(panopto_config, "Client_Secret", "") if panopto_config else ""
+# Optional folder-mode settings: ``Folder_IDs`` lists folder GUIDs hosted on ``Base_URL``.
+FOLDER_IDS: List[str] = list(getattr(panopto_config, "Folder_IDs", []) or []) if panopto_config else []
+FOLDER_BASE_URL: str = getattr(panopto_config, "Base_URL", "") if panopto_config else ""
+
+log = auditLog.get_logger("panoptoVideo")
+
+TOKEN_CACHE_PATH = os.path.join("data", "panopto_token_cache.json")
+COOKIE_CACHE_PATH = os.path.join("data", "panopto_cookies.json")
+API_WORKERS = 8
+# Sessions checked (API, delivery info, then browser) before their verdicts are written.
+BATCH_SIZE = 200
+DELIVERY_INFO_PATH = "/Panopto/Pages/Viewer/DeliveryInfo.aspx"
+SESSION_PROBE_PATH = "/Panopto/Pages/Home.aspx"
+FOLDER_PAGE_LIMIT = 1000
+
+_FOLDER_ID_PATTERN = re.compile(
+    r"folderid=[\"']?([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})",
+    re.IGNORECASE,
+)
 
 
 def _load_json_file(path: str) -> Optional[dict]:
@@ -54,22 +89,6 @@ def _load_json_file(path: str) -> Optional[dict]:
         return None
 
 
-def _append_result(entry: dict, file_path: str = "data/audited_videos.json") -> None:
-    if os.path.exists(file_path):
-        try:
-            with open(file_path, "r") as handle:
-                data = json.load(handle)
-        except (json.JSONDecodeError, FileNotFoundError):
-            data = []
-    else:
-        data = []
-
-    data.append(entry)
-
-    with open(file_path, "w") as handle:
-        json.dump(data, handle, indent=4)
-
-
 def _normalize_panopto_url(url: str) -> str:
     """Convert embed links to the viewer format to simplify Selenium automation.
     Also strips the _panopto_video marker parameter used for classification."""
@@ -145,42 +164,60 @@ def _is_panopto_player_url(url: str) -> bool:
     return any(keyword in path for keyword in ("embed.aspx", "viewer.aspx", "auth/viewer.aspx"))
 
 
-def _fetch_panopto_links_from_canvas(course_id: str) -> List[str]:
+def _extract_folder_id(url: str) -> Optional[str]:
+    """Return the folder GUID from Panopto folder links (``List.aspx#folderID=…``)."""
+
+    if not isinstance(url, str):
+        return None
+
+    match = _FOLDER_ID_PATTERN.search(unquote(url))
+    return match.group(1).lower() if match else None
+
+
+def _fetch_panopto_links(course_id: str) -> List[str]:
+    """Return the course's Panopto links from the run's artifact store.
+
+    The store reuses the sorted modules ``pullModules`` saved earlier in the
+    run and only crawls Canvas again when they are missing or stale.
+    """
+
     try:
-        module_urls = pullModules.getCourseModules(course_id)
+        sorted_urls = artifactStore.current().sorted_urls(course_id)
     except Exception as exc:
-        print(f"Error retrieving module URLs from Canvas for course {course_id}: {exc}")
+        log.error("Error retrieving module URLs from Canvas for course %s: %s", course_id, exc)
         return []
 
-    if not module_urls:
+    if not isinstance(sorted_urls, dict):
         return []
 
-    sorted_urls = pullModules.sortUrls(module_urls)
-    candidates = []
+    urls = sorted_urls.get("panopto")
+    if not isinstance(urls, list):
+        return []
 
-    if isinstance(sorted_urls, dict):
-        raw_candidates = sorted_urls.get("panopto") or []
-        if isinstance(raw_candidates, list):
-            candidates = [u for u in raw_candidates if _is_panopto_player_url(u)]
+    return [url for url in urls if isinstance(url, str)]
 
-    return candidates
 
+def session_key(url: str) -> Optional[str]:
+    """Key that identifies the Panopto session behind a player link, or ``None`` for other links.
 
-def _fetch_panopto_links_from_cache(course_id: str) -> List[str]:
-    path = f"data/sortedModules/sorted_modules_{course_id}.json"
-    payload = _load_json_file(path)
-    if not isinstance(payload, dict):
-        return []
+    Embed and viewer links to one session share a key: the session id when
+    the link carries one, else the normalized viewer URL.
+    """
 
-    urls = payload.get("panopto")
-    if not isinstance(urls, list):
-        return []
+    if not _is_panopto_player_url(url):
+        return None
+    normalized = _normalize_panopto_url(url)
+    return _extract_session_id(url) or _extract_session_id(normalized) or normalized
 
-    return [url for url in urls if _is_panopto_player_url(url)]
 
+def _iter_panopto_links(
+    courses: Iterable[str], folders: Optional[Set[Tuple[str, str]]] = None
+) -> List[Tuple[str, str]]:
+    """Return a ``[(course_id, url), …]`` list for Panopto links.
 
-def _iter_panopto_links(courses: Iterable[str]) -> List[Tuple[str, str]]:
-    """Return a ``[(course_id, url), …]`` list for Panopto links."""
+    When ``folders`` is given, ``(base_url, folder_id)`` pairs for any Panopto
+    folder links found along the way are added to it.
+    """
 
     results: List[Tuple[str, str]] = []
 
@@ -188,22 +225,19 @@ def _iter_panopto_links(courses: Iterable[str]) -> List[Tuple[str, str]]:
         course_id = str(course)
         seen: Set[str] = set()
 
-        urls = _fetch_panopto_links_from_canvas(course_id)
-        if not urls:
-            urls = _fetch_panopto_links_from_cache(course_id)
-
+        urls = _fetch_panopto_links(course_id)
         if not urls:
             continue
 
         for url in urls:
-            if not isinstance(url, str):
-                continue
-
-            normalized = _normalize_panopto_url(url)
-            session_id = _extract_session_id(url) or _extract_session_id(normalized)
-            canonical = session_id or normalized
-
-            if canonical in seen:
+            if folders is not None:
+                folder_id = _extract_folder_id(url)
+                base_url = PanoptoAuditor._base_url(url)
+                if folder_id and base_url:
+                    folders.add((base_url, folder_id))
+
+            canonical = session_key(url)
+            if canonical is None or canonical in seen:
                 continue
 
             seen.add(canonical)
@@ -212,6 +246,12 @@ def _iter_panopto_links(courses: Iterable[str]) -> List[Tuple[str, str]]:
     return results
 
 
+def _status_verdict(status: int) -> str:
+    """``error`` for statuses a retry may fix, ``unknown`` when the service declined to answer."""
+
+    return "error" if status >= 500 or status in (408, 429) else "unknown"
+
+
 def _has_caption_text(value: object) -> bool:
     if isinstance(value, str):
         return bool(value.strip())
@@ -228,56 +268,433 @@ class _ApiToken:
     expires_at: float
 
 
-class PanoptoAuditor:
-    """Audit helper that caches API tokens and the Selenium driver."""
+class _TokenCache:
+    """JSON-backed store of OAuth tokens keyed by client id and Panopto host."""
+
+    def __init__(self, path: str = TOKEN_CACHE_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(client_id: str, base_url: str) -> str:
+        return f"{client_id}@{base_url}"
+
+    def load(self, client_id: str, base_url: str) -> Optional[_ApiToken]:
+        payload = _load_json_file(self.path)
+        if not isinstance(payload, dict):
+            return None
+
+        record = payload.get(self._key(client_id, base_url))
+        if not isinstance(record, dict):
+            return None
+
+        try:
+            token = _ApiToken(str(record["token"]), float(record["expires_at"]))
+        except (KeyError, TypeError, ValueError):
+            return None
+
+        if time.time() >= token.expires_at:
+            return None
+        return token
+
+    def store(self, client_id: str, base_url: str, token: _ApiToken) -> None:
+        with self._lock:
+            payload = _load_json_file(self.path)
+            if not isinstance(payload, dict):
+                payload = {}
+
+            now = time.time()
+            payload = {
+                key: value
+                for key, value in payload.items()
+                if isinstance(value, dict) and float(value.get("expires_at", 0)) > now
+            }
+            payload[self._key(client_id, base_url)] = {
+                "token": token.token,
+                "expires_at": token.expires_at,
+            }
+
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            # The cache holds bearer tokens, so keep it private to the current user.
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as handle:
+                json.dump(payload, handle, indent=4)
+
+
+def _find_caption_fields(value: object) -> List[object]:
+    """Return every value stored under a caption-related key in ``value``."""
+
+    found: List[object] = []
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(key, str) and "caption" in key.lower():
+                found.append(item)
+            else:
+                found.extend(_find_caption_fields(item))
+    elif isinstance(value, list):
+        for item in value:
+            found.extend(_find_caption_fields(item))
+    return found
+
+
+def _captions_from_delivery_info(payload: object) -> Optional[bool]:
+    """Interpret a ``DeliveryInfo.aspx`` JSON response.
+
+    Returns ``None`` when the response does not describe a playable delivery
+    (errors, login redirects, unexpected shapes) so callers can fall back to
+    the browser.
+    """
+
+    if not isinstance(payload, dict):
+        return None
+
+    if payload.get("ErrorCode") or payload.get("ErrorMessage"):
+        return None
+
+    delivery = payload.get("Delivery")
+    if not isinstance(delivery, dict):
+        return None
+
+    fields = _find_caption_fields(payload)
+    return any(field is True or _has_caption_text(field) for field in fields)
+
+
+class _CookieCache:
+    """Cookies exported from an interactive browser login, keyed by host."""
+
+    def __init__(self, path: str = COOKIE_CACHE_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self, base_url: str) -> List[dict]:
+        payload = _load_json_file(self.path)
+        if not isinstance(payload, dict):
+            return []
+
+        cookies = payload.get(base_url)
+        if not isinstance(cookies, list):
+            return []
+
+        now = time.time()
+        return [
+            cookie
+            for cookie in cookies
+            if isinstance(cookie, dict)
+            and cookie.get("name")
+            and float(cookie.get("expiry", now + 1)) > now
+        ]
+
+    def store(self, base_url: str, cookies: List[dict]) -> None:
+        with self._lock:
+            payload = _load_json_file(self.path)
+            if not isinstance(payload, dict):
+                payload = {}
+
+            payload[base_url] = cookies
+
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            # Session cookies grant the same access as the login itself.
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as handle:
+                json.dump(payload, handle, indent=4)
+
+
+class _DeliveryInfoChecker:
+    """Browserless caption check against the player's delivery-info endpoint."""
+
+    def __init__(self, cookie_cache: _CookieCache, timeout: int, workers: int) -> None:
+        self.cookie_cache = cookie_cache
+        self.timeout = timeout
+        self.workers = max(1, workers)
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+        # (verdict, reason) for sessions this checker could not answer, by session id.
+        self.failures: Dict[str, Tuple[str, str]] = {}
+
+    def has_cookies(self, base_url: str) -> bool:
+        return bool(self.cookie_cache.load(base_url))
+
+    def reset(self, base_url: str) -> None:
+        """Drop the pooled session so freshly exported cookies are picked up."""
+
+        with self._lock:
+            session = self._sessions.pop(base_url, None)
+        if session is not None:
+            session.close()
+
+    def check_many(self, lookups: Sequence[Tuple[str, str]]) -> List[Optional[bool]]:
+        """Check ``[(base_url, session_id), …]`` concurrently."""
+
+        if not lookups:
+            return []
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(lambda item: self.check(*item), lookups))
+
+    @auditTrace.traced("panopto_delivery_check", "panopto", "session_id")
+    def check(self, base_url: str, session_id: str) -> Optional[bool]:
+        session = self._session_for(base_url)
+        if session is None:
+            self.failures[session_id.lower()] = ("error", "No Panopto login cookies for the delivery-info check")
+            return None
+
+        try:
+            response = session.post(
+                f"{base_url}{DELIVERY_INFO_PATH}",
+                data={
+                    "deliveryId": session_id,
+                    "isEmbed": "true",
+                    "responseType": "json",
+                },
+                timeout=self.timeout,
+            )
+        except requests.RequestException as exc:
+            log.error("Error contacting Panopto delivery info for %s: %s", session_id, exc)
+            self.failures[session_id.lower()] = ("error", f"Delivery info: {exc}")
+            return None
+
+        if response.status_code != 200:
+            self.failures[session_id.lower()] = (
+                _status_verdict(response.status_code),
+                f"Delivery info returned HTTP {response.status_code}",
+            )
+            return None
+
+        try:
+            payload = response.json()
+        except ValueError:
+            # Expired cookies typically produce an HTML login page instead of JSON.
+            self.failures[session_id.lower()] = ("error", "Delivery info was not JSON; the Panopto login may have expired")
+            return None
+
+        answer = _captions_from_delivery_info(payload)
+        if answer is None:
+            self.failures[session_id.lower()] = ("unknown", "Delivery info did not describe captions")
+        return answer
+
+    def close(self) -> None:
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            try:
+                session.close()
+            except Exception:
+                pass
+
+    def _session_for(self, base_url: str) -> Optional[requests.Session]:
+        with self._lock:
+            session = self._sessions.get(base_url)
+            if session is not None:
+                return session
+
+            cookies = self.cookie_cache.load(base_url)
+            if not cookies:
+                return None
+
+            session = transport.session("panopto_delivery")
+            adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            for cookie in cookies:
+                session.cookies.set(
+                    cookie["name"],
+                    cookie.get("value", ""),
+                    domain=cookie.get("domain"),
+                    path=cookie.get("path", "/"),
+                )
+            self._sessions[base_url] = session
+            return session
 
-    def __init__(self, client_id: str, client_secret: str, timeout: int = 15) -> None:
+
+class PanoptoAuditor:
+    """Audit helper that caches API tokens and a warm Selenium driver per host."""
+
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        timeout: int = 15,
+        api_workers: int = API_WORKERS,
+        token_cache: Optional[_TokenCache] = None,
+        cookie_cache: Optional[_CookieCache] = None,
+        headless: bool = True,
+        lean: bool = True,
+    ) -> None:
         self.client_id = client_id
         self.client_secret = client_secret
         self.timeout = timeout
+        self.api_workers = max(1, api_workers)
+        self.headless = headless
+        self.lean = lean
         self._tokens: Dict[str, _ApiToken] = {}
-        self._session = requests.Session()
-        self._driver: Optional[webdriver.Chrome] = None
-        self._driver_base: Optional[str] = None
+        self._token_cache = token_cache if token_cache is not None else _TokenCache()
+        self._token_lock = threading.Lock()
+        # Throttled and failing API calls are retried; a host that keeps failing trips its breaker.
+        self._session = transport.session("panopto_api")
+        adapter = HTTPAdapter(
+            pool_connections=self.api_workers, pool_maxsize=self.api_workers
+        )
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._cookie_cache = cookie_cache if cookie_cache is not None else _CookieCache()
+        self._delivery = _DeliveryInfoChecker(self._cookie_cache, timeout, self.api_workers)
+        self._drivers = browserSession.DriverPool(self._start_driver)
+        # (verdict, reason) for API lookups and browser visits that gave no answer.
+        self._failures: Dict[str, Tuple[str, str]] = {}
 
     # ------------------------------------------------------------------
     # public helpers
-    def audit(self, url: str) -> bool:
-        visit_url = _normalize_panopto_url(url)
-        base_url = self._base_url(visit_url)
-        session_id = _extract_session_id(url) or _extract_session_id(visit_url)
-
-        selenium_result = self._check_via_selenium(base_url, visit_url)
-        if selenium_result is True:
-            return True
+    def audit(self, url: str) -> Optional[bool]:
+        return self.audit_many([url])[url]
+
+    def audit_many(self, urls: Sequence[str]) -> Dict[str, Optional[bool]]:
+        """Like :meth:`audit_many_verdicts`; ``None`` where there is no definite verdict."""
+
+        return {
+            url: auditResults.captions_for(verdict)
+            for url, (verdict, _reason) in self.audit_many_verdicts(urls).items()
+        }
+
+    def audit_many_verdicts(self, urls: Sequence[str]) -> Dict[str, Tuple[str, Optional[str]]]:
+        """Audit ``urls`` API-first, using Selenium only for unanswered sessions.
+
+        REST lookups run concurrently across sessions. Sessions the API cannot
+        answer are checked over HTTP via the player's delivery-info endpoint
+        with exported login cookies; the browser only visits URLs for which
+        both strategies were inconclusive. Returns ``(verdict, reason)`` per
+        URL; URLs no strategy could answer get the ``unknown`` or ``error``
+        verdict of the last check that was tried, with its reason.
+        """
+
+        results: Dict[str, Optional[bool]] = {url: None for url in urls}
+
+        lookups: List[Tuple[str, str, str]] = []
+        for url in results:
+            visit_url = _normalize_panopto_url(url)
+            base_url = self._base_url(visit_url)
+            session_id = _extract_session_id(url) or _extract_session_id(visit_url)
+            if base_url and session_id:
+                lookups.append((url, base_url, session_id))
+
+        if lookups and self.client_id and self.client_secret:
+            with ThreadPoolExecutor(max_workers=self.api_workers) as pool:
+                answers = pool.map(
+                    lambda item: self._check_via_api(item[1], item[2]), lookups
+                )
+                for (url, _, _), answer in zip(lookups, answers):
+                    results[url] = answer
+
+        unanswered = [item for item in lookups if results[item[0]] is None]
+        by_host: Dict[str, List[Tuple[str, str, str]]] = {}
+        for item in unanswered:
+            by_host.setdefault(item[1], []).append(item)
+
+        for base_url, items in by_host.items():
+            auditProgress.check_cancelled()
+            if not self._delivery.has_cookies(base_url):
+                # One interactive login exports cookies for the whole host.
+                if self._ensure_driver(base_url) is None:
+                    continue
+            answers = self._delivery.check_many([(base, sid) for _, base, sid in items])
+            for (url, _, _), answer in zip(items, answers):
+                results[url] = answer
+
+        pending = [url for url, answer in results.items() if answer is None]
+        if pending:
+            log.info(
+                "Panopto HTTP checks answered %s of %s sessions; checking %s in the browser.",
+                len(results) - len(pending),
+                len(results),
+                len(pending),
+            )
 
-        api_result: Optional[bool] = None
-        if base_url and session_id:
-            api_result = self._check_via_api(base_url, session_id)
+        # Visit URLs host by host so each warm driver is reused back to back.
+        visits = sorted(
+            ((self._base_url(_normalize_panopto_url(url)) or "", url) for url in pending),
+            key=lambda item: item[0],
+        )
+        for base_url, url in visits:
+            auditProgress.check_cancelled()
+            results[url] = self._check_via_selenium(base_url or None, _normalize_panopto_url(url))
 
-        if selenium_result is False:
-            return True if api_result is True else False
+        verdicts: Dict[str, Tuple[str, Optional[str]]] = {}
+        for url, answer in results.items():
+            if answer is not None:
+                verdicts[url] = (auditResults.verdict_for(bool(answer)), None)
+            else:
+                verdicts[url] = self._failure_for(url)
+        return verdicts
 
-        if selenium_result is None:
-            if api_result is not None:
-                return api_result
-            return False
+    def _failure_for(self, url: str) -> Tuple[str, str]:
+        """The most specific recorded reason ``url`` got no answer; the browser check runs last."""
 
-        return api_result if api_result is not None else False
+        visit_url = _normalize_panopto_url(url)
+        session_id = (_extract_session_id(url) or _extract_session_id(visit_url) or "").lower()
+        failure = self._failures.pop(visit_url, None)
+        delivery = self._delivery.failures.pop(session_id, None) if session_id else None
+        api = self._failures.pop(session_id, None) if session_id else None
+        return failure or delivery or api or ("unknown", "No Panopto check could answer")
 
     def close(self) -> None:
-        if self._driver:
-            try:
-                self._driver.quit()
-            except Exception:
-                pass
-        self._driver = None
-        self._driver_base = None
+        self._drivers.close()
+        self._delivery.close()
         try:
             self._session.close()
         except Exception:
             pass
 
+    def audit_folders(
+        self, folders: Iterable[Tuple[str, str]], linked_sessions: Sequence[Tuple[str, str]] = ()
+    ) -> Dict[Tuple[str, str], dict]:
+        """Audit every session in ``folders`` through the REST API.
+
+        ``linked_sessions`` are ``(base_url, session_id)`` pairs from Canvas
+        links; those not found in ``folders`` have their parent folder looked
+        up, and that folder is audited too. Returns a mapping of
+        ``(base_url, session_id)`` to ``{"folder_id", "url", "has_captions"}``
+        where ``has_captions`` is ``None`` when the API could not answer.
+        Folders whose listing fails are recorded with
+        :func:`auditResults.record_retryable` and left out; their linked
+        sessions are then checked on their own by the caller.
+        """
+
+        if not self.client_id or not self.client_secret:
+            log.warning("Panopto folder mode requires API client credentials.")
+            return {}
+
+        sessions: Dict[Tuple[str, str], dict] = {}
+        listed: Set[Tuple[str, str]] = set()
+        self._list_folders(set(folders), sessions, listed)
+
+        # Only sessions outside the folders listed so far need a folder lookup.
+        unique_linked = sorted(set(linked_sessions) - set(sessions))
+        if unique_linked:
+            with ThreadPoolExecutor(max_workers=self.api_workers) as pool:
+                parents = pool.map(lambda item: self._session_folder(*item), unique_linked)
+                found = {
+                    (base_url, folder_id)
+                    for (base_url, _), folder_id in zip(unique_linked, parents)
+                    if folder_id
+                }
+            self._list_folders(found - listed, sessions, listed)
+
+        log.info("Auditing %s Panopto sessions from %s folders.", len(sessions), len(listed))
+
+        keys = list(sessions)
+        with ThreadPoolExecutor(max_workers=self.api_workers) as pool:
+            answers = pool.map(lambda key: self._check_via_api(*key), keys)
+            for key, answer in zip(keys, answers):
+                sessions[key]["has_captions"] = answer
+
+        return sessions
+
     # ------------------------------------------------------------------
     # context manager support
     def __enter__(self) -> "PanoptoAuditor":
@@ -300,12 +717,14 @@ class PanoptoAuditor:
 
         return f"{parsed.scheme}://{parsed.netloc}"
 
+    @auditTrace.traced("panopto_api_check", "panopto", "session_id")
     def _check_via_api(self, base_url: str, session_id: str) -> Optional[bool]:
         if not self.client_id or not self.client_secret:
             return None
 
         token = self._get_token(base_url)
         if not token:
+            self._failures[session_id.lower()] = ("error", "No Panopto API token")
             return None
 
         url = f"{base_url}/Panopto/api/v1/sessions/{session_id}/captions"
@@ -316,7 +735,8 @@ class PanoptoAuditor:
                 timeout=self.timeout,
             )
         except requests.RequestException as exc:
-            print(f"Error contacting Panopto API for {session_id}: {exc}")
+            log.error("Error contacting Panopto API for %s: %s", session_id, exc)
+            self._failures[session_id.lower()] = ("error", f"Panopto API: {exc}")
             return None
 
         if response.status_code == 200:
@@ -330,16 +750,141 @@ class PanoptoAuditor:
         if response.status_code in {204, 404}:
             return False
 
-        print(
-            f"Panopto API call for session {session_id} returned {response.status_code}: {response.text[:120]}"
+        log.warning(
+            "Panopto API call for session %s returned %s: %s",
+            session_id,
+            response.status_code,
+            response.text[:120],
+        )
+        self._failures[session_id.lower()] = (
+            _status_verdict(response.status_code),
+            f"Panopto API returned HTTP {response.status_code}",
         )
         return None
 
+    def _api_get(self, base_url: str, path: str, params: Optional[dict] = None) -> Optional[object]:
+        token = self._get_token(base_url)
+        if not token:
+            return None
+
+        try:
+            response = self._session.get(
+                f"{base_url}/Panopto/api/v1/{path}",
+                headers={"Authorization": f"Bearer {token}"},
+                params=params,
+                timeout=self.timeout,
+            )
+        except requests.RequestException as exc:
+            log.error("Error contacting Panopto API (%s): %s", path, exc)
+            return None
+
+        if response.status_code != 200:
+            log.warning("Panopto API call %s returned %s: %s", path, response.status_code, response.text[:120])
+            return None
+
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    def _session_folder(self, base_url: str, session_id: str) -> Optional[str]:
+        payload = self._api_get(base_url, f"sessions/{session_id}")
+        if not isinstance(payload, dict):
+            return None
+
+        details = payload.get("FolderDetails")
+        if isinstance(details, dict) and details.get("Id"):
+            return str(details["Id"]).lower()
+        return None
+
+    def _list_folders(
+        self, targets: Set[Tuple[str, str]], sessions: Dict[Tuple[str, str], dict], listed: Set[Tuple[str, str]]
+    ) -> None:
+        """Add the sessions of each ``(base_url, folder_id)`` in ``targets`` to ``sessions``."""
+
+        for base_url, folder_id in sorted(targets):
+            auditProgress.check_cancelled()
+            folder_url = _folder_url(base_url, folder_id)
+            try:
+                folder_sessions = self._folder_sessions(base_url, folder_id)
+            except transport.TransportError as exc:
+                log.error("Could not list Panopto folder %s: %s", folder_id, exc)
+                auditResults.record_retryable("folder", str(exc), platform="panopto", url=folder_url)
+                continue
+            auditResults.clear_retryable("folder", platform="panopto", url=folder_url)
+            listed.add((base_url, folder_id))
+            for session in folder_sessions:
+                session_id = str(session.get("Id") or "").lower()
+                if not session_id:
+                    continue
+                urls = session.get("Urls") if isinstance(session.get("Urls"), dict) else {}
+                viewer_url = urls.get("ViewerUrl") or (
+                    f"{base_url}/Panopto/Pages/Viewer.aspx?id={session_id}"
+                )
+                sessions[(base_url, session_id)] = {
+                    "folder_id": folder_id,
+                    "url": viewer_url,
+                    "has_captions": None,
+                }
+
+    def _folder_sessions(self, base_url: str, folder_id: str) -> List[dict]:
+        """Every session in the folder; raises :class:`transport.TransportError` rather than truncating."""
+
+        token = self._get_token(base_url)
+        if not token:
+            raise transport.TransportError("No Panopto API token", url=base_url, status=None)
+
+        sessions: List[dict] = []
+        path = f"{base_url}/Panopto/api/v1/folders/{folder_id}/sessions"
+        for page in range(FOLDER_PAGE_LIMIT):
+            try:
+                response = self._session.get(
+                    path,
+                    headers={"Authorization": f"Bearer {token}"},
+                    params={"pageNumber": page},
+                    timeout=self.timeout,
+                )
+            except transport.TransportError:
+                raise
+            except requests.RequestException as exc:
+                raise transport.TransportError(f"GET {path} page {page}: {exc}", url=path) from exc
+            if response.status_code != 200:
+                raise transport.TransportError(
+                    f"GET {path} page {page} returned {response.status_code}: {response.text[:120]}",
+                    url=path,
+                    status=response.status_code,
+                    retryable=response.status_code >= 500 or response.status_code in (401, 408, 429),
+                )
+            try:
+                payload = response.json()
+            except ValueError as exc:
+                raise transport.TransportError(f"GET {path} page {page} returned invalid JSON", url=path) from exc
+            results = payload.get("Results") if isinstance(payload, dict) else None
+            if not results:
+                break
+            sessions.extend(item for item in results if isinstance(item, dict))
+        else:
+            # Still returning sessions after FOLDER_PAGE_LIMIT pages; a partial listing would pass for the whole folder.
+            raise transport.TransportError(
+                f"GET {path} still had results after {FOLDER_PAGE_LIMIT} pages", url=path, retryable=False
+            )
+        return sessions
+
     def _get_token(self, base_url: str) -> Optional[str]:
+        with self._token_lock:
+            return self._get_token_locked(base_url)
+
+    def _get_token_locked(self, base_url: str) -> Optional[str]:
         token = self._tokens.get(base_url)
         if token and time.time() < token.expires_at:
             return token.token
 
+        token = self._token_cache.load(self.client_id, base_url)
+        auditMetrics.inc("cache_requests_total", {"cache": "panopto_token", "result": "hit" if token else "miss"})
+        if token:
+            self._tokens[base_url] = token
+            return token.token
+
         data = {"grant_type": "client_credentials", "scope": "api"}
         token_url = f"{base_url}/Panopto/oauth2/connect/token"
 
@@ -351,19 +896,19 @@ class PanoptoAuditor:
                 timeout=self.timeout,
             )
         except requests.RequestException as exc:
-            print(f"Error requesting Panopto token: {exc}")
+            log.error("Error requesting Panopto token: %s", exc)
             return None
 
         if response.status_code != 200:
-            print(
-                f"Panopto token request failed ({response.status_code}): {response.text[:120]}"
+            log.error(
+                "Panopto token request failed (%s): %s", response.status_code, response.text[:120]
             )
             return None
 
         try:
             payload = response.json()
         except ValueError:
-            print("Panopto token response was not valid JSON.")
+            log.error("Panopto token response was not valid JSON.")
             return None
 
         token_value = payload.get("access_token")
@@ -373,19 +918,34 @@ class PanoptoAuditor:
             return None
 
         expiry = time.time() + max(int(expires_in) - 30, 0)
-        self._tokens[base_url] = _ApiToken(token_value, expiry)
+        token = _ApiToken(token_value, expiry)
+        self._tokens[base_url] = token
+        try:
+            self._token_cache.store(self.client_id, base_url, token)
+        except OSError as exc:
+            log.warning("Unable to persist Panopto token cache: %s", exc)
         return token_value
 
+    @auditTrace.traced("panopto_browser_check", "panopto", "url")
     def _check_via_selenium(self, base_url: Optional[str], url: str) -> Optional[bool]:
+        # Selenium is only loaded when the API and delivery-info checks left sessions unanswered.
+        from selenium.common.exceptions import TimeoutException, WebDriverException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
         driver = self._ensure_driver(base_url)
         if not driver:
-            print("Selenium driver could not be started; falling back to API if available.")
+            log.warning("Selenium driver could not be started; falling back to API if available.")
+            self._failures[url] = ("error", "Browser could not be started or signed in")
             return None
 
         try:
-            driver.get(url)
+            with auditMetrics.timed("page_load", stage="panopto"):
+                driver.get(url)
         except WebDriverException as exc:
-            print(f"Error loading Panopto URL {url}: {exc}")
+            log.error("Error loading Panopto URL %s: %s", url, exc)
+            self._failures[url] = ("error", f"Browser: {type(exc).__name__}")
             return None
 
         try:
@@ -393,7 +953,8 @@ class PanoptoAuditor:
                 EC.presence_of_element_located((By.TAG_NAME, "body"))
             )
         except TimeoutException:
-            print(f"Timed out waiting for Panopto player to load for {url}")
+            log.warning("Timed out waiting for Panopto player to load for %s", url)
+            self._failures[url] = ("error", "Timed out loading the Panopto player")
             return None
 
         try:
@@ -411,6 +972,11 @@ class PanoptoAuditor:
         return True if found else False
 
     def _scan_for_captions(self, driver: webdriver.Chrome, depth: int = 0) -> bool:
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
         if depth > 5:
             return False
 
@@ -443,64 +1009,69 @@ class PanoptoAuditor:
         return False
 
     def _ensure_driver(self, base_url: Optional[str]) -> Optional[webdriver.Chrome]:
-        if self._driver and base_url and base_url != self._driver_base:
-            try:
-                self._driver.quit()
-            except Exception:
-                pass
-            self._driver = None
-            self._driver_base = None
-
-        if self._driver:
-            return self._driver
+        return self._drivers.get(base_url or "")
 
-        chrome_options = Options()
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--no-sandbox")
+    def _start_driver(self, key: str) -> Optional[webdriver.Chrome]:
+        base_url = key or None
+        from selenium.common.exceptions import WebDriverException
 
+        profile = f"panopto-{urlparse(base_url).netloc}" if base_url else "panopto"
         try:
-            driver = webdriver.Chrome(
-                service=Service(ChromeDriverManager().install()),
-                options=chrome_options,
-            )
+            if base_url:
+                driver = browserSession.open_authenticated_driver(
+                    profile,
+                    login_url=base_url,
+                    probe_url=f"{base_url}{SESSION_PROBE_PATH}",
+                    prompt=self._prompt_for_login,
+                    headless=self.headless,
+                    lean=self.lean,
+                )
+            else:
+                driver = browserSession.start_driver(profile, lean=self.lean)
+                self._prompt_for_login()
+        except browserSession.LoginRequiredError as exc:
+            log.warning("%s", exc)
+            return None
         except WebDriverException as exc:
-            print(f"Unable to start ChromeDriver: {exc}")
+            log.warning("Unable to start ChromeDriver: %s", exc)
             return None
 
-        self._driver = driver
-        self._driver_base = base_url
-
         if base_url:
-            try:
-                driver.get(base_url)
-            except WebDriverException:
-                pass
-
-        self._prompt_for_login()
+            self._export_cookies(driver, base_url)
         return driver
 
-    def _prompt_for_login(self) -> None:
-        message = (
-            "Please log into Panopto in the opened browser window, then click Continue."
-        )
+    def _export_cookies(self, driver: webdriver.Chrome, base_url: str) -> None:
+        """Persist the browser's login cookies for the delivery-info checker."""
 
-        if tk is None:
-            try:
-                input(message + "\nPress Enter here once the login is complete...")
-            except EOFError:
-                pass
+        from selenium.common.exceptions import WebDriverException
+
+        try:
+            cookies = driver.get_cookies()
+        except WebDriverException as exc:
+            log.warning("Unable to read Panopto cookies from the browser: %s", exc)
+            return
+
+        if not cookies:
             return
 
-        root = tk.Tk()
-        root.title("Panopto Login Required")
-        root.geometry("360x140")
-        label = tk.Label(root, text=message, wraplength=320, justify="center")
-        label.pack(pady=20)
-        tk.Button(root, text="Continue", command=root.destroy).pack(pady=5)
-        root.mainloop()
+        try:
+            self._cookie_cache.store(base_url, cookies)
+        except OSError as exc:
+            log.warning("Unable to persist Panopto cookies: %s", exc)
+            return
+
+        self._delivery.reset(base_url)
+
+    def _prompt_for_login(self) -> None:
+        browserSession.prompt_for_login(
+            "Panopto Login Required",
+            "Please log into Panopto in the opened browser window, then click Continue.",
+        )
 
     @staticmethod
     def _captions_present(driver: webdriver.Chrome) -> bool:
+        from selenium.webdriver.common.by import By
+
         keywords = ("caption", "captions", "subtitle", "subtitles")
 
         def _contains_keyword(value: Optional[str]) -> bool:
@@ -553,40 +1124,148 @@ class PanoptoAuditor:
 
 
 def _load_course_ids() -> List[str]:
-    payload = _load_json_file("data/courses_ids.json")
-    if isinstance(payload, list):
-        return [str(item) for item in payload]
-    return []
+    # With a deadline, only the courses crawled in time, largest first.
+    return auditPriority.course_ids()
+
+
+def _folder_url(base_url: str, folder_id: str) -> str:
+    """The folder's page in the Panopto web UI; identifies it in the retry file."""
+
+    return f"{base_url}/Panopto/Pages/Sessions/List.aspx#folderID=%22{folder_id}%22"
+
 
+def _configured_folders() -> Set[Tuple[str, str]]:
+    base_url = FOLDER_BASE_URL.rstrip("/")
+    if not base_url:
+        return set()
+    return {(base_url, str(folder_id).lower()) for folder_id in FOLDER_IDS if folder_id}
 
-def main(courses: Optional[Sequence[str]] = None, include_course_ids: bool = False) -> None:
-    """Audit Panopto videos for the provided course ids."""
+
+def _retry_folders() -> Set[Tuple[str, str]]:
+    """Folders whose listing failed on an earlier run."""
+
+    folders = set()
+    for item in auditResults.load_retryable():
+        if item.get("kind") != "folder" or item.get("platform") != "panopto":
+            continue
+        folder_id = _extract_folder_id(item.get("url", ""))
+        base_url = PanoptoAuditor._base_url(item.get("url", ""))
+        if folder_id and base_url:
+            folders.add((base_url, folder_id))
+    return folders
+
+
+def _audit_by_folder(
+    auditor: PanoptoAuditor,
+    videos: List[Tuple[str, str]],
+    folders: Set[Tuple[str, str]],
+) -> Tuple[Dict[str, Tuple[str, Optional[str]]], List[dict]]:
+    """Return ``(verdict, reason)`` for ``videos`` plus entries for sessions not linked in Canvas."""
+
+    linked: Dict[str, Tuple[str, str]] = {}
+    for _, url in videos:
+        visit_url = _normalize_panopto_url(url)
+        base_url = PanoptoAuditor._base_url(visit_url)
+        session_id = _extract_session_id(url) or _extract_session_id(visit_url)
+        if base_url and session_id:
+            linked[url] = (base_url, session_id.lower())
+
+    listed = auditor.audit_folders(folders, list(linked.values()))
+
+    verdicts: Dict[str, Tuple[str, Optional[str]]] = {}
+    leftovers: List[str] = []
+    for _, url in videos:
+        record = listed.get(linked.get(url, ("", "")))
+        if record and record["has_captions"] is not None:
+            verdicts[url] = (auditResults.verdict_for(bool(record["has_captions"])), None)
+        else:
+            leftovers.append(url)
+
+    if leftovers:
+        verdicts.update(auditor.audit_many_verdicts(leftovers))
+
+    linked_keys = set(linked.values())
+    unlinked = [
+        auditResults.make_entry(
+            "panopto",
+            record["url"],
+            auditResults.verdict_for(bool(record["has_captions"])),
+            folder_id=record["folder_id"],
+            linked=False,
+        )
+        for key, record in sorted(listed.items())
+        if key not in linked_keys and record["has_captions"] is not None
+    ]
+    return verdicts, unlinked
+
+
+def main(
+    courses: Optional[Sequence[str]] = None,
+    include_course_ids: bool = False,
+    folder_mode: Optional[bool] = None,
+) -> None:
+    """Audit Panopto videos for the provided course ids.
+
+    ``folder_mode`` audits every session of whole Panopto folders; it defaults to on
+    when folder ids are configured in ``config/panoptoKey.py``.
+    """
 
     if courses is None:
         courses = _load_course_ids()
 
     if not courses:
-        print("Debug: No courses supplied for Panopto audit.")
+        log.debug("No courses supplied for Panopto audit.")
         return
 
-    videos = _iter_panopto_links(courses)
-    if not videos:
-        print("Debug: No Panopto videos found to audit.")
+    folders = _configured_folders()
+    if folder_mode is None:
+        folder_mode = bool(folders)
+    if folder_mode:
+        folders |= _retry_folders()
+
+    videos = _iter_panopto_links(courses, folders if folder_mode else None)
+    # A resumed run skips the videos it already has verdicts for.
+    videos = [(course_id, url) for course_id, url in videos if not auditProgress.already_checked("panopto", url)]
+    # With a deadline, unchecked and stale videos go first.
+    videos = auditPriority.order("panopto", videos)
+    if not videos and not folders:
+        log.debug("No Panopto videos found to audit.")
         return
 
+    auditProgress.emit("videos_queued", stage="panoptoVideo", count=len(videos))
     with PanoptoAuditor(CLIENT_ID, CLIENT_SECRET) as auditor:
-        for course_id, url in videos:
-            has_captions = auditor.audit(url)
-            entry = {
-                "type": "panopto",
-                "url": url,
-                "has_captions": has_captions,
-            }
-            if include_course_ids:
-                entry["course_id"] = course_id
+        if folder_mode:
+            verdicts, unlinked = _audit_by_folder(auditor, videos, folders)
+            # Unlinked sessions come back on every folder-mode run; replace their earlier verdicts.
+            auditResults.upsert_results(unlinked)
+            _write_verdicts(videos, verdicts, include_course_ids)
+            return
 
-            _append_result(entry)
+        # Batches keep the API checks concurrent while writing verdicts as they
+        # come in, so a cancelled or deadline-stopped run keeps its finished work.
+        for start in range(0, len(videos), BATCH_SIZE):
+            batch = videos[start:start + BATCH_SIZE]
+            _write_verdicts(batch, auditor.audit_many_verdicts([url for _, url in batch]), include_course_ids)
+
+
+def _write_verdicts(
+    videos: Sequence[Tuple[str, str]], verdicts: Dict[str, Tuple[str, Optional[str]]], include_course_ids: bool
+) -> None:
+    entries = []
+    for course_id, url in videos:
+        verdict, reason = verdicts.get(url, ("unknown", "No Panopto check could answer"))
+        # Unknown and error verdicts are written too; reAudit.py re-checks them later.
+        entries.append(auditResults.make_entry(
+            "panopto", url, verdict, reason, course_id=course_id if include_course_ids else None
+        ))
+    # One read-modify-write of the results file per batch; progress only after it is saved.
+    auditResults.append_results(entries)
+    for _, url in videos:
+        auditProgress.video_checked("panopto", url)
 
 
 if __name__ == "__main__":  # pragma: no cover - manual invocation helper
-    main()
+    import sys
+
+    auditLog.configure()
+    main(folder_mode=True if "--folders" in sys.argv[1:] else None)
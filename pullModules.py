@@ -4,182 +4,172 @@
 
 #pulls user courses, seperates modules and urls by type.
 
-import requests
-from config.canvasAPI import CANVAS_API_TOKEN
-import json
-
-CANVAS_BASE_URL = "https://canvas.uccs.edu/api/v1"
-HEADERS = {"Authorization": f"Bearer {CANVAS_API_TOKEN}"}
-
-
-def _get_next_link(link_header):
-    """Return the ``rel=next`` URL from a Canvas pagination header."""
-
-    if not link_header:
-        return None
-
-    for part in link_header.split(","):
-        section = part.strip()
-        if 'rel="next"' not in section:
-            continue
-
-        start = section.find("<")
-        end = section.find(">", start + 1)
-        if start != -1 and end != -1:
-            return section[start + 1 : end]
-
-    return None
+import time
+import artifactStore
+import auditLog
+import auditPriority
+import auditProgress
+import auditResults
+import auditTrace
+import canvasInstances
+import transport
+
+log = auditLog.get_logger("pullModules")
+
+#the Canvas instance this process audits (see canvasInstances); each instance runs in its own process
+INSTANCE = canvasInstances.selected()
+CANVAS_BASE_URL = INSTANCE.api_url
+HEADERS = INSTANCE.headers()
+#shared keep-alive session so repeated crawls (e.g. the audit daemon) reuse warm connections;
+#throttled or failing calls are retried with backoff, paced by the instance's rate governor,
+#and every call is counted by endpoint
+SESSION = INSTANCE.session()
+
+#Canvas statuses that mean a course's modules are not visible to this token
+NO_ACCESS_STATUSES = (401, 403, 404)
 
 
 #retrieves all courses that the user is enrolled in
 def get_courses():
-    '''Fetches all courses the user is enrolled in from Canvas API.'''
-    print("Debug: Fetching courses")
+    '''Fetches all courses the user is enrolled in from Canvas API.
+    Raises transport.TransportError instead of returning a partial course list.'''
+    log.debug("Fetching courses")
     courses = []
-    url = f"{CANVAS_BASE_URL}/courses"
-    params = {"per_page": 100}
-
-    while url:
-        request_kwargs = {"headers": HEADERS}
-        if params is not None and "?" not in url:
-            request_kwargs["params"] = params
-
-        response = requests.get(url, **request_kwargs)
-        if response.status_code != 200:
-            print(f"Error fetching courses: {response.status_code} - {response.text}")
-            break
-
+    #total_students lets deadline-bounded runs audit the largest courses first
+    params = {"per_page": 100, "include[]": "total_students"}
+    for response in transport.paginate(SESSION, f"{CANVAS_BASE_URL}/courses", params, HEADERS):
         batch = response.json()
-        print(f"Debug: Fetched {len(batch)} courses")
+        log.info("Fetched %s courses", len(batch))
         courses.extend(batch)
 
-        url = _get_next_link(response.headers.get("Link", ""))
-        params = None
-
     return courses
 
-#Fetches all modules for a specific course
+#Resolves the urls for a single module item
+def getItemUrls(item):
+    """Returns the URLs referenced by one Canvas module item.
+    Args:
+        item (dict): A module item as returned by the Canvas API.
+    Returns:
+        list: URLs for the item. Panopto external tools are resolved to their
+        sessionless launch URL (marked with ``_panopto_video=true``).
+    """
+    urls = []
+    link = item.get("url")
+    external = item.get("external_url")
+    item_type = item.get("type")
+    is_panopto_external_tool = False
+
+    # Check if this is an external tool (potentially Panopto)
+    if link and item_type == "ExternalTool":
+        try:
+            # Check if the item itself contains Panopto information
+            item_title = item.get("title", "").lower()
+            item_external_url = item.get("external_url", "").lower()
+
+            # Check if this is a Panopto tool based on item metadata
+            is_panopto = "panopto" in item_title or "panopto" in item_external_url
+
+            # Make an additional API call to the Canvas module item URL
+            link_response = SESSION.get(link, headers=HEADERS)
+            if link_response.status_code == 200:
+                link_data = link_response.json()
+                log.debug("API response for %s: %s", link, link_data)
+
+                # Check if this is a Panopto external tool
+                external_tool_url = link_data.get("external_url", "")
+
+                # Also check the response for Panopto indicators
+                if not is_panopto:
+                    is_panopto = "panopto" in external_tool_url.lower()
+
+                # Look for sessionless_launch URL
+                sessionless_url = link_data.get("url")
+
+                # If it's Panopto, use the sessionless_launch URL for Selenium testing
+                if is_panopto:
+                    is_panopto_external_tool = True
+                    if sessionless_url:
+                        # Mark this as a Panopto URL by adding a marker parameter
+                        marked_url = sessionless_url + "&_panopto_video=true"
+                        urls.append(marked_url)
+                        log.debug("Found Panopto sessionless_launch URL: %s", marked_url)
+                    else:
+                        # Fallback to external_url if available
+                        if external_tool_url:
+                            urls.append(external_tool_url)
+                            log.debug("Using Panopto external_url: %s", external_tool_url)
+                        else:
+                            urls.append(link)
+                else:
+                    # Not Panopto, add the direct URL if available
+                    direct_url = link_data.get("url", link)
+                    urls.append(direct_url)
+            else:
+                # Fallback to original link if API call fails
+                urls.append(link)
+        except transport.TransportError:
+            # Canvas is throttling or down; fail the course crawl so it is retried
+            raise
+        except Exception as e:
+            log.error("Error following Canvas API for external tool %s: %s", link, e)
+            # Fallback to original link
+            urls.append(link)
+    elif link and "panopto" in link.lower():
+        # Direct Panopto link
+        urls.append(link)
+    elif link:
+        urls.append(link)
+
+    # Skip adding external_url for Panopto external tools (we already added the sessionless_launch URL)
+    if external and not is_panopto_external_tool:
+        urls.append(external)
+
+    return urls
+
+
+#Fetches all modules for a specific course; its trace span records how many URLs it found, not the URLs
+@auditTrace.traced("course", "canvas", "course_id", summarize=len)
 def getCourseModules(course_id):
     """Fetches all modules for a specific course from Canvas API.
     Args:
         course_id (int): The ID of the course to fetch modules for.
     Returns:
         list: A list of URLs for items in the course modules.
+    Raises transport.TransportError when a page cannot be fetched, rather than
+    returning a truncated list; the error's url is the page that failed.
     """
     urls = []  # stores the urls of the items in the modules
-    url = f"{CANVAS_BASE_URL}/courses/{course_id}/modules"
-    params = {"per_page": 100}
-
-    while url:
-        request_kwargs = {"headers": HEADERS}
-        if params is not None:
-            request_kwargs["params"] = params
-
-        response = requests.get(url, **request_kwargs)
-        if response.status_code != 200:
-            print(
-                f"Error fetching modules for course {course_id}: {response.status_code} - {response.text}"
-            )
-            break
-
-        payload = response.json()
-        items_urls = [module.get("items_url") for module in payload]
-
-        for items_url in items_urls:
-            if not items_url:
-                continue
-
-            item_url = items_url
-            item_params = {"per_page": 100}
-
-            while item_url:
-                item_kwargs = {"headers": HEADERS}
-                if item_params is not None and "?" not in item_url:
-                    item_kwargs["params"] = item_params
-
-                items_response = requests.get(item_url, **item_kwargs)
-                if items_response.status_code != 200:
-                    print(
-                        f"Error fetching module items for course {course_id}: {items_response.status_code} - {items_response.text}"
-                    )
-                    break
-
-                items = items_response.json()
-                for item in items:
-                    link = item.get("url")
-                    external = item.get("external_url")
-                    item_type = item.get("type")
-                    is_panopto_external_tool = False
-
-                    # Check if this is an external tool (potentially Panopto)
-                    if link and item_type == "ExternalTool":
-                        try:
-                            # Check if the item itself contains Panopto information
-                            item_title = item.get("title", "").lower()
-                            item_external_url = item.get("external_url", "").lower()
-
-                            # Check if this is a Panopto tool based on item metadata
-                            is_panopto = "panopto" in item_title or "panopto" in item_external_url
-
-                            # Make an additional API call to the Canvas module item URL
-                            link_response = requests.get(link, headers=HEADERS)
-                            if link_response.status_code == 200:
-                                link_data = link_response.json()
-                                print(f"Debug: API response for {link}: {link_data}")
-
-                                # Check if this is a Panopto external tool
-                                external_tool_url = link_data.get("external_url", "")
-
-                                # Also check the response for Panopto indicators
-                                if not is_panopto:
-                                    is_panopto = "panopto" in external_tool_url.lower()
-
-                                # Look for sessionless_launch URL
-                                sessionless_url = link_data.get("url")
-
-                                # If it's Panopto, use the sessionless_launch URL for Selenium testing
-                                if is_panopto:
-                                    is_panopto_external_tool = True
-                                    if sessionless_url:
-                                        # Mark this as a Panopto URL by adding a marker parameter
-                                        marked_url = sessionless_url + "&_panopto_video=true"
-                                        urls.append(marked_url)
-                                        print(f"Debug: Found Panopto sessionless_launch URL: {marked_url}")
-                                    else:
-                                        # Fallback to external_url if available
-                                        if external_tool_url:
-                                            urls.append(external_tool_url)
-                                            print(f"Debug: Using Panopto external_url: {external_tool_url}")
-                                        else:
-                                            urls.append(link)
-                                else:
-                                    # Not Panopto, add the direct URL if available
-                                    direct_url = link_data.get("url", link)
-                                    urls.append(direct_url)
-                            else:
-                                # Fallback to original link if API call fails
-                                urls.append(link)
-                        except Exception as e:
-                            print(f"Error following Canvas API for external tool {link}: {e}")
-                            # Fallback to original link
-                            urls.append(link)
-                    elif link and "panopto" in link.lower():
-                        # Direct Panopto link
-                        urls.append(link)
-                    elif link:
-                        urls.append(link)
-
-                    # Skip adding external_url for Panopto external tools (we already added the sessionless_launch URL)
-                    if external and not is_panopto_external_tool:
-                        urls.append(external)
-
-                item_url = _get_next_link(items_response.headers.get("Link", ""))
-                item_params = None
-
-        url = _get_next_link(response.headers.get("Link", ""))
-        params = None
-
-    print(f"Debug: Found {len(urls)} URLs in course {course_id}")
+    modules = transport.paginate(
+        SESSION, f"{CANVAS_BASE_URL}/courses/{course_id}/modules", {"per_page": 100}, HEADERS
+    )
+
+    try:
+        for response in modules:
+            items_urls = [module.get("items_url") for module in response.json()]
+
+            for items_url in items_urls:
+                if not items_url:
+                    continue
+
+                item_pages = transport.paginate(SESSION, items_url, {"per_page": 100}, HEADERS)
+                while True:
+                    #one span per page of module items, with the item resolutions nested inside
+                    with auditTrace.span("module_page", "canvas", course_id=course_id, url=items_url) as page:
+                        items_response = next(item_pages, None)
+                        if items_response is None:
+                            break
+                        items = items_response.json()
+                        page["items"] = len(items)
+                        for item in items:
+                            with auditTrace.span("item_resolution", "canvas", item_id=item.get("id"), type=item.get("type")):
+                                urls.extend(getItemUrls(item))
+    except transport.TransportError as e:
+        if e.retryable or e.status not in NO_ACCESS_STATUSES or urls:
+            raise
+        #the modules tab is hidden or the token has no access: the course has no auditable modules
+        log.warning("No access to modules for course %s (%s)", course_id, e.status)
+
+    log.info("Found %s URLs in course %s", len(urls), course_id)
     return urls
     
 def sortUrls(urls):
@@ -191,9 +181,9 @@ def sortUrls(urls):
         dict: A dictionary with sorted URLs categorized by type.
         The keys are 'youtube', 'canvas', 'panopto', and 'other'.
     """
-    print("Debug: Sorting URLs")
+    log.debug("Sorting URLs")
     if not urls:
-        print("Debug: No URLs to sort")
+        log.debug("No URLs to sort")
         return {"youtube": [], "canvas": [], "panopto": [], "other": []}
 
     youtube = []
@@ -204,22 +194,22 @@ def sortUrls(urls):
     
     for u in urls:
         if not isinstance(u, str):
-            print(f"Debug: Skipping non-string URL: {u}")
+            log.debug("Skipping non-string URL: %s", u)
             continue
 
         lower = u.lower()
 
         if "youtu" in lower:
-            print(f"Debug: Found YouTube URL: {u}")
+            log.debug("Found YouTube URL: %s", u)
             youtube.append(u)
         elif "panopto" in lower or "_panopto_video=true" in lower:
-            print(f"Debug: Found Panopto URL: {u}")
+            log.debug("Found Panopto URL: %s", u)
             panopto.append(u)
         elif ("canvas" in lower) and ("files" in lower):
-            print(f"Debug: Found Canvas URL: {u}")
+            log.debug("Found Canvas URL: %s", u)
             canvas.append(u)
         else:
-            print(f"Debug: Found other URL: {u}")
+            log.debug("Found other URL: %s", u)
             other.append(u)
 
     return {
@@ -231,32 +221,113 @@ def sortUrls(urls):
             
     
 
-def main():
+def retry_courses(courses_ids):
+    """
+    Course ids listed in the retry file, limited to the current course list.
+    Courses that are no longer listed are dropped from the retry file.
+    """
+    current = {str(course) for course in courses_ids}
+    retry = set()
+    for item in auditResults.load_retryable():
+        if item.get("kind") != "course" or item.get("platform") != "canvas":
+            continue
+        course = str(item.get("course_id", ""))
+        if course in current:
+            retry.add(course)
+        else:
+            auditResults.clear_retryable("course", platform="canvas", course_id=course)
+    return retry
+
+
+def crawl_course(store, course, refresh):
+    """
+    Crawls one course into the artifact store.
+    Returns False (and lists the course in the retry file) when Canvas keeps failing;
+    re-raises transport.CircuitOpenError, since every later course would fail too.
+    """
+    try:
+        store.sorted_urls(course, refresh=refresh)
+    except transport.CircuitOpenError as e:
+        #Canvas stayed down through the breaker's cool-down; every later course would fail the same way
+        auditResults.record_retryable("course", str(e), platform="canvas", course_id=course)
+        log.error("Canvas is unavailable; stopping the crawl at course %s: %s", course, e)
+        raise
+    except transport.TransportError as e:
+        #nothing is saved for the course, so the next run crawls it again
+        log.error("Could not crawl course %s: %s", course, e)
+        auditResults.record_retryable("course", str(e), platform="canvas", course_id=course)
+        return False
+    auditResults.clear_retryable("course", platform="canvas", course_id=course)
+    return True
+
+
+def crawl_courses(store, courses, refresh, until):
+    """
+    Crawls courses in order.
+    returns:
+        tuple: (courses that failed, number of courses skipped because `until` passed).
+    """
+    failed = []
+    skipped = 0
+    for course in courses:
+        #stop between courses when the GUI cancels; crawled courses stay in the artifact store
+        auditProgress.check_cancelled()
+        if until is not None and time.time() >= until and (refresh or not store.is_fresh("sorted", course)):
+            #once crawl time is up, only courses whose saved data is still fresh are taken
+            skipped += 1
+            continue
+        if crawl_course(store, course, refresh):
+            auditProgress.emit("course_done", course_id=course)
+        else:
+            failed.append(course)
+    return failed, skipped
+
+
+def main(refresh=True, until=None):
+    """
+    args:
+        refresh (bool): re-crawl every course even if its saved modules are still fresh.
+        until (float): epoch time after which no further course is crawled (deadline-bounded runs).
+    returns:
+        int: number of courses left uncrawled because `until` passed.
+    Pulls courses and their modules into the run's artifact store.
+    """
+    #artifacts saved here are shared with every later stage of the run
+    store = artifactStore.current()
+
     #get courses
     courses = get_courses()
     courses_ids = [course['id'] for course in courses]
-    with open('data/courses.json', 'w') as f:
-        json.dump(courses, f, indent=4)
+    store.put("courses", None, courses)
    
     #save course ids
-    with open('data/courses_ids.json', 'w') as f:
-        json.dump(courses_ids, f, indent=4)
+    store.put("course_ids", None, courses_ids)
 
     
     #Pull modules for each course & sort
-    for course in courses_ids:
-        modules = getCourseModules(course)
-        with open(f'data/courseModules/modules_{course}.json', 'w') as f:
-            json.dump(modules, f, indent=4)
-
-    #sort modules and save to json
-    for course in courses_ids:
-        with open(f'data/courseModules/modules_{course}.json', 'r') as f:
-            urls = json.load(f)
-        sortedUrls = sortUrls(urls)
-        with open(f'data/sortedModules/sorted_modules_{course}.json', 'w') as f:
-            json.dump(sortedUrls, f, indent=4)
+    auditProgress.emit("courses_total", count=len(courses_ids))
+    #courses that failed on an earlier run are crawled first, then retried once more at the end
+    retry = retry_courses(courses_ids)
+    if retry:
+        log.info("Retrying %s courses that could not be crawled last time", len(retry))
+    #with a deadline, never-crawled and high-enrollment courses are crawled first
+    queue = sorted(auditPriority.crawl_order(courses_ids), key=lambda course: str(course) not in retry)
+    failed, skipped = crawl_courses(store, queue, refresh, until)
+    if failed:
+        #one more pass for courses that failed earlier in this run
+        log.info("Retrying %s courses that failed earlier in this run", len(failed))
+        failed, late = crawl_courses(store, failed, refresh, until)
+        skipped += late
+    for course in failed:
+        auditProgress.emit("course_done", course_id=course)
+
+    if failed:
+        log.warning("%s of %s courses could not be crawled; see %s", len(failed), len(courses_ids), auditResults.RETRY_PATH)
+    if skipped:
+        log.warning("Crawl time is up; %s of %s courses are left for the next run", skipped, len(courses_ids))
+    return skipped
 
 
 if __name__ == "__main__":
+    auditLog.configure()
     main()
\ No newline at end of file
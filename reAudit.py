@@ -0,0 +1,154 @@
+"""Re-check results that have no definite verdict, straight from the results store.
+
+A full audit re-crawls every Canvas course before it checks anything. When a
+run left videos with an ``unknown`` or ``error`` verdict (throttling, a
+browser that would not start, a Panopto login that expired), only those
+videos need another look, and their URLs are already in
+``data/audited_videos.json``. :func:`run` selects them, optionally together
+with ``no_captions`` verdicts older than ``stale_days`` (captions are often
+added after the first audit), and checks them in small batches per platform
+through :class:`videoCheckers.Checkers`. Each new verdict replaces the old
+entry in place; Canvas pages that no longer host a video are dropped.
+
+Usage::
+
+    python reAudit.py
+    python reAudit.py --stale-days 30
+    python runAudit.py --reaudit --stale-days 30
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import artifactStore
+import auditLog
+import auditMetrics
+import auditProgress
+import auditResults
+import auditTrace
+import canvasInstances
+import videoCheckers
+
+
+log = auditLog.get_logger("reAudit")
+
+# Verdicts that are always re-checked.
+RECHECK_VERDICTS = ("unknown", "error")
+# URLs checked between cancellation checks and result writes.
+CHUNK = 25
+
+
+def select(
+    entries: Sequence[dict], stale_days: Optional[float] = None, now: Optional[float] = None
+) -> List[dict]:
+    """Entries to re-check: ``unknown``/``error``, plus ``no_captions`` older than ``stale_days``.
+
+    Only entries of the Canvas instance this process audits are selected.
+    ``no_captions`` entries without a ``checked_at`` time predate verdict
+    tracking and count as stale.
+    """
+
+    now = time.time() if now is None else now
+    cutoff = None if stale_days is None else now - stale_days * 86400
+    # Other Canvas instances' pages need their own browser sessions; untagged entries are this instance's.
+    instance = canvasInstances.tag()
+    selected = []
+    for entry in entries:
+        if not isinstance(entry, dict) or entry.get("type") not in videoCheckers.PLATFORM_FOR_TYPE:
+            continue
+        if entry.get("instance", instance) != instance:
+            continue
+        verdict = auditResults.entry_verdict(entry)
+        if verdict in RECHECK_VERDICTS:
+            selected.append(entry)
+        elif verdict == "no_captions" and cutoff is not None and float(entry.get("checked_at") or 0) < cutoff:
+            selected.append(entry)
+    return selected
+
+
+def _updated(old: dict, platform: str, verdict: str, reason: Optional[str]) -> dict:
+    fresh = videoCheckers.result_entry(platform, old["url"], verdict, reason, old.get("course_id"))
+    entry = {key: value for key, value in old.items() if key != "reason"}
+    entry.update(fresh)
+    return entry
+
+
+def run(
+    stale_days: Optional[float] = None,
+    headless: bool = True,
+    trace: bool = True,
+    results_path: str = auditResults.RESULTS_PATH,
+) -> Dict[str, int]:
+    """Re-check the selected entries; returns the new verdict counts plus ``removed``."""
+
+    auditProgress.reset()
+    targets = select(auditResults.load_results(results_path), stale_days)
+    by_platform: Dict[str, List[dict]] = {}
+    for entry in targets:
+        by_platform.setdefault(videoCheckers.PLATFORM_FOR_TYPE[entry["type"]], []).append(entry)
+
+    summary = {verdict: 0 for verdict in auditResults.VERDICTS}
+    summary["removed"] = 0
+    log.info("Re-auditing %d results: %s", len(targets), ", ".join(f"{p} {len(e)}" for p, e in by_platform.items()) or "none")
+    if not targets:
+        return summary
+
+    # A run id of its own tags the new verdicts, so the re-audit can be invalidated as a run.
+    store = artifactStore.start_run()
+    if trace:
+        log.info("Writing trace spans to %s", auditTrace.start(f"reaudit-{store.run_id}"))
+    try:
+        with videoCheckers.Checkers(headless=headless) as checkers:
+            for platform, entries in by_platform.items():
+                auditProgress.emit("stage_started", stage=f"reaudit_{platform}")
+                auditProgress.emit("videos_queued", stage=f"reaudit_{platform}", count=len(entries))
+                for start in range(0, len(entries), CHUNK):
+                    auditProgress.check_cancelled()
+                    chunk = entries[start:start + CHUNK]
+                    with auditTrace.span("reaudit_chunk", "reaudit", platform=platform, videos=len(chunk)):
+                        verdicts = checkers.verdicts(platform, list(dict.fromkeys(entry["url"] for entry in chunk)))
+
+                    updated: List[dict] = []
+                    removed: List[Tuple[str, str, str, str]] = []
+                    for entry in chunk:
+                        if entry["url"] in verdicts:
+                            verdict, reason = verdicts[entry["url"]]
+                            updated.append(_updated(entry, platform, verdict, reason))
+                        else:
+                            # Only Canvas omits URLs: the page no longer hosts a video.
+                            verdict = "removed"
+                            removed.append(auditResults.result_key(entry))
+                        summary[verdict] += 1
+                        auditMetrics.inc("reaudit_total", {"platform": platform, "verdict": verdict})
+                        auditProgress.video_checked(platform, entry["url"])
+                    auditResults.upsert_results(updated, results_path, remove=removed)
+                auditProgress.emit("stage_finished", stage=f"reaudit_{platform}")
+    finally:
+        auditMetrics.export()
+        if trace:
+            auditTrace.finish()
+
+    log.info("Re-audit finished: %s", ", ".join(f"{name} {count}" for name, count in summary.items()))
+    return summary
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Re-check unknown and errored results without crawling Canvas.")
+    parser.add_argument("--stale-days", type=float, help="also re-check 'no captions' verdicts older than this many days")
+    parser.add_argument("--show-browser", action="store_true", help="run Chrome with a visible window")
+    parser.add_argument("--no-trace", action="store_true", help="do not write a span trace")
+    args = parser.parse_args(argv)
+
+    try:
+        run(args.stale_days, headless=not args.show_browser, trace=not args.no_trace)
+    except auditProgress.AuditCancelled as exc:
+        log.warning("%s", exc)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    auditLog.configure()
+    main()
@@ -0,0 +1,257 @@
+"""Indexed SQLite copy of ``data/audited_videos.json`` for browsing results.
+
+The results file is a single JSON array that grows past 100k entries on an
+institution-wide audit; parsing it for every filter or sort is too slow for
+an interactive view. :func:`refresh` loads it once into
+``data/audited_videos.db`` (rebuilt only when the JSON's size or mtime
+changes) with indexes on course, platform and verdict, and :func:`page`
+returns one window of rows for the current filters and sort order. An index
+written by an older version of this module (``PRAGMA user_version`` below
+``SCHEMA_VERSION``) is dropped and rebuilt.
+
+Usage::
+
+    python resultsIndex.py build
+    python resultsIndex.py query --platform youtube --verdict no_captions --limit 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import auditLog
+import auditResults
+
+
+log = auditLog.get_logger("resultsIndex")
+
+DB_PATH = os.path.join("data", "audited_videos.db")
+
+# Columns the results view may sort by, in display order.
+SORT_COLUMNS = ("course_id", "type", "verdict", "url", "checked_at")
+
+# Bumped whenever the table layout changes; older databases are rebuilt.
+SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    type TEXT NOT NULL DEFAULT '',
+    url TEXT NOT NULL DEFAULT '',
+    course_id TEXT NOT NULL DEFAULT '',
+    has_captions INTEGER,
+    verdict TEXT NOT NULL DEFAULT 'unknown',
+    checked_at REAL,
+    entry TEXT NOT NULL
+);
+"""
+
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS results_course ON results (course_id, type, verdict);
+CREATE INDEX IF NOT EXISTS results_type ON results (type, verdict);
+CREATE INDEX IF NOT EXISTS results_verdict ON results (verdict, checked_at);
+CREATE INDEX IF NOT EXISTS results_url ON results (url);
+"""
+
+# Rows inserted per executemany batch while indexing.
+BATCH = 5000
+
+
+def connect(db_path: str = DB_PATH) -> sqlite3.Connection:
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    # WAL lets the GUI keep reading while a rebuild runs on another connection.
+    conn.execute("PRAGMA journal_mode = WAL")
+    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        # Older layouts are only a cache of the JSON file; start again and let refresh() repopulate.
+        conn.executescript("DROP TABLE IF EXISTS results; DROP TABLE IF EXISTS meta;")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.executescript(_SCHEMA + _INDEXES)
+    return conn
+
+
+def _stamp(results_path: str) -> Optional[str]:
+    try:
+        stat = os.stat(results_path)
+    except OSError:
+        return None
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def is_stale(conn: sqlite3.Connection, results_path: str = auditResults.RESULTS_PATH) -> bool:
+    """True when the index does not reflect the current results file."""
+
+    row = conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+    return (row["value"] if row else None) != _stamp(results_path)
+
+
+def _row(entry: dict) -> Tuple[str, str, str, Optional[int], str, Optional[float], str]:
+    has_captions = entry.get("has_captions")
+    checked_at = entry.get("checked_at")
+    return (
+        str(entry.get("type") or ""),
+        str(entry.get("url") or ""),
+        str(entry.get("course_id") or ""),
+        None if has_captions is None else int(bool(has_captions)),
+        auditResults.entry_verdict(entry),
+        float(checked_at) if isinstance(checked_at, (int, float)) else None,
+        json.dumps(entry),
+    )
+
+
+def rebuild(conn: sqlite3.Connection, results_path: str = auditResults.RESULTS_PATH) -> int:
+    """Replace the index with the contents of ``results_path``; returns the row count."""
+
+    stamp = _stamp(results_path)
+    started = time.perf_counter()
+    entries = [entry for entry in auditResults.load_results(results_path) if isinstance(entry, dict)]
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM results")
+        # Dropping the indexes first makes the bulk insert several times faster.
+        for name in ("results_course", "results_type", "results_verdict", "results_url"):
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        for start in range(0, len(entries), BATCH):
+            conn.executemany(
+                "INSERT INTO results (type, url, course_id, has_captions, verdict, checked_at, entry) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [_row(entry) for entry in entries[start:start + BATCH]],
+            )
+        for statement in _INDEXES.strip().split(";"):
+            if statement.strip():
+                conn.execute(statement)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('source', ?)", (stamp,))
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")
+
+    log.info("Indexed %d results in %.1fs", len(entries), time.perf_counter() - started)
+    return len(entries)
+
+
+def refresh(conn: sqlite3.Connection, results_path: str = auditResults.RESULTS_PATH) -> bool:
+    """Rebuild the index if the results file changed; returns whether it did."""
+
+    if not is_stale(conn, results_path):
+        return False
+    rebuild(conn, results_path)
+    return True
+
+
+def _where(filters: Optional[Dict[str, object]]) -> Tuple[str, List[object]]:
+    """``filters`` keys: ``course_id``, ``type``, ``verdict``, ``has_captions`` (bool) and ``url`` (substring)."""
+
+    clauses: List[str] = []
+    params: List[object] = []
+    filters = filters or {}
+    if filters.get("course_id") is not None:
+        clauses.append("course_id = ?")
+        params.append(str(filters["course_id"]))
+    if filters.get("type") is not None:
+        clauses.append("type = ?")
+        params.append(str(filters["type"]))
+    if filters.get("verdict") is not None:
+        clauses.append("verdict = ?")
+        params.append(str(filters["verdict"]))
+    if filters.get("has_captions") is not None:
+        clauses.append("has_captions = ?")
+        params.append(int(bool(filters["has_captions"])))
+    if filters.get("url"):
+        clauses.append("url LIKE ? ESCAPE '\\'")
+        text = str(filters["url"]).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        params.append(f"%{text}%")
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def count(conn: sqlite3.Connection, filters: Optional[Dict[str, object]] = None) -> int:
+    where, params = _where(filters)
+    return conn.execute(f"SELECT COUNT(*) FROM results{where}", params).fetchone()[0]
+
+
+def verdict_counts(conn: sqlite3.Connection, filters: Optional[Dict[str, object]] = None) -> Dict[str, int]:
+    """Row counts per verdict (see ``auditResults.VERDICTS``) matching ``filters``."""
+
+    where, params = _where(filters)
+    counts = {verdict: 0 for verdict in auditResults.VERDICTS}
+    for row in conn.execute(f"SELECT verdict, COUNT(*) AS n FROM results{where} GROUP BY verdict", params):
+        counts[row["verdict"] if row["verdict"] in counts else "unknown"] += row["n"]
+    return counts
+
+
+def distinct(conn: sqlite3.Connection, column: str) -> List[str]:
+    """Sorted distinct values of ``course_id`` or ``type`` for the filter lists."""
+
+    if column not in ("course_id", "type"):
+        raise ValueError(f"Unsupported column: {column}")
+    return [row[0] for row in conn.execute(f"SELECT DISTINCT {column} FROM results ORDER BY {column}")]
+
+
+def page(
+    conn: sqlite3.Connection,
+    filters: Optional[Dict[str, object]] = None,
+    order_by: str = "id",
+    descending: bool = False,
+    offset: int = 0,
+    limit: int = 100,
+) -> List[sqlite3.Row]:
+    """Return rows ``offset`` to ``offset + limit`` for the filters and sort order."""
+
+    if order_by not in SORT_COLUMNS and order_by != "id":
+        raise ValueError(f"Unsupported sort column: {order_by}")
+    direction = "DESC" if descending else "ASC"
+    where, params = _where(filters)
+    # id breaks ties so that consecutive windows never repeat or skip a row.
+    sql = (
+        f"SELECT id, course_id, type, has_captions, verdict, checked_at, url, entry FROM results{where} "
+        f"ORDER BY {order_by} {direction}, id {direction} LIMIT ? OFFSET ?"
+    )
+    return conn.execute(sql, params + [max(0, int(limit)), max(0, int(offset))]).fetchall()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Indexed view of the audit results.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--results", default=auditResults.RESULTS_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="(re)build the index from the results file")
+    query = sub.add_parser("query", help="print matching results")
+    query.add_argument("--course")
+    query.add_argument("--platform")
+    query.add_argument("--verdict", choices=auditResults.VERDICTS)
+    query.add_argument("--sort", default="id", choices=("id",) + SORT_COLUMNS)
+    query.add_argument("--desc", action="store_true")
+    query.add_argument("--offset", type=int, default=0)
+    query.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    conn = connect(args.db)
+    if args.command == "build":
+        print(rebuild(conn, args.results))
+        return
+
+    refresh(conn, args.results)
+    filters = {
+        "course_id": args.course,
+        "type": args.platform,
+        "verdict": args.verdict,
+    }
+    print(f"{count(conn, filters)} matching results")
+    for row in page(conn, filters, args.sort, args.desc, args.offset, args.limit):
+        print(f"{row['course_id'] or '-':>10}  {row['type']:<8} {row['verdict']:<11} {row['url']}")
+
+
+if __name__ == "__main__":
+    auditLog.configure()
+    main()
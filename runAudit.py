@@ -3,38 +3,372 @@
 #06/25/2025
 
 
-#runs the scripts in the correct order to manage audit
+#runs the audit stages, starting each platform stage as soon as the Canvas pull is done
 
+import argparse
+import functools
+import os
+import subprocess
+import threading
+from datetime import datetime
+import artifactStore
+import auditLog
+import auditMetrics
+import auditPriority
+import auditResults
+import cacheManager
+import auditProgress
+import auditTrace
+import canvasInstances
 import pullModules
-import youtubeVideo
-import panoptoVideo
-import sortEmbeddedVideos
-import sys, json
-    
+import stageRunner
+import sys
+import time
 
-def main():
-    """Main function to run a complete audit."""
-    print("Debug: Starting audit")
-    pullModules.main()
+log = auditLog.get_logger("runAudit")
+
+
+#the platform stages import their checkers when they start, so Selenium and the
+#YouTube transcript client only load for runs that actually reach those stages
+def youtubeStage():
+    """Run the YouTube caption audit."""
+    import youtubeVideo
     youtubeVideo.main()
+
+
+def panoptoStage():
+    """Run the Panopto caption audit."""
+    import panoptoVideo
     panoptoVideo.main()
-    print("Debug: Audit completed successfully")
 
-    #create a container for all course IDs
-    courseIDs = []
-    #load course IDs from the modules json file
-    with open('data/courses_ids.json', 'r') as f:
-        try:
-            #fill courseIDs with the list of ids from the json file
-            courseIDs = json.load(f)
-        except json.JSONDecodeError:
-            #throw an error and exit if the json file is invalid
-            print("Error: Could not decode JSON from course_ids.json")
-            sys.exit(1)
+
+def canvasMediaStage():
+    """Run the embedded Canvas media audit on the course IDs saved by pullModules."""
+    import sortEmbeddedVideos
+    #load course IDs saved by the pullModules stage (with a deadline, only those crawled in time)
+    courseIDs = auditPriority.course_ids()
+    if not courseIDs:
+        #fail the stage if no course list was saved
+        raise RuntimeError("Could not load course IDs from courses_ids.json")
 
     #run embedded video audit on list of courseIDs
     sortEmbeddedVideos.main(courseIDs)
-   
+
+
+def _alreadyDone():
+    """Placeholder for stages a resumed run finished before it was interrupted."""
+    return None
+
+
+def buildStages(refresh=True, skip=(), crawl_until=None):
+    """
+    args:
+        refresh (bool): re-crawl every course; a resumed run reuses what it already crawled.
+        skip: names of stages that already finished in the run being resumed.
+        crawl_until (float): epoch time at which the Canvas crawl stops (deadline-bounded runs).
+    returns:
+        list of stageRunner.Stage describing the audit DAG.
+    The platform stages only depend on the Canvas pull and use separate resources,
+    so they run concurrently once it finishes.
+    """
+    stages = [
+        stageRunner.Stage("pullModules", functools.partial(pullModules.main, refresh=refresh, until=crawl_until), resources=["canvas"]),
+        stageRunner.Stage("youtubeVideo", youtubeStage, deps=["pullModules"], resources=["youtube"]),
+        stageRunner.Stage("panoptoVideo", panoptoStage, deps=["pullModules"], resources=["panopto", "browser"]),
+        stageRunner.Stage("sortEmbeddedVideos", canvasMediaStage, deps=["pullModules"], resources=["browser"]),
+    ]
+    for stage in stages:
+        if stage.name in skip:
+            stage.func = _alreadyDone
+            stage.resources = ()
+    return stages
+
+
+def run(resume=False, profile=False, trace=True, deadline=None, size_cap=True):
+    """
+    args:
+        resume (bool): continue the run saved in data/audit_checkpoint.json.
+        profile (bool): run each stage under cProfile.
+        trace (bool): write a span trace for the run.
+        deadline (float): epoch time to stop at; the most valuable work is done first.
+        size_cap (bool): enforce the data/ size cap when the run ends; off while other
+            instances are still being audited, since their files live under data/ too.
+    returns:
+        dict of stage name to stageRunner.StageResult.
+    Runs a complete audit. Raises auditProgress.AuditCancelled when the run was
+    cancelled; its checkpoint is kept so the run can be resumed. A run stopped by
+    its deadline returns normally and keeps its checkpoint, including the work left.
+    """
+    checkpoint = auditProgress.begin(resume=resume)
+    if resume and checkpoint.stages_done:
+        log.info("Resuming run %s; finished stages: %s", checkpoint.run_id, ", ".join(sorted(checkpoint.stages_done)))
+    #every stage reads Canvas data from this run's artifact store
+    store = artifactStore.start_run(run_id=checkpoint.run_id)
+    checkpoint.save()
+    crawl_until = None
+    auditPriority.reset()
+    if deadline is not None:
+        auditProgress.set_deadline(deadline)
+        #the crawl gets part of the budget; the checks always get the rest
+        crawl_until = auditPriority.crawl_deadline(deadline)
+    if trace:
+        log.info("Writing trace spans to %s", auditTrace.start(store.run_id))
+    try:
+        results = stageRunner.run_stages(
+            #with a deadline, saved module data that is still fresh is reused instead of re-crawled
+            buildStages(refresh=not resume and deadline is None, skip=checkpoint.stages_done, crawl_until=crawl_until),
+            profile_dir=stageRunner.PROFILE_DIR if profile else None,
+        )
+    finally:
+        #artifact manifest records are batched during the run
+        store.flush()
+        #counters and latencies for every outbound call, written even when a stage failed
+        auditMetrics.export()
+        auditTrace.finish()
+        if size_cap:
+            #keep data/ under CC_AUDIT_CACHE_MAX_MB by evicting the least recently used rebuildable files
+            cacheManager.enforce_size_cap()
+        #stop recording verdicts into the checkpoint even when a stage raised
+        auditProgress.end()
+
+    auditProgress.set_deadline(None)
+    #stages the deadline interrupted; a run that finished just after it is complete
+    stopped = not auditProgress.cancelled() and any(result.status == "cancelled" for result in results.values())
+    pulled = results.get("pullModules")
+    uncrawled = pulled.value if pulled is not None and isinstance(pulled.value, int) else 0
+    #a stage that finished before every course was crawled has more work on the next run
+    if not uncrawled:
+        for name, result in results.items():
+            if result.status == "ok":
+                checkpoint.stage_done(name)
+    if deadline is not None and (stopped or uncrawled):
+        checkpoint.remaining = auditPriority.remaining(checkpoint)
+        checkpoint.remaining["courses_uncrawled"] = uncrawled
+    checkpoint.save()
+
+    if auditProgress.cancelled():
+        raise auditProgress.AuditCancelled(f"Audit cancelled; resume run {checkpoint.run_id} to continue")
+    if deadline is not None and (stopped or uncrawled):
+        left = ", ".join(f"{name} {count}" for name, count in sorted(checkpoint.remaining.items()) if count)
+        log.warning("Deadline reached; work left for the next run: %s", left or "none")
+        return results
+    if not stageRunner.failed_stages(results):
+        #nothing left to resume
+        checkpoint.clear()
+    return results
+
+
+def main(argv=None):
+    """Main function to run a complete audit."""
+    parser = argparse.ArgumentParser(description="Run a complete caption audit.")
+    parser.add_argument("--profile", action="store_true", help=f"run each stage under cProfile (saved in {stageRunner.PROFILE_DIR})")
+    parser.add_argument("--no-trace", action="store_true", help="do not write a span trace for this run")
+    parser.add_argument("--log-level", help="console/file log level, e.g. DEBUG for per-URL messages")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted or cancelled run")
+    parser.add_argument("--reaudit", action="store_true", help="only re-check unknown/errored results; Canvas is not crawled")
+    budget = parser.add_mutually_exclusive_group()
+    budget.add_argument("--deadline", help="stop at this time (HH:MM or ISO date-time), doing the most valuable work first")
+    budget.add_argument("--time-budget", help="stop after this long, e.g. 6h or 90m, doing the most valuable work first")
+    parser.add_argument("--instance", action="append", metavar="NAME",
+                        help="audit only this configured Canvas instance (repeatable; default: all)")
+    parser.add_argument("--dry-run", action="store_true", help="estimate API calls, checks and duration without auditing")
+    parser.add_argument("--stale-days", type=float, help="with --reaudit, also re-check 'no captions' results older than this many days; "
+                        f"with a deadline, verdicts older than this count as stale (default {auditPriority.STALE_DAYS:g})")
+    args = parser.parse_args(argv)
+    #handlers are only installed by entry points, so importing the audit modules writes no log file
+    auditLog.configure(level=args.log_level, force=bool(args.log_level))
+
+    if args.dry_run:
+        import auditPlanner
+        #the estimate reflects what this same command would do without --dry-run
+        print(auditPlanner.format_plan(auditPlanner.plan(resume=args.resume)))
+        return
+
+    if args.reaudit:
+        import reAudit
+        log.info("Starting re-audit")
+        try:
+            reAudit.run(stale_days=args.stale_days, trace=not args.no_trace)
+        except auditProgress.AuditCancelled as exc:
+            log.warning("%s", exc)
+            sys.exit(1)
+        return
+
+    deadline = None
+    try:
+        if args.deadline:
+            deadline = auditPriority.parse_deadline(args.deadline)
+        elif args.time_budget:
+            deadline = time.time() + auditPriority.parse_budget(args.time_budget)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.stale_days is not None:
+        auditPriority.STALE_DAYS = args.stale_days
+    #a deadline-bounded run picks up where the previous one stopped
+    resume = args.resume or (deadline is not None and auditProgress.has_checkpoint())
+
+    #with several Canvas instances, each extra one is audited by a child process of its own;
+    #a child has CC_AUDIT_CANVAS_INSTANCE set and audits just that instance here
+    if canvasInstances.multiple() and canvasInstances.INSTANCE_ENV not in os.environ:
+        try:
+            selected = [canvasInstances.get(name) for name in args.instance] if args.instance else canvasInstances.instances()
+        except KeyError as exc:
+            parser.error(str(exc.args[0]))
+        failed = runInstances(selected, instanceArguments(args, deadline), lambda: auditInstance(resume, args, deadline, size_cap=False))
+        #only once every child has exited, so no running instance loses files it is still using
+        cacheManager.enforce_size_cap()
+        if failed:
+            log.error("Canvas instances did not complete: %s", ", ".join(failed))
+            sys.exit(1)
+        return
+
+    #a child instance leaves the size cap to the parent, which applies it after all instances finish
+    if not auditInstance(resume, args, deadline, size_cap=canvasInstances.INSTANCE_ENV not in os.environ):
+        sys.exit(1)
+
+
+def auditInstance(resume, args, deadline, size_cap=True):
+    """
+    args:
+        resume (bool): continue the saved checkpoint.
+        args: parsed runAudit.py arguments.
+        deadline (float): epoch time to stop at, or None.
+        size_cap (bool): enforce the data/ size cap when the run ends.
+    returns:
+        bool: False when a stage failed or the run was cancelled.
+    Audits the Canvas instance this process serves.
+    """
+    log.info("Starting audit of Canvas instance %s", canvasInstances.selected().name)
+    try:
+        results = run(resume=resume, profile=args.profile, trace=not args.no_trace, deadline=deadline, size_cap=size_cap)
+    except auditProgress.AuditCancelled as exc:
+        log.warning("%s", exc)
+        return False
+
+    failed = stageRunner.failed_stages(results)
+    if deadline is not None:
+        #stages stopped by the deadline continue in the next run
+        failed = [name for name in failed if results[name].status != "cancelled"]
+    if failed:
+        log.error("Audit stages did not complete: %s", ', '.join(failed))
+        return False
+    if deadline is not None and auditProgress.has_checkpoint():
+        log.info("Audit stopped at its deadline; run it again to continue")
+        return True
+    log.info("Audit completed successfully")
+    return True
+
+
+def instanceArguments(args, deadline):
+    """Returns the runAudit.py arguments a child instance process is started with."""
+    forward = []
+    if args.resume:
+        forward.append("--resume")
+    if deadline is not None:
+        #every instance stops at the same moment
+        forward += ["--deadline", datetime.fromtimestamp(deadline).isoformat()]
+    if args.stale_days is not None:
+        forward += ["--stale-days", str(args.stale_days)]
+    if args.profile:
+        forward.append("--profile")
+    if args.no_trace:
+        forward.append("--no-trace")
+    if args.log_level:
+        forward += ["--log-level", args.log_level]
+    return forward
+
+
+def startInstance(instance, forward):
+    """
+    args:
+        instance (canvasInstances.CanvasInstance): a non-primary instance.
+        forward (list): runAudit.py arguments for the child.
+    returns:
+        (subprocess.Popen, str): the child process and the file its output goes to.
+    The child works in the instance's own directory, so its data/ (crawled modules,
+    checkpoint, browser profiles, results) is separate from every other instance.
+    Nobody sees the child's output, so it runs unattended: an expired browser login
+    fails its stage instead of waiting for input.
+    """
+    os.makedirs(instance.root, exist_ok=True)
+    output_path = os.path.join(instance.root, "runAudit.out")
+    env = dict(os.environ)
+    env[canvasInstances.INSTANCE_ENV] = instance.name
+    env["CC_AUDIT_UNATTENDED"] = "1"
+    with open(output_path, "w") as output:
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), *forward],
+            cwd=instance.root,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=output,
+            stderr=subprocess.STDOUT,
+        )
+    return process, output_path
+
+
+def mergeInstanceResults(instance):
+    """
+    args:
+        instance (canvasInstances.CanvasInstance): a non-primary instance.
+    returns:
+        int: number of verdicts merged.
+    Copies the latest verdict per video from the instance's own results file into
+    data/audited_videos.json, tagged with the instance name.
+    """
+    latest = {}
+    for entry in auditResults.load_results(os.path.join(instance.root, auditResults.RESULTS_PATH)):
+        if isinstance(entry, dict):
+            entry["instance"] = instance.name
+            #the file is appended in check order, so the last entry per video is the newest
+            latest[auditResults.result_key(entry)] = entry
+    auditResults.upsert_results(latest.values())
+    return len(latest)
+
+
+def runInstances(instances, forward, auditPrimary):
+    """
+    args:
+        instances (list): canvasInstances.CanvasInstance to audit.
+        forward (list): runAudit.py arguments for the child processes.
+        auditPrimary: callable auditing the primary instance in this process; returns success.
+    returns:
+        list of instance names that did not complete.
+    Audits every instance concurrently: the primary in this process, the others in child
+    processes with their own tokens, rate governors and connection pools. Each child's
+    verdicts are merged as soon as it exits, so one slow instance does not hold up the others.
+    """
+    failed = []
+    lock = threading.Lock()
+    primary = canvasInstances.primary()
+
+    def watch(instance, process, output_path):
+        code = process.wait()
+        merged = mergeInstanceResults(instance)
+        log.info("Canvas instance %s finished with exit status %s; merged %s results", instance.name, code, merged)
+        if code != 0:
+            log.error("Canvas instance %s did not complete; see %s", instance.name, output_path)
+            with lock:
+                failed.append(instance.name)
+
+    watchers = []
+    for instance in instances:
+        if instance == primary:
+            continue
+        process, output_path = startInstance(instance, forward)
+        log.info("Auditing Canvas instance %s in %s (output in %s)", instance.name, instance.root, output_path)
+        watcher = threading.Thread(target=watch, args=(instance, process, output_path), name=f"instance-{instance.name}", daemon=True)
+        watcher.start()
+        watchers.append(watcher)
+
+    try:
+        if primary in instances and not auditPrimary():
+            with lock:
+                failed.append(primary.name)
+    finally:
+        for watcher in watchers:
+            watcher.join()
+    return failed
 
 
 if __name__ == "__main__":
@@ -0,0 +1,461 @@
+"""Estimate the captioned share of videos from a stratified random sample.
+
+Leadership reports usually need "about what percent of this college's videos
+are captioned" rather than every verdict. :func:`run` builds the video
+population from the sorted URL sets (one stratum per course or per Canvas
+sub-account). It draws a simple random sample in each stratum, large enough
+for the target margin of error, and checks only those videos through
+:class:`videoCheckers.Checkers`.
+
+Sample sizes use the usual proportion formula with the finite-population
+correction::
+
+    n0 = z² · p(1 − p) / e²        n = n0 / (1 + (n0 − 1) / N)
+
+with ``p = 0.5`` (the worst case) unless an expected share is given. With
+``allocation="overall"`` (the default) only the college-wide estimate has to
+meet the margin, and the overall ``n`` is split across strata in proportion
+to their size. With ``"stratum"`` every stratum gets its own ``n`` so that
+each estimate meets the margin; with one stratum per course that checks most
+videos of a typical course, close to a census, so prefer it with
+``--strata account``. Intervals are Wilson score intervals per stratum. The overall
+estimate is the size-weighted stratified mean with its own FPC-corrected
+standard error. The default overall allocation gives small courses a single
+draw each, and a stratum with one definite check contributes no variance of
+its own; such strata are collapsed into one pooled stratum for the
+variance (the usual collapsed-strata approach), so the overall interval
+does not shrink to a point.
+
+``unknown`` and ``error`` verdicts are left out of the estimate and counted
+separately. So are Canvas pages that turn out not to host a video. Those
+pages are candidates, not videos, so a stratum's video population is a
+ratio estimate: its candidate count times the share of drawn candidates
+that were videos. That estimate, not the candidate count, weights the
+strata and corrects for the finite population. A stratum whose sample fell
+short of its size because of such draws is topped up from its remaining
+candidates, for up to ``TOP_UP_ROUNDS`` rounds.
+
+Usage::
+
+    python samplingAudit.py --margin 0.05
+    python samplingAudit.py --strata account --account 42 --margin 0.03 --confidence 0.99
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import artifactStore
+import auditLog
+import auditMetrics
+import auditProgress
+import auditResults
+import videoCheckers
+
+
+log = auditLog.get_logger("samplingAudit")
+
+REPORT_PATH = os.path.join("data", "sample_estimate.json")
+STRATA = ("course", "account")
+ALLOCATIONS = ("overall", "stratum")
+# Videos checked between cancellation checks.
+CHUNK = 25
+# Extra draws for strata whose sample fell short because of not_video or inconclusive candidates.
+TOP_UP_ROUNDS = 3
+
+
+def z_score(confidence: float) -> float:
+    return statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def sample_size(population: int, margin: float, confidence: float = 0.95, expected: float = 0.5) -> int:
+    """Videos to check for a ``margin`` (e.g. 0.05) at ``confidence``, with the finite-population correction."""
+
+    if population <= 0:
+        return 0
+    z = z_score(confidence)
+    n0 = z * z * expected * (1 - expected) / (margin * margin)
+    return min(population, max(1, math.ceil(n0 / (1 + (n0 - 1) / population))))
+
+
+def allocate(sizes: Dict[str, int], margin: float, confidence: float = 0.95, expected: float = 0.5, allocation: str = "overall") -> Dict[str, int]:
+    """Sample size per stratum for ``allocation`` (see the module docstring)."""
+
+    if allocation == "stratum":
+        return {name: sample_size(size, margin, confidence, expected) for name, size in sizes.items()}
+    if allocation != "overall":
+        raise ValueError(f"Unknown allocation: {allocation}")
+
+    population = sum(sizes.values())
+    total = sample_size(population, margin, confidence, expected)
+    # At least one video per non-empty stratum so every stratum contributes to the mean.
+    return {
+        name: min(size, max(1, round(total * size / population))) if size else 0
+        for name, size in sizes.items()
+    }
+
+
+def _fpc(population: int, sampled: int) -> float:
+    return (population - sampled) / (population - 1) if population > 1 else 0.0
+
+
+def wilson_interval(captioned: int, checked: int, population: int, confidence: float = 0.95) -> Tuple[float, float]:
+    """Wilson score interval for ``captioned / checked``, narrowed by the finite-population correction."""
+
+    if checked <= 0:
+        return 0.0, 1.0
+    share = captioned / checked
+    fpc = _fpc(population, checked)
+    if fpc <= 0:
+        # The whole stratum was checked.
+        return share, share
+    z = z_score(confidence)
+    n = checked / fpc
+    denominator = 1 + z * z / n
+    centre = (share + z * z / (2 * n)) / denominator
+    half = z * math.sqrt(share * (1 - share) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+def estimated_videos(stratum: dict) -> int:
+    """Ratio estimate of a stratum's videos: candidates times the share of draws that were videos."""
+
+    if not stratum["sampled"]:
+        return stratum["population"]
+    videos = stratum["sampled"] - stratum["not_video"]
+    return round(stratum["population"] * videos / stratum["sampled"])
+
+
+def _top_up(wanted: Dict[str, int], stats: Dict[str, dict]) -> Dict[str, int]:
+    """Further draws per stratum to make up for candidates without a definite verdict."""
+
+    draws = {}
+    for name, stratum in stats.items():
+        short = wanted[name] - stratum["checked"]
+        left = stratum["population"] - stratum["sampled"]
+        if short <= 0 or left <= 0:
+            continue
+        # Scale by the stratum's yield of definite verdicts so far; assume a poor one when none came back.
+        definite = stratum["checked"] / stratum["sampled"] if stratum["checked"] else 0.25
+        draws[name] = min(left, math.ceil(short / definite))
+    return draws
+
+
+def _check_sample(checkers: videoCheckers.Checkers, batch: Dict[str, List[Tuple[str, str, str]]], stats: Dict[str, dict], entries: List[dict]) -> Dict[str, int]:
+    """Check the drawn candidates, tallying verdicts into ``stats``; returns checks per platform."""
+
+    by_platform: Dict[str, List[Tuple[str, str, str, str]]] = {}
+    for name, videos in batch.items():
+        for platform, url, course_id in videos:
+            by_platform.setdefault(platform, []).append((name, platform, url, course_id))
+
+    for platform, videos in by_platform.items():
+        auditProgress.emit("stage_started", stage=f"sample_{platform}")
+        auditProgress.emit("videos_queued", stage=f"sample_{platform}", count=len(videos))
+        for start in range(0, len(videos), CHUNK):
+            auditProgress.check_cancelled()
+            chunk = videos[start:start + CHUNK]
+            verdicts = checkers.verdicts(platform, list(dict.fromkeys(url for _, _, url, _ in chunk)))
+            for name, _, url, course_id in chunk:
+                stratum = stats[name]
+                if url not in verdicts:
+                    stratum["not_video"] += 1
+                    verdict = "not_video"
+                else:
+                    verdict, reason = verdicts[url]
+                    captions = auditResults.captions_for(verdict)
+                    if captions is None:
+                        stratum["inconclusive"] += 1
+                    else:
+                        stratum["checked"] += 1
+                        stratum["captioned"] += captions
+                    entries.append(videoCheckers.result_entry(platform, url, verdict, reason, course_id))
+                auditMetrics.inc("sample_checks_total", {"platform": platform, "verdict": verdict})
+                auditProgress.emit("video_checked", platform=platform, url=url)
+        auditProgress.emit("stage_finished", stage=f"sample_{platform}")
+    return {platform: len(videos) for platform, videos in by_platform.items()}
+
+
+def stratified_estimate(strata: Dict[str, dict], confidence: float = 0.95) -> dict:
+    """Size-weighted overall share with a normal interval from the stratified variance.
+
+    Strata are weighted by their (estimated) number of ``videos`` when it is
+    known, else by their candidate ``population``. Strata with fewer than two
+    definite checks have no variance of their own, so for the variance they
+    are collapsed into one pooled stratum (see the module docstring).
+    """
+
+    counted = {
+        name: dict(stratum, population=stratum.get("videos", stratum["population"]))
+        for name, stratum in strata.items() if stratum["checked"]
+    }
+    population = sum(stratum["population"] for stratum in counted.values())
+    if not population:
+        return {"estimate": None, "low": None, "high": None, "population": 0, "checked": 0, "collapsed": 0}
+
+    estimate = variance = 0.0
+    collapsed = []
+    for stratum in counted.values():
+        weight = stratum["population"] / population
+        share = stratum["captioned"] / stratum["checked"]
+        estimate += weight * share
+        if stratum["checked"] < 2:
+            collapsed.append(stratum)
+            continue
+        variance += _stratum_variance(weight, share, stratum["checked"], stratum["population"])
+    if collapsed:
+        pooled_population = sum(stratum["population"] for stratum in collapsed)
+        pooled_checked = sum(stratum["checked"] for stratum in collapsed)
+        # The pooled share weights each stratum like the overall estimate does.
+        pooled_share = sum(
+            stratum["population"] * stratum["captioned"] / stratum["checked"] for stratum in collapsed
+        ) / pooled_population
+        if pooled_checked < 2:
+            # A single check says nothing about spread; assume the worst case.
+            pooled_share, pooled_checked = 0.5, 2
+        variance += _stratum_variance(pooled_population / population, pooled_share, pooled_checked, pooled_population)
+    half = z_score(confidence) * math.sqrt(variance)
+    return {
+        "estimate": estimate,
+        "low": max(0.0, estimate - half),
+        "high": min(1.0, estimate + half),
+        "population": population,
+        "checked": sum(stratum["checked"] for stratum in counted.values()),
+        "collapsed": len(collapsed),
+    }
+
+
+def _stratum_variance(weight: float, share: float, checked: int, population: int) -> float:
+    """One stratum's term of the stratified variance, with the finite-population correction."""
+
+    sampled_fraction = min(1.0, checked / population) if population else 1.0
+    return weight * weight * (1 - sampled_fraction) * share * (1 - share) / (checked - 1)
+
+
+def _courses(store: artifactStore.ArtifactStore) -> List[dict]:
+    """Course records from the last crawl, fetched when none were saved."""
+
+    courses = store.get("courses", max_age=float("inf"))
+    if isinstance(courses, list) and courses:
+        return courses
+
+    import pullModules
+
+    courses = pullModules.get_courses()
+    store.put("courses", None, courses)
+    store.put("course_ids", None, [course["id"] for course in courses])
+    return courses
+
+
+def _account_ids(account_id: str) -> set:
+    """``account_id`` and its sub-accounts; just the account itself when they cannot be listed."""
+
+    import pullModules
+    import transport
+
+    accounts = {str(account_id)}
+    try:
+        for response in transport.paginate(
+            pullModules.SESSION,
+            f"{pullModules.CANVAS_BASE_URL}/accounts/{account_id}/sub_accounts",
+            {"recursive": "true", "per_page": 100},
+            pullModules.HEADERS,
+        ):
+            accounts.update(str(account["id"]) for account in response.json())
+    except transport.TransportError as exc:
+        log.warning("Could not list sub-accounts of %s (%s); using courses directly in it", account_id, exc)
+    return accounts
+
+
+def population(strata: str = "course", account: Optional[str] = None, course_ids: Optional[Sequence[str]] = None) -> Dict[str, List[Tuple[str, str, str]]]:
+    """``{stratum: [(platform, url, course_id), …]}`` from the sorted URL sets."""
+
+    if strata not in STRATA:
+        raise ValueError(f"Unknown strata: {strata}")
+    store = artifactStore.current()
+    courses = _courses(store)
+    if course_ids is not None:
+        wanted = {str(course_id) for course_id in course_ids}
+        courses = [course for course in courses if str(course["id"]) in wanted]
+    if account is not None:
+        accounts = _account_ids(account)
+        courses = [course for course in courses if str(course.get("account_id")) in accounts]
+
+    import transport
+
+    grouped: Dict[str, List[Tuple[str, str, str]]] = {}
+    auditProgress.emit("courses_total", count=len(courses))
+    for course in courses:
+        auditProgress.check_cancelled()
+        course_id = str(course["id"])
+        try:
+            videos = videoCheckers.course_videos(course_id)
+        except transport.TransportError as exc:
+            log.error("Could not crawl course %s; it is left out of the population: %s", course_id, exc)
+            videos = []
+        name = course_id if strata == "course" else str(course.get("account_id", "unknown"))
+        grouped.setdefault(name, []).extend((platform, url, course_id) for platform, url in videos)
+        auditProgress.emit("course_done", course_id=course_id)
+    return {name: videos for name, videos in grouped.items() if videos}
+
+
+def run(
+    margin: float = 0.05,
+    confidence: float = 0.95,
+    strata: str = "course",
+    allocation: str = "overall",
+    expected: float = 0.5,
+    account: Optional[str] = None,
+    course_ids: Optional[Sequence[str]] = None,
+    seed: Optional[int] = None,
+    max_age: float = float("inf"),
+    record: bool = False,
+    headless: bool = True,
+    report_path: str = REPORT_PATH,
+) -> dict:
+    """Sample, check and estimate; returns the report that is also saved to ``report_path``.
+
+    ``max_age`` (seconds) is how old saved sorted URL sets may be before a
+    course is crawled again; by default any saved set is used. With
+    ``record`` the sampled verdicts are also written to the results file.
+    """
+
+    auditProgress.reset()
+    store = artifactStore.start_run(max_age=max_age)
+    rng = random.Random(seed)
+    videos_by_stratum = population(strata, account, course_ids)
+    sizes = {name: len(videos) for name, videos in videos_by_stratum.items()}
+    wanted = allocate(sizes, margin, confidence, expected, allocation)
+    # Each stratum in random order; draws and top-ups take the next candidates.
+    shuffled = {name: rng.sample(videos, len(videos)) for name, videos in videos_by_stratum.items()}
+    log.info("Sampling %d of %d candidates across %d strata", sum(wanted.values()), sum(sizes.values()), len(sizes))
+
+    stats = {
+        name: {"population": size, "sampled": 0, "checked": 0, "captioned": 0, "inconclusive": 0, "not_video": 0}
+        for name, size in sizes.items()
+    }
+    checks_by_platform: Dict[str, int] = {}
+    entries: List[dict] = []
+    with videoCheckers.Checkers(headless=headless) as checkers:
+        draws = {name: wanted[name] for name in sizes}
+        for round_number in range(TOP_UP_ROUNDS + 1):
+            batch = {}
+            for name, count in draws.items():
+                start = stats[name]["sampled"]
+                batch[name] = shuffled[name][start:start + count]
+                stats[name]["sampled"] += len(batch[name])
+            if not any(batch.values()):
+                break
+            if round_number:
+                log.info("Topping up %d strata with %d more candidates", sum(1 for draw in batch.values() if draw), sum(map(len, batch.values())))
+            for platform, count in _check_sample(checkers, batch, stats, entries).items():
+                checks_by_platform[platform] = checks_by_platform.get(platform, 0) + count
+            draws = _top_up(wanted, stats)
+    auditMetrics.export()
+
+    if record:
+        auditResults.upsert_results(entries)
+
+    for stratum in stats.values():
+        stratum["videos"] = estimated_videos(stratum)
+        if stratum["checked"]:
+            low, high = wilson_interval(stratum["captioned"], stratum["checked"], stratum["videos"], confidence)
+            stratum.update(estimate=stratum["captioned"] / stratum["checked"], low=low, high=high)
+        else:
+            stratum.update(estimate=None, low=None, high=None)
+    total = sum(stratum["sampled"] for stratum in stats.values())
+
+    report = {
+        "created_at": time.time(),
+        "run_id": store.run_id,
+        "strata_by": strata,
+        "account": account,
+        "margin": margin,
+        "confidence": confidence,
+        "allocation": allocation,
+        "seed": seed,
+        "population": sum(sizes.values()),
+        "videos": sum(stratum["videos"] for stratum in stats.values()),
+        "sampled": total,
+        "overall": stratified_estimate(stats, confidence),
+        "checks_by_platform": checks_by_platform,
+        "strata": stats,
+    }
+    os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+    with open(report_path, "w") as handle:
+        json.dump(report, handle, indent=4)
+    return report
+
+
+def _percent(value: Optional[float]) -> str:
+    return "n/a" if value is None else f"{value:.1%}"
+
+
+def format_report(report: dict) -> str:
+    overall = report["overall"]
+    lines = [
+        f"Captioned: {_percent(overall['estimate'])} "
+        f"({report['confidence']:.0%} CI {_percent(overall['low'])} - {_percent(overall['high'])})",
+        f"Drew {report['sampled']:,} of {report['population']:,} candidates "
+        f"({report['sampled'] / report['population']:.1%}; an estimated {report['videos']:,} videos) "
+        f"in {len(report['strata'])} {report['strata_by']} strata; "
+        + ", ".join(f"{platform} {count}" for platform, count in sorted(report["checks_by_platform"].items())),
+        f"{report['strata_by']:<12} {'videos':>7} {'checked':>7} {'captioned':>9}  interval",
+    ] if report["population"] else ["No videos found in the selected courses."]
+    for name, stratum in sorted(report["strata"].items()):
+        skipped = stratum["inconclusive"] + stratum["not_video"]
+        lines.append(
+            f"{name:<12} {stratum['videos']:>7,} {stratum['checked']:>7,} {_percent(stratum['estimate']):>9}  "
+            f"{_percent(stratum['low'])} - {_percent(stratum['high'])}"
+            + (f"  ({skipped} without a verdict)" if skipped else "")
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Estimate the captioned share of videos from a stratified random sample.")
+    parser.add_argument("--margin", type=float, default=0.05, help="target margin of error as a fraction (default 0.05)")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--strata", choices=STRATA, default="course", help="one stratum per course or per sub-account")
+    parser.add_argument("--allocation", choices=ALLOCATIONS, default="overall",
+                        help="'overall': only the overall estimate meets the margin (default); "
+                             "'stratum': every stratum does (a much larger sample, nearly all videos with per-course strata)")
+    parser.add_argument("--expected", type=float, default=0.5, help="expected captioned share; 0.5 is the safe worst case")
+    parser.add_argument("--account", help="only courses in this Canvas account and its sub-accounts")
+    parser.add_argument("--courses", nargs="+", metavar="COURSE_ID", help="only these courses")
+    parser.add_argument("--seed", type=int, help="random seed, to draw the same sample again")
+    parser.add_argument("--max-age-hours", type=float, help="re-crawl courses whose saved URL sets are older than this")
+    parser.add_argument("--record", action="store_true", help=f"also write the sampled verdicts to {auditResults.RESULTS_PATH}")
+    parser.add_argument("--show-browser", action="store_true", help="run Chrome with a visible window")
+    args = parser.parse_args(argv)
+
+    try:
+        report = run(
+            margin=args.margin,
+            confidence=args.confidence,
+            strata=args.strata,
+            allocation=args.allocation,
+            expected=args.expected,
+            account=args.account,
+            course_ids=args.courses,
+            seed=args.seed,
+            max_age=float("inf") if args.max_age_hours is None else args.max_age_hours * 3600,
+            record=args.record,
+            headless=not args.show_browser,
+        )
+    except auditProgress.AuditCancelled as exc:
+        log.warning("%s", exc)
+        raise SystemExit(1)
+    print(format_report(report))
+
+
+if __name__ == "__main__":
+    auditLog.configure()
+    main()
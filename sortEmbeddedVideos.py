@@ -4,17 +4,23 @@
 ## This is a test to try to further filter out non video embedded files using selenium
 
 import json
-import os
 import sys
-import tkinter as tk
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+import artifactStore
+import auditLog
+import auditMetrics
+import auditPriority
+import auditProgress
+import auditResults
+import auditTrace
+import browserSession
+import canvasInstances
+import transport
+
+log = auditLog.get_logger("sortEmbeddedVideos")
+
+CANVAS_LOGIN_URL = canvasInstances.selected().login_url
+#page that redirects to the SSO login when the saved session has expired
+CANVAS_PROBE_URL = canvasInstances.selected().probe_url
 
 def compileURLs(courses):
     """
@@ -32,7 +38,7 @@ def compileURLs(courses):
                 data = json.load(f)
         except FileNotFoundError:
             #skip the course if the file doesn't exist
-            print(f"  [!] JSON not found for course {course}, skipping.")
+            log.warning("Sorted modules not found for course %s, skipping.", course)
             continue
     
         #skip if no Canvas entries
@@ -42,107 +48,123 @@ def compileURLs(courses):
         #filter videos
 
 
-def jsonPrinter(hasCaptions, url):
+def jsonPrinter(hasCaptions, url, verdict=None, reason=None):
     """
     args:
         hasCaptions: boolean indicating if captions are available
         url: the Canvas URL being audited
+        verdict: explicit verdict ("unknown"/"error") when the page could not be checked
+        reason: why the page could not be checked
     returns:
         Prints results to audited_videos.json
     """
     #print results to audited_videos.json
-    file_path = "data/audited_videos.json"
-    j = {
-        "type": "Canvas",
-        "url": url,
-        "has_captions": hasCaptions,
-    }
-
-    #load existing data or initialize an empty list
-    if os.path.exists(file_path):
-        with open(file_path, "r") as f:
-            try:
-                data = json.load(f)
-            except json.JSONDecodeError:
-                data = []
-    else:
-        data = []
-
-    # Append new entry
-    data.append(j)
+    if verdict is None:
+        verdict = auditResults.verdict_for(hasCaptions)
+    auditResults.append_result(auditResults.make_entry("Canvas", url, verdict, reason))
 
-    #write back to file
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=4)
-
-def auditVideos(videos, timeout=2, headless=True):
+def openCanvasDriver(headless=True, lean=True):
+    """
+    args:
+        headless: run Chrome headless when the saved Canvas session is still valid (default True)
+        lean: use the eager, resource-blocking browser profile (default True)
+    returns:
+        a signed-in Chrome driver, or None if the saved session expired in unattended mode
+    """
+    #start driver from the saved Canvas profile, only asking for a login if the session expired
+    try:
+        return browserSession.open_authenticated_driver(
+            "canvas",
+            login_url=CANVAS_LOGIN_URL,
+            probe_url=CANVAS_PROBE_URL,
+            prompt=lambda: browserSession.prompt_for_login(
+                "Please Log Into Canvas", "Please log into Canvas then press Continue."
+            ),
+            headless=headless,
+            lean=lean,
+        )
+    except browserSession.LoginRequiredError as e:
+        log.error("%s", e)
+        return None
+
+
+@auditTrace.traced("canvas_media_check", "canvas", "url")
+def checkUrl(driver, url, timeout=2):
+    """
+    args:
+        driver: signed-in Chrome driver
+        url: the Canvas URL to check
+        timeout: maximum wait time for elements to load
+    returns:
+        (isVideo, hasCaptions) for the page; hasCaptions is None when there is no embedded video
+    """
+    #selenium is loaded on the first page check so URL helpers stay cheap to import
+    from selenium.webdriver.common.by import By
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    with auditMetrics.timed("page_load", stage="canvas"):
+        driver.get(url)
+    try:
+        #check for video element
+        WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located((By.ID, "media_preview"))
+        )
+    except TimeoutException:
+        return False, None
+
+    #check for captions button
+    try:
+        WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located((
+                By.CSS_SELECTOR,
+                "button.controls-button[aria-label='Enable Captions']"
+            ))
+        )
+        return True, True
+    except TimeoutException:
+        return True, False
+
+
+def auditVideos(videos, timeout=2, headless=True, lean=True):
     """
     args:
         videos: list of Canvas URLs to audit for embedded videos
         timeout: maximum wait time for elements to load (default 2 seconds)
-        headless: whether to run Chrome in headless mode (default True)
+        headless: run Chrome headless when the saved Canvas session is still valid (default True)
+        lean: use the eager, resource-blocking browser profile (default True)
 
     returns:
         isVideo: dictionary mapping URLs to whether they contain embedded videos
     This function uses Selenium to check each Canvas URL for embedded videos.
     """
-    #configure chrome
-    chrome_opts = Options()
-    # if headless:
-    #     chrome_opts.add_argument("--headless=new")
-
-    chrome_opts.add_argument("--disable-gpu")
-    chrome_opts.add_argument("--no-sandbox")
-
-    #start driver
-    driver = webdriver.Chrome(
-        service=Service(ChromeDriverManager().install()),
-        options=chrome_opts
-    )
-
-    #allow user to log in
-    driver.get("https://canvas.uccs.edu/login")
-    #input("Please log in to Canvas and then press Enter to continue...")
-    root = tk.Tk()
-    root.title("Please Log Into Canvas")
-    root.geometry("300x100")
-    Label = tk.Label(root, text="Please log into Canvas then press Continue.")
-    Label.pack(pady=20)
-    button = tk.Button(root, text="Continue", command=root.destroy)
-    button.pack(pady=10)
-    root.mainloop()
-
     isVideo = {}
+    videos = [url for url in videos if not auditProgress.already_checked("canvas", url)]
+    if not videos:
+        return isVideo
+    auditProgress.emit("videos_queued", stage="sortEmbeddedVideos", count=len(videos))
+
+    driver = openCanvasDriver(headless, lean)
+    if driver is None:
+        return isVideo
+
+    from selenium.common.exceptions import WebDriverException
 
     try:
         for url in videos:
-            driver.get(url)
+            auditProgress.check_cancelled()
             try:
-                #check for video element
-                WebDriverWait(driver, timeout).until(
-                    EC.presence_of_element_located((By.ID, "media_preview"))
-                )
-
-                #check for captions button
-                try:
-                    WebDriverWait(driver, timeout).until(
-                        EC.presence_of_element_located((
-                            By.CSS_SELECTOR,
-                            "button.controls-button[aria-label='Enable Captions']"
-                        ))
-                    )
-                    captions_enabled = True
-                    jsonPrinter(captions_enabled, url)  # save result to JSON
-
-                except TimeoutException:
-                    captions_enabled = False
-                    jsonPrinter(captions_enabled, url)  # save result to JSON
-
-                
-
-                isVideo[url] = True
-            except TimeoutException:
+                isVideo[url], captions_enabled = checkUrl(driver, url, timeout)
+            except WebDriverException as e:
+                #the page never loaded, so whether it hosts a video is unknown; reAudit.py checks it again
+                log.warning("Unable to check %s: %s", url, type(e).__name__)
                 isVideo[url] = False
+                jsonPrinter(None, url, verdict="error", reason=f"Browser: {type(e).__name__}")
+            else:
+                if isVideo[url]:
+                    jsonPrinter(captions_enabled, url)  # save result to JSON
+            auditProgress.video_checked("canvas", url)
 
     finally:
         driver.quit()
@@ -162,15 +184,16 @@ def main(courses):
     """
 
     all_canvas_with_video = []
+    store = artifactStore.current()
 
     # iterate over each course
     for course in courses:
-        path = f"data/sortedModules/sorted_modules_{course}.json"
         try:
-            with open(path, "r") as f:
-                data = json.load(f)
-        except FileNotFoundError:
-            print(f"  [!] JSON not found for course {course}, skipping.")
+            data = store.sorted_urls(course)
+        except transport.TransportError as e:
+            # skip the course rather than the stage; the next crawl retries it
+            log.error("Could not get the modules of course %s: %s", course, e)
+            auditResults.record_retryable("course", str(e), platform="canvas", course_id=course)
             continue
 
         # get canvas URLs for this course
@@ -181,9 +204,11 @@ def main(courses):
             continue
 
         # add to the master list
-        all_canvas_with_video.extend(urls)
+        all_canvas_with_video.extend((course, url) for url in urls)
 
-    auditVideos(all_canvas_with_video)  # audit all collected Canvas URLs
+    # with a deadline, unchecked and stale pages go first
+    all_canvas_with_video = auditPriority.order("canvas", all_canvas_with_video)
+    auditVideos([url for _, url in all_canvas_with_video])  # audit all collected Canvas URLs
 
 
 
@@ -191,6 +216,7 @@ def main(courses):
 
 
 if __name__ == "__main__":
+    auditLog.configure()
     if len(sys.argv) < 2:
         print("Usage: python sortEmbeddedVideos.py <courseID1> <courseID2> ...")
     else:
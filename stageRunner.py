@@ -0,0 +1,255 @@
+"""Dependency-aware, concurrent executor for audit stages.
+
+A full audit is a small DAG: the Canvas pull feeds the YouTube, Panopto and
+Canvas-media stages, which contend for different resources (the YouTube rate
+limit, the Panopto API, the browser). Each stage starts as soon as the stages
+it depends on have finished and runs concurrently with its siblings, limited
+only by per-resource budgets. Wall-clock time therefore approaches the
+slowest stage rather than the sum of all of them.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+
+import auditLog
+import auditMetrics
+import auditProgress
+import auditTrace
+
+
+log = auditLog.get_logger("stageRunner")
+
+TIMINGS_PATH = os.path.join("data", "stage_timings.json")
+PROFILE_DIR = os.path.join("data", "profiles")
+
+# How many stages may hold each resource at the same time.
+DEFAULT_BUDGETS: Dict[str, int] = {
+    "canvas": 1,
+    "youtube": 1,
+    "panopto": 1,
+    "browser": 2,
+}
+
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable[[], object]
+    deps: Sequence[str] = ()
+    resources: Sequence[str] = ()
+
+
+@dataclass
+class StageResult:
+    name: str
+    status: str = "pending"
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    waited: float = 0.0
+    error: Optional[str] = None
+    value: object = field(default=None, repr=False)
+
+    @property
+    def duration(self) -> float:
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+
+def _validate(stages: Sequence[Stage]) -> None:
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError("Stage names must be unique")
+
+    known = set(names)
+    for stage in stages:
+        missing = [dep for dep in stage.deps if dep not in known]
+        if missing:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages: {missing}")
+
+    # Reject cycles, which would otherwise deadlock the workers.
+    visiting, done = set(), set()
+    by_name = {stage.name: stage for stage in stages}
+
+    def visit(name: str) -> None:
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Stage dependency cycle through {name}")
+        visiting.add(name)
+        for dep in by_name[name].deps:
+            visit(dep)
+        visiting.discard(name)
+        done.add(name)
+
+    for name in names:
+        visit(name)
+
+
+def _profiled(stage: Stage, profile_dir: str) -> object:
+    """Run ``stage.func`` under cProfile and save ``<stage>.prof`` plus a text summary."""
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return stage.func()
+    finally:
+        profiler.disable()
+        try:
+            os.makedirs(profile_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(profile_dir, f"{stage.name}.prof"))
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(40)
+            with open(os.path.join(profile_dir, f"{stage.name}.txt"), "w") as handle:
+                handle.write(summary.getvalue())
+        except OSError as exc:
+            log.warning("Unable to write profile for stage %s: %s", stage.name, exc)
+
+
+def run_stages(
+    stages: Sequence[Stage],
+    budgets: Optional[Dict[str, int]] = None,
+    timings_path: Optional[str] = TIMINGS_PATH,
+    profile_dir: Optional[str] = None,
+) -> Dict[str, StageResult]:
+    """Run ``stages`` respecting dependencies and resource budgets.
+
+    A stage whose dependency failed is skipped. Per-stage timings are printed
+    and, when ``timings_path`` is set, written as JSON. With ``profile_dir``
+    each stage runs under cProfile and its stats are saved there.
+    """
+
+    _validate(stages)
+    if profile_dir and sys.version_info >= (3, 12):
+        # From 3.12 only one cProfile profiler can be active per process.
+        stages = [
+            Stage(stage.name, stage.func, stage.deps, tuple(stage.resources) + ("profiler",))
+            for stage in stages
+        ]
+    limits = dict(DEFAULT_BUDGETS)
+    limits.update(budgets or {})
+    semaphores = {
+        name: threading.BoundedSemaphore(max(1, limit)) for name, limit in limits.items()
+    }
+
+    results = {stage.name: StageResult(stage.name) for stage in stages}
+    finished = {stage.name: threading.Event() for stage in stages}
+    run_started = time.time()
+
+    def worker(stage: Stage) -> None:
+        result = results[stage.name]
+        try:
+            for dep in stage.deps:
+                finished[dep].wait()
+            failed = [dep for dep in stage.deps if results[dep].status != "ok"]
+            if failed:
+                result.status = "skipped"
+                result.error = f"dependency failed: {', '.join(failed)}"
+                return
+
+            # Acquire in a fixed order so two stages cannot deadlock on resources.
+            held = []
+            wait_started = time.time()
+            try:
+                for resource in sorted(set(stage.resources)):
+                    semaphore = semaphores.setdefault(resource, threading.BoundedSemaphore(1))
+                    semaphore.acquire()
+                    held.append(semaphore)
+
+                result.waited = time.time() - wait_started
+                result.started_at = time.time()
+                log.info("Stage %s started", stage.name)
+                auditProgress.emit("stage_started", stage=stage.name)
+                try:
+                    with auditTrace.span(f"stage {stage.name}", "stage"):
+                        if profile_dir:
+                            result.value = _profiled(stage, profile_dir)
+                        else:
+                            result.value = stage.func()
+                    result.status = "ok"
+                except auditProgress.AuditCancelled as exc:
+                    result.status = "cancelled"
+                    result.error = str(exc)
+                    log.info("Stage %s cancelled", stage.name)
+                except BaseException as exc:  # keep sibling stages running
+                    result.status = "failed"
+                    result.error = f"{type(exc).__name__}: {exc}"
+                    log.exception("Stage %s failed", stage.name)
+                finally:
+                    result.finished_at = time.time()
+                    auditProgress.emit("stage_finished", stage=stage.name, status=result.status)
+                    auditMetrics.observe("stage_seconds", result.duration, {"stage": stage.name})
+                    auditMetrics.observe("stage_wait_seconds", result.waited, {"stage": stage.name})
+                    auditMetrics.inc("stages_total", {"stage": stage.name, "status": result.status})
+            finally:
+                for semaphore in reversed(held):
+                    semaphore.release()
+        finally:
+            finished[stage.name].set()
+
+    threads = [
+        threading.Thread(target=worker, args=(stage,), name=f"stage-{stage.name}", daemon=True)
+        for stage in stages
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    total = time.time() - run_started
+    _report(results, total)
+    if timings_path:
+        _write_timings(results, total, timings_path)
+    return results
+
+
+def _report(results: Dict[str, StageResult], total: float) -> None:
+    lines = ["Stage timings"]
+    for result in results.values():
+        line = f"  {result.name:<20} {result.status:<8} {result.duration:8.1f}s"
+        if result.waited >= 0.1:
+            line += f" (waited {result.waited:.1f}s for resources)"
+        if result.error:
+            line += f" - {result.error}"
+        lines.append(line)
+    busy = sum(result.duration for result in results.values())
+    lines.append(f"  total wall clock {total:.1f}s, summed stage time {busy:.1f}s")
+    log.info("%s", "\n".join(lines))
+
+
+def _write_timings(results: Dict[str, StageResult], total: float, path: str) -> None:
+    payload: Dict[str, object] = {
+        "total_seconds": round(total, 3),
+        "stages": [
+            {
+                "name": result.name,
+                "status": result.status,
+                "started_at": result.started_at,
+                "finished_at": result.finished_at,
+                "seconds": round(result.duration, 3),
+                "waited_seconds": round(result.waited, 3),
+                "error": result.error,
+            }
+            for result in results.values()
+        ],
+    }
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as handle:
+            json.dump(payload, handle, indent=4)
+    except OSError as exc:
+        log.warning("Unable to write stage timings: %s", exc)
+
+
+def failed_stages(results: Dict[str, StageResult]) -> List[str]:
+    return [name for name, result in results.items() if result.status != "ok"]
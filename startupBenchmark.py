@@ -0,0 +1,200 @@
+"""Cold-start benchmark for the GUI and the audit entry points.
+
+Each entry module is imported in a fresh interpreter several times with
+``-X importtime``. The report gives the median wall-clock time of the whole
+process, the import time of the module itself, the heaviest imports it pulls
+in, and which heavy optional dependencies (Selenium, webdriver-manager, the
+YouTube transcript client, requests, Tk) were loaded just by importing it.
+
+``--exe`` also times a packaged build: the GUI exits as soon as its window is
+ready when ``CC_AUDIT_STARTUP_PROBE=1`` is set, so the measurement includes
+unpacking (one-file builds) and interpreter start-up.
+
+Usage::
+
+    python startupBenchmark.py
+    python startupBenchmark.py --exe dist/CC-Auditor-onedir/CC-Auditor --exe dist/CC-Auditor
+    python startupBenchmark.py --baseline data/startup_baseline.json --tolerance 0.2
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Sequence
+
+OUTPUT_PATH = os.path.join("data", "startup_benchmark.json")
+
+ENTRY_MODULES = ("gui", "runAudit", "individualAudit", "auditDaemon", "jobQueue", "resultsIndex")
+
+# Dependencies that should only load once a stage that needs them starts.
+HEAVY_MODULES = ("selenium", "webdriver_manager", "youtube_transcript_api", "requests", "tkinter")
+
+_PROBE = "import json, sys, {module}; print(json.dumps([name for name in {heavy!r} if name in sys.modules]))"
+
+
+def _parse_importtime(stderr: str) -> Dict[str, int]:
+    """Cumulative import time in microseconds per module from ``-X importtime`` output."""
+
+    times: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            cumulative = int(parts[1].strip())
+        except ValueError:
+            continue
+        times[parts[2].strip()] = cumulative
+    return times
+
+
+def measure_module(module: str, runs: int, cwd: str) -> dict:
+    """Import ``module`` in ``runs`` fresh interpreters and summarize the timings."""
+
+    wall: List[float] = []
+    own: List[float] = []
+    imports: Dict[str, int] = {}
+    loaded: List[str] = []
+    error = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+        )
+        wall.append(time.perf_counter() - started)
+        if completed.returncode != 0:
+            error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "import failed"
+            break
+        imports = _parse_importtime(completed.stderr)
+        own.append(imports.get(module, 0) / 1_000_000)
+        try:
+            loaded = json.loads(completed.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            loaded = []
+
+    heaviest = sorted(
+        ((name, micros) for name, micros in imports.items() if name != module and "." not in name),
+        key=lambda item: item[1],
+        reverse=True,
+    )[:10]
+    return {
+        "module": module,
+        "status": "ok" if error is None else error,
+        "runs": len(wall),
+        "process_seconds": round(statistics.median(wall), 4),
+        "import_seconds": round(statistics.median(own), 4) if own else None,
+        "heavy_loaded": loaded,
+        "heaviest_imports": [{"module": name, "seconds": round(micros / 1_000_000, 4)} for name, micros in heaviest],
+    }
+
+
+def measure_executable(path: str, runs: int) -> dict:
+    """Launch a packaged GUI ``runs`` times until its window is ready."""
+
+    env = dict(os.environ, CC_AUDIT_STARTUP_PROBE="1")
+    wall: List[float] = []
+    error = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        try:
+            completed = subprocess.run([path], env=env, capture_output=True, timeout=120)
+        except (OSError, subprocess.TimeoutExpired) as exc:
+            error = f"{type(exc).__name__}: {exc}"
+            break
+        wall.append(time.perf_counter() - started)
+        if completed.returncode != 0:
+            error = f"exit code {completed.returncode}"
+            break
+    return {
+        "executable": path,
+        "status": "ok" if error is None else error,
+        "runs": len(wall),
+        "first_seconds": round(wall[0], 4) if wall else None,
+        "median_seconds": round(statistics.median(wall), 4) if wall else None,
+    }
+
+
+def run_benchmark(modules: Sequence[str], executables: Sequence[str], runs: int, cwd: str) -> dict:
+    return {
+        "created_at": time.time(),
+        "python": sys.version.split()[0],
+        "runs": runs,
+        "modules": [measure_module(module, runs, cwd) for module in modules],
+        "executables": [measure_executable(path, runs) for path in executables],
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Return descriptions of start-up times that grew more than ``tolerance``."""
+
+    regressions = []
+    previous = {entry["module"]: entry for entry in baseline.get("modules", [])}
+    for entry in report["modules"]:
+        old = previous.get(entry["module"])
+        if old and old.get("process_seconds") and entry["process_seconds"] > old["process_seconds"] * (1 + tolerance):
+            regressions.append(f"{entry['module']}: {entry['process_seconds']}s vs baseline {old['process_seconds']}s")
+    previous = {entry["executable"]: entry for entry in baseline.get("executables", [])}
+    for entry in report["executables"]:
+        old = previous.get(entry["executable"])
+        if old and old.get("median_seconds") and entry["median_seconds"] and entry["median_seconds"] > old["median_seconds"] * (1 + tolerance):
+            regressions.append(f"{entry['executable']}: {entry['median_seconds']}s vs baseline {old['median_seconds']}s")
+    return regressions
+
+
+def _print_report(report: dict) -> None:
+    print(f"{'module':<16} {'process s':>10} {'import s':>10}  heavy dependencies loaded")
+    for entry in report["modules"]:
+        if entry["status"] != "ok":
+            print(f"{entry['module']:<16} failed: {entry['status']}")
+            continue
+        heavy = ", ".join(entry["heavy_loaded"]) or "-"
+        print(f"{entry['module']:<16} {entry['process_seconds']:>10.3f} {entry['import_seconds']:>10.3f}  {heavy}")
+    for entry in report["executables"]:
+        if entry["status"] != "ok":
+            print(f"{entry['executable']}: failed: {entry['status']}")
+        else:
+            print(f"{entry['executable']}: first {entry['first_seconds']:.3f}s, median {entry['median_seconds']:.3f}s")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Cold-start benchmark for the audit entry points.")
+    parser.add_argument("--module", action="append", dest="modules", help="entry module to time (repeatable)")
+    parser.add_argument("--exe", action="append", default=[], help="packaged GUI executable to time (repeatable)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--baseline", help="earlier report to compare start-up times against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs baseline")
+    args = parser.parse_args(argv)
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    report = run_benchmark(args.modules or ENTRY_MODULES, args.exe, max(1, args.runs), here)
+    _print_report(report)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as handle:
+        json.dump(report, handle, indent=4)
+    print(f"Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as handle:
+            regressions = compare(report, json.load(handle), args.tolerance)
+        for line in regressions:
+            print(f"Regression: {line}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,409 @@
+"""Shared HTTP transport for Canvas, Panopto and YouTube calls.
+
+:func:`session` returns a ``requests.Session`` whose requests are retried on
+throttling (429, Canvas' rate-limit 403), 5xx responses, timeouts and
+connection errors, with jittered exponential backoff that honours
+``Retry-After``. Every host has a circuit breaker: after
+``FAILURE_THRESHOLD`` consecutive requests failed all their attempts, it
+opens for ``COOLDOWN_SECONDS``. Throttled requests do not count: the host is
+answering, just slowly. While a breaker is open, requests to that host wait
+for the cool-down (up to ``RetryPolicy.max_circuit_wait``) instead of
+failing at once, so a queue is not burned through with
+:class:`CircuitOpenError`. After the cool-down a single trial request is let
+through; its outcome closes or re-opens the breaker.
+
+A call that still fails raises :class:`TransportError`, which is a
+``requests.RequestException``. Callers record the item as retryable (see
+``auditResults.record_retryable``) instead of guessing a verdict; the
+Canvas crawl retries those items first on its next run.
+
+:class:`RateGovernor` paces one Canvas token from the
+``X-Rate-Limit-Remaining`` header, slowing down before Canvas starts
+refusing requests. Each Canvas instance gets its own governor and connection
+pool (see ``canvasInstances``).
+
+:func:`paginate` walks Canvas ``Link`` pagination. A page that fails is
+retried from its own URL rather than from the first page. When it finally
+fails, the error's ``url`` is that page.
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Dict, FrozenSet, Iterator, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import auditLog
+import auditMetrics
+import auditProgress
+
+
+log = auditLog.get_logger("transport")
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Consecutive exhausted requests (not attempts) that open a host's breaker.
+FAILURE_THRESHOLD = 5
+COOLDOWN_SECONDS = 60.0
+# Applied when the caller does not pass a timeout; requests waits forever by default.
+DEFAULT_TIMEOUT = 30.0
+
+
+class TransportError(requests.RequestException):
+    """A request that failed after its retries, or that was refused by an open breaker.
+
+    ``retryable`` is true when a later attempt may succeed (throttling,
+    server errors, timeouts).
+    """
+
+    def __init__(
+        self,
+        message: str,
+        url: Optional[str] = None,
+        status: Optional[int] = None,
+        retryable: bool = True,
+    ) -> None:
+        super().__init__(message)
+        self.url = url
+        self.status = status
+        self.retryable = retryable
+
+
+class CircuitOpenError(TransportError):
+    """The host's circuit breaker is open; the request was not sent."""
+
+
+@dataclass
+class RetryPolicy:
+    attempts: int = 5
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    # Upper bound on a server-requested Retry-After wait.
+    max_retry_after: float = 120.0
+    # Longest a request waits for an open breaker before raising CircuitOpenError.
+    max_circuit_wait: float = 2 * COOLDOWN_SECONDS
+    statuses: FrozenSet[int] = field(default_factory=lambda: RETRY_STATUSES)
+
+    def should_retry(self, response: requests.Response) -> bool:
+        return response.status_code in self.statuses or self.throttled(response)
+
+    @staticmethod
+    def throttled(response: requests.Response) -> bool:
+        if response.status_code == 429:
+            return True
+        # Canvas signals an exhausted rate budget with 403 rather than 429.
+        return response.status_code == 403 and "rate limit" in (response.text or "").lower()
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter backoff for ``attempt`` (1-based), at least ``retry_after``."""
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_retry_after))
+        return delay
+
+
+def _retry_after(response: Optional[requests.Response]) -> Optional[float]:
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateGovernor:
+    """Paces requests made with one Canvas token.
+
+    Canvas meters every token with a leaky bucket and reports what is left in
+    ``X-Rate-Limit-Remaining``. Once that falls below ``low_water``, each
+    request first waits for the bucket to leak back up to it at
+    ``leak_rate`` units per second, instead of running into 403 throttling.
+    """
+
+    def __init__(self, low_water: float = 100.0, leak_rate: float = 10.0) -> None:
+        self.low_water = low_water
+        self.leak_rate = leak_rate
+        self.remaining: Optional[float] = None
+        self._ready_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if self.remaining is not None and self.remaining < self.low_water and self.leak_rate > 0:
+                # Later callers queue behind this refill until a response reports the real level.
+                self._ready_at = max(now, self._ready_at) + (self.low_water - self.remaining) / self.leak_rate
+                self.remaining = self.low_water
+            delay = self._ready_at - now
+        if delay > 0:
+            auditMetrics.observe("rate_governor_wait_seconds", delay)
+            time.sleep(delay)
+
+    def update(self, response: requests.Response) -> None:
+        value = response.headers.get("X-Rate-Limit-Remaining")
+        if value is None:
+            return
+        try:
+            remaining = float(value)
+        except ValueError:
+            return
+        with self._lock:
+            self.remaining = remaining
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker for one host."""
+
+    def __init__(self, host: str, threshold: int = FAILURE_THRESHOLD, cooldown: float = COOLDOWN_SECONDS) -> None:
+        self.host = host
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def retry_in(self) -> float:
+        """Seconds until the breaker lets a trial request through (0 when it already may)."""
+
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now; only one trial passes when half open."""
+
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            reopened = self.opened_at is not None
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+        if reopened:
+            log.info("Circuit for %s closed", self.host)
+            auditMetrics.set_gauge("circuit_open", 0, {"host": self.host})
+
+    def release(self) -> None:
+        """End a request that neither succeeded nor failed (it was throttled)."""
+
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            was_trial = self._trial
+            self._trial = False
+            if not was_trial and (self.opened_at is not None or self.failures < self.threshold):
+                return
+            self.opened_at = time.monotonic()
+        log.warning("Circuit for %s opened after %d failures; pausing calls for %.0fs", self.host, self.failures, self.cooldown)
+        auditMetrics.inc("circuit_opened_total", {"host": self.host})
+        auditMetrics.set_gauge("circuit_open", 1, {"host": self.host})
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(url: str) -> CircuitBreaker:
+    """The shared breaker for ``url``'s host."""
+
+    host = (urlparse(url).netloc or url).lower()
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker(host)
+        return breaker
+
+
+def reset_breakers() -> None:
+    with _breakers_lock:
+        _breakers.clear()
+
+
+class RetryingSession(requests.Session):
+    """``requests.Session`` that applies the retry policy and the host breakers."""
+
+    def __init__(self, service: str, policy: Optional[RetryPolicy] = None, governor: Optional[RateGovernor] = None) -> None:
+        super().__init__()
+        self.service = service
+        self.policy = policy or RetryPolicy()
+        self.governor = governor
+
+    def _wait_for_breaker(self, breaker: CircuitBreaker, url: str) -> None:
+        """Wait out an open breaker; raises :class:`CircuitOpenError` when it stays open."""
+
+        if breaker.allow():
+            return
+        started = time.monotonic()
+        log.info("Circuit for %s is open; waiting up to %.0fs", breaker.host, self.policy.max_circuit_wait)
+        while not breaker.allow():
+            waited = time.monotonic() - started
+            if waited >= self.policy.max_circuit_wait or auditProgress.cancelled():
+                raise CircuitOpenError(f"Circuit open for {breaker.host}", url=url, status=None)
+            # Poll while another request holds the half-open trial.
+            time.sleep(min(max(breaker.retry_in(), 0.5), self.policy.max_circuit_wait - waited))
+        auditMetrics.observe("circuit_wait_seconds", time.monotonic() - started, {"service": self.service})
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        breaker = breaker_for(url)
+        # One breaker decision per request: its retries are not separate trials or failures.
+        self._wait_for_breaker(breaker, url)
+        last_error = "no attempt made"
+        response = None
+        try:
+            for attempt in range(1, self.policy.attempts + 1):
+                if self.governor is not None:
+                    self.governor.wait()
+                try:
+                    response = super().request(method, url, *args, **kwargs)
+                except (requests.Timeout, requests.ConnectionError) as exc:
+                    response = None
+                    last_error = f"{type(exc).__name__}: {exc}"
+                else:
+                    if self.governor is not None:
+                        self.governor.update(response)
+                    if not self.policy.should_retry(response):
+                        breaker.record_success()
+                        return response
+                    last_error = f"HTTP {response.status_code}"
+
+                if attempt == self.policy.attempts:
+                    break
+                delay = self.policy.delay(attempt, _retry_after(response))
+                auditMetrics.inc("http_retries_total", {"service": self.service, "reason": last_error.split(":")[0]})
+                log.debug("Retrying %s %s in %.1fs after %s (attempt %d)", method, url, delay, last_error, attempt)
+                time.sleep(delay)
+        except requests.RequestException:
+            # Any other request failure (broken chunked body, too many redirects, ...) ends the attempt.
+            breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancellation and the like say nothing about the host, but must not keep a half-open trial forever.
+            breaker.release()
+            raise
+
+        if response is not None and self.policy.throttled(response):
+            # Throttling says the host is up; it must not open the breaker for every other caller.
+            breaker.release()
+        else:
+            breaker.record_failure()
+        raise TransportError(
+            f"{method} {url} failed after {self.policy.attempts} attempts: {last_error}",
+            url=url,
+            status=response.status_code if response is not None else None,
+        )
+
+
+def session(
+    service: str,
+    policy: Optional[RetryPolicy] = None,
+    governor: Optional[RateGovernor] = None,
+    pool_size: Optional[int] = None,
+) -> RetryingSession:
+    """A retrying, instrumented session; ``service`` labels its metrics.
+
+    ``pool_size`` caps the kept-alive connections per host (requests keeps 10).
+    """
+
+    http = RetryingSession(service, policy, governor)
+    if pool_size is not None:
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        http.mount("https://", adapter)
+        http.mount("http://", adapter)
+    auditMetrics.instrument_session(http, service)
+    return http
+
+
+def next_link(link_header: Optional[str]) -> Optional[str]:
+    """Return the ``rel=next`` URL from a ``Link`` pagination header."""
+
+    if not link_header:
+        return None
+
+    for part in link_header.split(","):
+        section = part.strip()
+        if 'rel="next"' not in section:
+            continue
+
+        start = section.find("<")
+        end = section.find(">", start + 1)
+        if start != -1 and end != -1:
+            return section[start + 1 : end]
+
+    return None
+
+
+def paginate(
+    http: requests.Session,
+    url: str,
+    params: Optional[dict] = None,
+    headers: Optional[dict] = None,
+) -> Iterator[requests.Response]:
+    """Yield each successful page of a ``Link``-paginated listing.
+
+    ``params`` only apply to the first request; ``next`` links already carry
+    them. A non-200 page raises :class:`TransportError` for that page,
+    marked retryable only when retrying could help.
+    """
+
+    page_url: Optional[str] = url
+    first = True
+    while page_url:
+        request_kwargs = {"headers": headers}
+        if first and params is not None and "?" not in page_url:
+            request_kwargs["params"] = params
+        try:
+            response = http.get(page_url, **request_kwargs)
+        except TransportError:
+            raise
+        except requests.RequestException as exc:
+            raise TransportError(str(exc), url=page_url) from exc
+
+        if response.status_code != 200:
+            raise TransportError(
+                f"GET {page_url} returned {response.status_code}: {(response.text or '')[:120]}",
+                url=page_url,
+                status=response.status_code,
+                retryable=response.status_code >= 500 or response.status_code in (408, 429),
+            )
+
+        yield response
+        page_url = next_link(response.headers.get("Link", ""))
+        first = False
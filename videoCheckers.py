@@ -0,0 +1,156 @@
+"""Caption checks for individual videos, independent of a full stage run.
+
+The platform stages audit every video of every course in one pass. Queue
+workers and targeted re-audits instead need to check an arbitrary handful of
+URLs, so :class:`Checkers` wraps the same per-platform logic and keeps the
+expensive pieces (the Panopto auditor with its pooled sessions and drivers,
+and the signed-in Canvas browser) warm between calls.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import artifactStore
+import auditResults
+
+
+PLATFORMS = ("youtube", "panopto", "canvas")
+
+# (verdict, reason) for one video; see auditResults.VERDICTS.
+Verdict = Tuple[str, Optional[str]]
+
+# ``type`` values written to data/audited_videos.json for each platform.
+RESULT_TYPES = {"youtube": "youtube", "panopto": "panopto", "canvas": "Canvas"}
+PLATFORM_FOR_TYPE = {value: key for key, value in RESULT_TYPES.items()}
+
+
+def course_videos(course_id: str) -> List[Tuple[str, str]]:
+    """Return ``[(platform, url), …]`` for the auditable videos of one course."""
+
+    import panoptoVideo
+    import sortEmbeddedVideos
+
+    course_id = str(course_id)
+    sorted_urls = artifactStore.current().sorted_urls(course_id)
+    videos: List[Tuple[str, str]] = []
+
+    for url in sorted_urls.get("youtube", []):
+        if isinstance(url, str) and ("youtube.com/watch?v=" in url or "youtu.be/" in url):
+            videos.append(("youtube", url))
+
+    for _, url in panoptoVideo._iter_panopto_links([course_id]):
+        videos.append(("panopto", url))
+
+    canvas_urls = [url for url in sorted_urls.get("canvas", []) if isinstance(url, str)]
+    for url in sortEmbeddedVideos.truncateCanvasUrl(canvas_urls):
+        videos.append(("canvas", url))
+
+    return videos
+
+
+def result_entry(
+    platform: str, url: str, verdict: str, reason: Optional[str] = None, course_id: Optional[str] = None
+) -> dict:
+    return auditResults.make_entry(RESULT_TYPES[platform], url, verdict, reason, course_id=course_id)
+
+
+class Checkers:
+    """Warm per-platform checkers; use as a context manager."""
+
+    def __init__(self, headless: bool = True) -> None:
+        self.headless = headless
+        self._panopto = None
+        self._canvas_driver = None
+
+    def check(self, platform: str, urls: Sequence[str]) -> Dict[str, Optional[bool]]:
+        """Return ``{url: has_captions}``; ``None`` where :meth:`verdicts` has no definite answer."""
+
+        return {
+            url: auditResults.captions_for(verdict) for url, (verdict, _reason) in self.verdicts(platform, urls).items()
+        }
+
+    def verdicts(self, platform: str, urls: Sequence[str]) -> Dict[str, Verdict]:
+        """Return ``{url: (verdict, reason)}`` for ``urls`` on ``platform``.
+
+        The verdict is ``unknown`` when the checks ran but could not tell and
+        ``error`` when they failed (throttling, server errors, an open circuit
+        breaker, a browser error). Canvas URLs that turn out not to host a
+        video are left out. Raises ``RuntimeError`` when the Canvas browser
+        session cannot be opened.
+        """
+
+        if platform == "youtube":
+            return self._check_youtube(urls)
+        if platform == "panopto":
+            return self._panopto_auditor().audit_many_verdicts(list(urls))
+        if platform == "canvas":
+            return self._check_canvas(urls)
+        raise ValueError(f"Unknown platform: {platform}")
+
+    def check_grouped(self, videos: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Verdict]:
+        """Return ``(verdict, reason)`` for ``[(platform, url), …]``, one batch per platform."""
+
+        by_platform: Dict[str, List[str]] = {}
+        for platform, url in videos:
+            by_platform.setdefault(platform, []).append(url)
+
+        verdicts: Dict[Tuple[str, str], Verdict] = {}
+        for platform, urls in by_platform.items():
+            for url, verdict in self.verdicts(platform, urls).items():
+                verdicts[(platform, url)] = verdict
+        return verdicts
+
+    def close(self) -> None:
+        if self._panopto is not None:
+            self._panopto.close()
+            self._panopto = None
+        if self._canvas_driver is not None:
+            try:
+                self._canvas_driver.quit()
+            except Exception:
+                pass
+            self._canvas_driver = None
+
+    def __enter__(self) -> "Checkers":
+        return self
+
+    def __exit__(self, exc_type, exc, exc_tb) -> None:
+        self.close()
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    @staticmethod
+    def _check_youtube(urls: Sequence[str]) -> Dict[str, Verdict]:
+        import youtubeVideo
+
+        return {url: youtubeVideo.probeVideo(url) for url in urls}
+
+    def _panopto_auditor(self):
+        if self._panopto is None:
+            import panoptoVideo
+
+            self._panopto = panoptoVideo.PanoptoAuditor(
+                panoptoVideo.CLIENT_ID, panoptoVideo.CLIENT_SECRET, headless=self.headless
+            )
+        return self._panopto
+
+    def _check_canvas(self, urls: Sequence[str]) -> Dict[str, Verdict]:
+        import sortEmbeddedVideos
+        from selenium.common.exceptions import WebDriverException
+
+        if self._canvas_driver is None:
+            self._canvas_driver = sortEmbeddedVideos.openCanvasDriver(headless=self.headless)
+            if self._canvas_driver is None:
+                raise RuntimeError("Canvas browser session is not available")
+
+        verdicts: Dict[str, Verdict] = {}
+        for url in urls:
+            try:
+                is_video, has_captions = sortEmbeddedVideos.checkUrl(self._canvas_driver, url)
+            except WebDriverException as exc:
+                verdicts[url] = ("error", f"Browser: {type(exc).__name__}")
+                continue
+            if is_video:
+                verdicts[url] = (auditResults.verdict_for(bool(has_captions)), None)
+        return verdicts
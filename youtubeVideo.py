@@ -2,10 +2,93 @@
 #University of Colorado Colorado Springs
 #06/25/2025
 
-import json
-from youtube_transcript_api import YouTubeTranscriptApi 
 import time
-import os
+import artifactStore
+import auditLog
+import auditMetrics
+import auditPriority
+import auditProgress
+import auditResults
+import auditTrace
+
+log = auditLog.get_logger("youtubeVideo")
+
+#seconds to wait before each transcript request so bulk audits stay under YouTube's rate limit
+PROBE_DELAY = 5
+
+#transcript client class, imported on the first probe so that listing videos stays cheap
+YouTubeTranscriptApi = None
+#retrying session shared by every probe, created with the client
+HTTP = None
+
+
+def transcriptApi():
+    """
+    returns:
+        the YouTubeTranscriptApi class, importing youtube_transcript_api on first use.
+    """
+    global YouTubeTranscriptApi
+    if YouTubeTranscriptApi is None:
+        from youtube_transcript_api import YouTubeTranscriptApi as api
+        YouTubeTranscriptApi = api
+    return YouTubeTranscriptApi
+
+
+def httpClient():
+    """
+    returns:
+        the shared transport session for transcript requests, created on first use.
+    """
+    global HTTP
+    if HTTP is None:
+        import transport
+        HTTP = transport.session("youtube")
+    return HTTP
+
+
+def probeFailed(error):
+    """
+    args:
+        error: exception raised by a transcript lookup
+    returns:
+        True when the error says nothing about the video's captions (throttling, a
+        blocked IP, network or server errors), so the lookup itself failed.
+    """
+    import requests
+    if isinstance(error, requests.RequestException):
+        return True
+    try:
+        from youtube_transcript_api import IpBlocked, RequestBlocked, YouTubeRequestFailed
+    except ImportError:
+        return False
+    return isinstance(error, (IpBlocked, RequestBlocked, YouTubeRequestFailed))
+
+
+def probeVerdict(error):
+    """
+    args:
+        error: exception raised by a transcript lookup
+    returns:
+        "no_captions" when YouTube answered that the video has no transcript,
+        "unknown" when the video could not be inspected (removed, private, age
+        restricted) and "error" when the lookup itself failed.
+    """
+    if probeFailed(error):
+        return "error"
+    try:
+        import youtube_transcript_api as yta
+    except ImportError:
+        return "error"
+    if isinstance(error, (yta.TranscriptsDisabled, yta.NoTranscriptFound)):
+        return "no_captions"
+    unknown = tuple(
+        getattr(yta, name)
+        for name in ("VideoUnavailable", "InvalidVideoId", "AgeRestricted", "VideoUnplayable", "PoTokenRequired")
+        if hasattr(yta, name)
+    )
+    if unknown and isinstance(error, unknown):
+        return "unknown"
+    return "error"
 
 
 def normalize_youtube_url(url):
@@ -34,22 +117,30 @@ def get_youtube_videos(courses):
         ytv: list of YouTube video URLs found in the courses
     This function retrieves YouTube video URLs from the specified courses.
     """
-    print("Debug: Fetching YouTube videos from courses")
+    import transport
+    log.debug("Fetching YouTube videos from courses")
+    store = artifactStore.current()
     ytv = []
     for c in courses:
-        with open(f"data/sortedModules/sorted_modules_{c}.json", "r") as f:
-            videos = json.load(f)
+        #reuse this run's sorted modules; Canvas is only crawled again if they are stale
+        try:
+            videos = store.sorted_urls(c)
+        except transport.TransportError as e:
+            #one course Canvas could not crawl shouldn't stop the others; the next crawl retries it
+            log.error("Could not get the modules of course %s: %s", c, e)
+            auditResults.record_retryable("course", str(e), platform="canvas", course_id=c)
+            continue
         #running into error because file doesn't have any thing in it so when it reads null it fails.
         if not videos or "youtube" not in videos:
-            print(f"Debug: No YouTube videos found in course {c}")
+            log.debug("No YouTube videos found in course %s", c)
             continue
         
         for item in videos["youtube"]:
             if "youtube.com/watch?v=" in item or "youtu.be/" in item:
                 ytv.append(item)
-                print("Debug: Found YouTube video:")
+                log.debug("Found YouTube video")
             else:
-                print("Debug: Skipping non-YouTube URL:")
+                log.debug("Skipping non-YouTube URL")
                 continue
 
 
@@ -61,64 +152,74 @@ def auditVideo(url):
     args:
         url: the YouTube URL to audit
     returns:
-        has_captions: boolean indicating if the video has captions
+        has_captions: True/False, or None when the video could not be checked
     This function checks if a YouTube video has captions using the YouTube Transcript API.
     """
-    time.sleep(5)
-    v = url.replace("https://www.youtube.com/watch?v=", "").replace("https://youtu.be/", "")
-    try:
-        ytt_api = YouTubeTranscriptApi()
-        transcript = ytt_api.fetch(v)
-
-        if transcript:
-            print(f"Debug: Video {url} has captions.")
-            return True
-        else:
-            print(f"Debug: Video {url} does not have captions.")
-            return False
-        
-    except Exception as e:
-        print(f"Error fetching transcript for {url}: {e}")
-        return False
-
+    verdict, _reason = probeVideo(url)
+    return auditResults.captions_for(verdict)
 
 
-def main():
-    with open(f"data/courses_ids.json", "r") as f:
-        courses = json.load(f)
-
-
-    videos = get_youtube_videos(courses)
-    for v in videos:
-        #print(v)
-        result = auditVideo(v)
-        #print(result)
+@auditTrace.traced("youtube_check", "youtube", "url")
+def probeVideo(url):
+    """
+    args:
+        url: the YouTube URL to audit
+    returns:
+        (verdict, reason): verdict is one of auditResults.VERDICTS; reason explains
+        an "unknown" or "error" verdict and is None otherwise.
+    """
+    time.sleep(PROBE_DELAY)
+    v = url.replace("https://www.youtube.com/watch?v=", "").replace("https://youtu.be/", "")
+    #resolved outside the try below so a missing package is not recorded as a verdict
+    api = transcriptApi()
+    #the probe is timed without the pacing sleep above
+    with auditMetrics.timed("youtube_probe") as probe:
+        try:
+            ytt_api = api(http_client=httpClient())
+            transcript = ytt_api.fetch(v)
+
+            if transcript:
+                log.debug("Video %s has captions.", url)
+                probe["outcome"] = "captions"
+                return "captions", None
+            else:
+                log.debug("Video %s does not have captions.", url)
+                probe["outcome"] = "no_captions"
+                return "no_captions", None
+
+        except Exception as e:
+            verdict = probeVerdict(e)
+            probe["outcome"] = verdict
+            if verdict == "no_captions":
+                log.info("No transcript for %s: %s", url, type(e).__name__)
+                return "no_captions", None
+            if verdict == "error":
+                log.warning("Transcript lookup failed for %s: %s", url, e)
+            else:
+                log.info("Could not inspect %s: %s", url, type(e).__name__)
+            return verdict, f"{type(e).__name__}: {e}"
 
-        j = {
-            "type": "youtube",
-            "url": v,
-            "has_captions": result,
-        }
 
-        file_path = "data/audited_videos.json"
 
-        # Load existing data or initialize an empty list
-        if os.path.exists(file_path):
-            with open(file_path, "r") as f:
-                try:
-                    data = json.load(f)
-                except json.JSONDecodeError:
-                    data = []
-        else:
-            data = []
+def main():
+    #with a deadline, only crawled courses are audited, largest first
+    courses = auditPriority.course_ids()
 
-        # Append new entry
-        data.append(j)
 
-        # Write back to file
-        with open(file_path, "w") as f:
-            json.dump(data, f, indent=4)
+    videos = [(c, v) for c in courses for v in get_youtube_videos([c])]
+    #a resumed run skips the videos it already has verdicts for
+    videos = [(c, v) for c, v in videos if not auditProgress.already_checked("youtube", v)]
+    #with a deadline, unchecked and stale videos go first
+    videos = auditPriority.order("youtube", videos)
+    auditProgress.emit("videos_queued", stage="youtubeVideo", count=len(videos))
+    for _course, v in videos:
+        auditProgress.check_cancelled()
+        verdict, reason = probeVideo(v)
+        #unknown and error verdicts are written too; reAudit.py re-checks them later
+        auditResults.append_result(auditResults.make_entry("youtube", v, verdict, reason))
+        auditProgress.video_checked("youtube", v)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    auditLog.configure()
+    main()